@@ -0,0 +1,117 @@
+"""デバウンスの実装比較（イベントごとの threading.Timer / 単一スレッドの Debouncer）
+
+Drive 同期を模して、P 個のファイルそれぞれに変更イベントを連打し（合計 E 件）、
+すべてのデバウンスが発火するまでに生成されたスレッド数と、1,000イベントあたりのCPU時間を計測する。
+発火回数がファイル数と一致すること（キーごとに1回だけ発火すること）も確認する。
+
+使い方:
+    python benchmarks/bench_debouncer.py [--events 10000] [--paths 200] [--delay 0.2]
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from debouncer import Debouncer  # noqa: E402
+
+
+class _TimerDebouncer:
+    """旧実装（NoteHandler._schedule）と同じ、イベントごとに Timer を作り直す方式"""
+
+    def __init__(self):
+        self._timers: dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, key, delay, callback, *args):
+        with self._lock:
+            if key in self._timers:
+                self._timers[key].cancel()
+            timer = threading.Timer(delay, self._fire, args=[key, callback, args])
+            self._timers[key] = timer
+            timer.start()
+
+    def _fire(self, key, callback, args):
+        with self._lock:
+            self._timers.pop(key, None)
+        callback(*args)
+
+    def stop(self):
+        pass
+
+
+class _ThreadCounter:
+    """Thread.start の呼び出し回数を数える"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = threading.Thread.start
+
+    def __enter__(self):
+        original = self._original
+
+        def start(thread):
+            self.count += 1
+            original(thread)
+
+        threading.Thread.start = start
+        return self
+
+    def __exit__(self, *exc):
+        threading.Thread.start = self._original
+
+
+def bench(name: str, factory, n_events: int, n_paths: int, delay: float) -> dict:
+    keys = [f"/watch/スキャン_{i:04d}.pdf" for i in range(n_paths)]
+    events = [keys[i % n_paths] for i in range(n_events)]
+    random.Random(0).shuffle(events)
+
+    fired = 0
+    fired_lock = threading.Lock()
+    done = threading.Event()
+
+    def on_fire(key):
+        nonlocal fired
+        with fired_lock:
+            fired += 1
+            if fired == n_paths:
+                done.set()
+
+    with _ThreadCounter() as threads:
+        cpu_start = time.process_time()
+        debouncer = factory()
+        for key in events:
+            debouncer.schedule(key, delay, on_fire, key)
+        done.wait(delay + 30)
+        time.sleep(delay)  # 余分な発火が無いことを確認する猶予
+        cpu = time.process_time() - cpu_start
+        debouncer.stop()
+
+    return {
+        "name": name,
+        "threads": threads.count,
+        "cpu_ms_per_1k": cpu * 1000 / (n_events / 1000),
+        "fired": fired,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--paths", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"イベント {args.events:,} 件 / ファイル {args.paths} 件 / デバウンス {args.delay}秒")
+    print(f"{'impl':<14}{'threads':>10}{'CPU ms/1k':>12}{'fired':>8}")
+    for name, factory in (("Timer", _TimerDebouncer), ("Debouncer", Debouncer)):
+        r = bench(name, factory, args.events, args.paths, args.delay)
+        print(f"{r['name']:<14}{r['threads']:>10,}{r['cpu_ms_per_1k']:>12.2f}{r['fired']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""生成ノートの後処理の比較（消費側ごとの再パース / NoteDocument による1回の解析）
+
+旧実装は、応答のコードブロック除去（startswith とスライスの繰り返し）、通知のフロントマター解析
+（行分割とタグの正規表現）、概要の抽出（本文全体への DOTALL 正規表現）、索引登録時の行分割を
+それぞれ別に行っていた。複数ページPDFをマージした大きなノートで、1件あたりの処理時間と
+処理速度（MB/s）を比較する。両者の取り出したタイトル・タグ・概要が一致することも確認する。
+
+使い方:
+    python benchmarks/bench_note_document.py [--pages 1 10 100 500] [--repeat 20]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from note_document import NoteDocument  # noqa: E402
+
+_PAGE_BODY = """# 概要
+
+ゲーミフィケーションを使った習慣化のルールを検討している。睡眠と運動を中心に、
+連勝記録とリカバリープランで継続する仕組みを作る。
+
+# 内容（色別整理）
+
+## アイデア・気づき (Green)
+
+- 連勝記録が途切れたときの「復活ボーナス」を用意する
+- 週ごとにルールを見直す
+
+## 注目ポイント (Red)
+
+**23時までに就寝**を最優先にする。
+
+## 事実・記録 (Black)
+
+```python
+# コードブロック内の # は見出しではない
+streak = 0
+```
+
+- [ ] 就寝時刻を記録する
+- [ ] 週3回ジョギング
+
+## 外部リソース (Blue)
+
+> 『習慣の力』チャールズ・デュヒッグ
+
+# 次のアクション
+
+- [ ] ルール表を作る
+"""
+
+
+def _make_note(pages: int) -> str:
+    """merge_page_notes の出力と同じ形の、pages ページ分のノートをコードブロックで囲んだ応答"""
+    bodies = [f"<!-- p.{i} -->\n\n{_PAGE_BODY.strip()}" for i in range(1, pages + 1)]
+    return (
+        "```markdown\n---\ntitle: ゲーミフィケーションを活用した自己改善ルール策定ノート\n"
+        "date: 2026-02-26\ntags: [ゲーミフィケーション, 習慣化, 自己改善, 睡眠, 運動]\n"
+        "intent: 自己分析・計画立案\n---\n\n" + "\n\n---\n\n".join(bodies) + "\n```\n"
+    )
+
+
+# --- 旧実装（NoteAnalyzer._strip_code_fence / DiscordNotifier / NoteIndex のパース） ---
+
+
+def _legacy_strip_code_fence(content: str) -> str:
+    content = content.strip()
+    if content.startswith("```markdown"):
+        content = content[len("```markdown"):].strip()
+    if content.startswith("```"):
+        content = content[3:].strip()
+    if content.endswith("```"):
+        content = content[:-3].strip()
+    return content
+
+
+def _legacy_parse_frontmatter(content: str) -> dict:
+    match = re.match(r"^---\s*\n(.*?)\n---", content, re.DOTALL)
+    if not match:
+        return {}
+    result = {}
+    for line in match.group(1).strip().split("\n"):
+        if ":" not in line:
+            continue
+        key, _, value = line.partition(":")
+        key = key.strip()
+        value = value.strip()
+        if key == "tags":
+            result[key] = re.findall(r"[\w　-鿿＀-￯]+", value)
+        else:
+            result[key] = value
+    return result
+
+
+def _legacy_extract_summary(content: str) -> str:
+    match = re.search(r"#\s*(?:\U0001f4dd\s*)?概要\s*\n+(.*?)(?=\n#|\Z)", content, re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+
+def _legacy_index_frontmatter(content: str) -> dict:
+    meta = {}
+    lines = content.splitlines()
+    if lines and lines[0].strip() == "---":
+        for line in lines[1:]:
+            if line.strip() == "---":
+                break
+            key, sep, value = line.partition(":")
+            if sep:
+                meta[key.strip()] = value.strip()
+    return meta
+
+
+def legacy(response: str) -> tuple[str, list[str], str]:
+    content = _legacy_strip_code_fence(response)
+    metadata = _legacy_parse_frontmatter(content)
+    summary = _legacy_extract_summary(content)
+    _legacy_index_frontmatter(content)
+    return metadata.get("title", ""), metadata.get("tags", []), summary
+
+
+def single_pass(response: str) -> tuple[str, list[str], str]:
+    doc = NoteDocument.parse(response)
+    return doc.title, doc.tags, doc.summary
+
+
+def bench(fn, response: str, repeat: int) -> float:
+    """1件あたりの最短時間（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(response)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6}{'size KB':>10}{'legacy ms':>12}{'single ms':>12}{'legacy MB/s':>13}{'single MB/s':>13}")
+    for pages in args.pages:
+        response = _make_note(pages)
+        if legacy(response) != single_pass(response):
+            raise SystemExit(f"解析結果が一致しません（{pages}ページ）")
+        size = len(response.encode("utf-8"))
+        t_legacy = bench(legacy, response, args.repeat)
+        t_single = bench(single_pass, response, args.repeat)
+        print(
+            f"{pages:>6}{size / 1024:>10.1f}{t_legacy * 1000:>12.3f}{t_single * 1000:>12.3f}"
+            f"{size / t_legacy / 1e6:>13.1f}{size / t_single / 1e6:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
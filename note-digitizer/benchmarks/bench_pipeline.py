@@ -0,0 +1,346 @@
+"""監視パイプライン全体（start_watching 〜 通知）のスループット計測
+
+合成した監視フォルダに画像・PDF を Drive 同期のように書き込み（数回に分けて書き込むため
+1ファイルに複数の変更イベントが発生する。一部は ` (1)` 付きの重複コピーも置く）、
+start_watching で起動した実際の NoteHandler・ProcessedTracker・MarkdownWriter で処理させる。
+NoteAnalyzer と DiscordNotifier は、所要時間の分布（対数正規分布）を指定できるスタブに置き換える。
+
+計測値（files/sec、ファイル書き込み開始から通知までの p50/p95/p99、ピークRSS・スレッド数、
+ステージ別メトリクス）は JSON として保存し、NoteHandler・ProcessedTracker・デバウンスの変更による
+性能の後退を数値で比較できるようにする。
+
+使い方:
+    python benchmarks/bench_pipeline.py [--files 200] [--workers 4] [--analyze-ms 500]
+        [--output benchmarks/results/pipeline.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import PIL.Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_SCRIPTS = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(_SCRIPTS))
+
+from note_document import NoteDocument  # noqa: E402
+
+_RESULTS_DIR = Path(__file__).parent / "results"
+_SAMPLE_INTERVAL = 0.05
+
+
+# --- 合成データ ---
+
+
+def _make_image(rng: np.random.Generator, size_kb: int) -> PIL.Image.Image:
+    """ファイルごとに構図の異なる（近似重複と判定されない）ノイズ入り画像"""
+    # ランダムノイズの JPEG は 1画素あたり約 1.5 バイトになる
+    edge = max(64, int((size_kb * 1024 / 1.5) ** 0.5))
+    base = PIL.Image.fromarray(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8))
+    base = np.asarray(base.resize((edge, edge), PIL.Image.Resampling.BICUBIC), dtype=np.int16)
+    noise = rng.integers(-40, 41, base.shape, dtype=np.int16)
+    return PIL.Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def _encode(image: PIL.Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buf, format=fmt, quality=90)
+    else:
+        image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def generate_files(args) -> list[tuple[str, bytes]]:
+    """(ファイル名, 内容) のリスト。重複コピーは元ファイルの直後に置く。"""
+    rng = np.random.default_rng(args.seed)
+    pick = random.Random(args.seed)
+    image_sizes = [int(s) for s in args.image_kb.split(",")]
+    files: list[tuple[str, bytes]] = []
+    for i in range(args.files):
+        if pick.random() < args.pdf_ratio:
+            name = f"スキャン_{i:05d}.pdf"
+            data = _encode(_make_image(rng, args.pdf_kb), "PDF")
+        else:
+            name = f"IMG_{i:05d}.jpg"
+            data = _encode(_make_image(rng, pick.choice(image_sizes)), "JPEG")
+        files.append((name, data))
+        if pick.random() < args.dup_ratio:
+            stem, suffix = os.path.splitext(name)
+            files.append((f"{stem} (1){suffix}", data))
+    return files
+
+
+# --- スタブ ---
+
+
+class _Latency:
+    """平均 mean_ms、ばらつき sigma の対数正規分布"""
+
+    def __init__(self, mean_ms: float, sigma: float, seed: int):
+        self.mu = np.log(max(mean_ms, 1e-3) / 1000) - sigma**2 / 2
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        with self._lock:
+            seconds = self._random.lognormvariate(self.mu, self.sigma)
+        time.sleep(seconds)
+
+
+def _note(image_path: Path) -> NoteDocument:
+    return NoteDocument.parse(
+        f"---\ntitle: {image_path.stem}\ndate: 2026-01-01\ntags: [bench]\n"
+        f"intent: memo\nsource: {image_path.name}\n---\n\n# 概要\n\n合成データ\n"
+    )
+
+
+class StubAnalyzer:
+    def __init__(self, latency: _Latency):
+        self.latency = latency
+
+    def analyze(self, image_path: Path, stream=None) -> NoteDocument:
+        self.latency.sleep()
+        doc = _note(image_path)
+        if stream is None:
+            return doc
+        # GEMINI_STREAMING=true で計測する場合は、一時ファイルへの書き込み・rename の経路も通す
+        stream.reset()
+        stream.write(doc.text)
+        return stream.finish()
+
+    def analyze_batch(self, image_paths: list[Path]) -> dict[Path, NoteDocument]:
+        self.latency.sleep()
+        return {p: _note(p) for p in image_paths}
+
+    def close(self):
+        pass
+
+
+class StubNotifier:
+    """通知された時刻をソースファイル名ごとに記録する"""
+
+    def __init__(self, latency: _Latency):
+        self.latency = latency
+        self.done: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.changed = threading.Condition(self._lock)
+
+    def notify(self, doc: NoteDocument, output_path: Path):
+        self.latency.sleep()
+        source = doc.frontmatter["source"]
+        with self.changed:
+            self.done[source] = time.monotonic()
+            self.changed.notify_all()
+
+    def close(self):
+        pass
+
+
+# --- 計測 ---
+
+
+class _Sampler:
+    """ピークのスレッド数を定期的に記録する（RSS のピークは getrusage で取得する）"""
+
+    def __init__(self):
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(_SAMPLE_INTERVAL):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _sync_files(folder: Path, files: list[tuple[str, bytes]], args, started: dict[str, float]):
+    """Drive 同期を模して、各ファイルを数回に分けて書き込む"""
+    interval = 1.0 / args.arrival_rate if args.arrival_rate > 0 else 0.0
+    for name, data in files:
+        started[name] = time.monotonic()
+        path = folder / name
+        chunk = max(1, len(data) // args.write_chunks)
+        with open(path, "wb") as f:
+            for offset in range(0, len(data), chunk):
+                f.write(data[offset:offset + chunk])
+                f.flush()
+                os.fsync(f.fileno())
+                time.sleep(args.chunk_gap_ms / 1000)
+        if interval:
+            time.sleep(interval)
+
+
+def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    watch = workdir / "watch"
+    watch.mkdir()
+    os.environ.update(
+        {
+            "WATCH_FOLDER": str(watch),
+            "OBSIDIAN_VAULT_PATH": str(workdir / "vault"),
+            "PROCESSED_DB_PATH": str(workdir / "processed_files.json"),
+            "PROCESSED_DB_BACKEND": args.tracker_backend,
+            "DISCORD_OUTBOX_DIR": str(workdir / "outbox"),
+            "WATCH_SNAPSHOT_PATH": str(workdir / "watch_snapshot.json"),
+            "NOTE_INDEX_PATH": str(workdir / "note_index.sqlite3"),
+            "ANALYSIS_CACHE_MAX_MB": "0",
+            "GEMINI_UPLOAD_MIN_MB": "0",
+            "METRICS_FLUSH_SECONDS": "0",
+            "DEBOUNCE_SECONDS": str(args.debounce),
+            "WORKER_CONCURRENCY": str(args.workers),
+            "BATCH_MAX_IMAGES": str(args.batch),
+            "BACKFILL_ON_START": "false",
+        }
+    )
+    import metrics
+    from config import Config
+    from markdown_writer import MarkdownWriter
+    from processed_tracker import ProcessedTracker
+    from watcher import start_watching
+
+    print("合成データを生成中...", flush=True)
+    files = generate_files(args)
+    unique = [name for name, _ in files if " (1)" not in name]
+
+    config = Config()
+    tracker = ProcessedTracker(
+        config.processed_db_path, config.processed_db_backend, config.near_dup_hamming_threshold
+    )
+    analyzer = StubAnalyzer(_Latency(args.analyze_ms, args.analyze_sigma, args.seed))
+    notifier = StubNotifier(_Latency(args.notify_ms, args.notify_sigma, args.seed + 1))
+    sampler = _Sampler()
+    writer = MarkdownWriter(config)
+    observer, handler = start_watching(config, analyzer, writer, notifier, tracker)
+
+    started: dict[str, float] = {}
+    t0 = time.monotonic()
+    sync = threading.Thread(target=_sync_files, args=(watch, files, args, started))
+    sync.start()
+    with notifier.changed:
+        finished = notifier.changed.wait_for(
+            lambda: len(notifier.done) >= len(unique), timeout=args.timeout
+        )
+    elapsed = time.monotonic() - t0
+    sync.join()
+    # 重複コピーの遅れて届くイベントまで処理させてから止める
+    time.sleep(args.debounce + 0.5)
+    observer.stop()
+    observer.join()
+    handler.shutdown()
+    writer.close()
+    tracker.close()
+    sampler.stop()
+
+    latencies = sorted(
+        notifier.done[name] - started[name] for name in notifier.done if name in started
+    )
+    sizes = [len(data) for _, data in files]
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "dataset": {
+            "files": len(files),
+            "unique": len(unique),
+            "duplicates": len(files) - len(unique),
+            "total_mb": round(sum(sizes) / 1024 / 1024, 2),
+        },
+        "results": {
+            "completed": finished,
+            "notified": len(notifier.done),
+            "duplicate_notifications": sum(" (1)" in name for name in notifier.done),
+            "elapsed_sec": round(elapsed, 3),
+            "files_per_sec": round(len(notifier.done) / elapsed, 3),
+            "latency_sec": {
+                "p50": round(_percentile(latencies, 0.50), 3),
+                "p95": round(_percentile(latencies, 0.95), 3),
+                "p99": round(_percentile(latencies, 0.99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "peak_rss_mb": _peak_rss_mb(),
+            "peak_threads": sampler.peak_threads,
+        },
+        "metrics": metrics.REGISTRY.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200, help="ユニークなファイル数")
+    parser.add_argument("--pdf-ratio", type=float, default=0.2)
+    parser.add_argument("--dup-ratio", type=float, default=0.1, help="` (1)` 重複コピーを置く割合")
+    parser.add_argument("--image-kb", default="200,800,2000", help="画像サイズの候補（KB、カンマ区切り）")
+    parser.add_argument("--pdf-kb", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1, help="BATCH_MAX_IMAGES")
+    parser.add_argument("--tracker-backend", default="auto")
+    parser.add_argument("--debounce", type=float, default=1, help="DEBOUNCE_SECONDS（秒、小数可）")
+    parser.add_argument("--analyze-ms", type=float, default=500)
+    parser.add_argument("--analyze-sigma", type=float, default=0.5)
+    parser.add_argument("--notify-ms", type=float, default=5)
+    parser.add_argument("--notify-sigma", type=float, default=0.3)
+    parser.add_argument("--arrival-rate", type=float, default=0, help="同期されるファイル数/秒（0 で連続）")
+    parser.add_argument("--write-chunks", type=int, default=3, help="1ファイルを何回に分けて書き込むか")
+    parser.add_argument("--chunk-gap-ms", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先（デフォルト: benchmarks/results/）")
+    args = parser.parse_args()
+
+    result = run(args)
+    output = args.output or _RESULTS_DIR / f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    r = result["results"]
+    lat = r["latency_sec"]
+    print(
+        f"ファイル {result['dataset']['files']}件（ユニーク {result['dataset']['unique']}件, "
+        f"{result['dataset']['total_mb']} MB） / ワーカー {args.workers}"
+    )
+    print(f"  完了:        {r['notified']}/{result['dataset']['unique']} ({r['elapsed_sec']}秒)")
+    print(f"  files/sec:   {r['files_per_sec']}")
+    print(f"  latency:     p50 {lat['p50']}s / p95 {lat['p95']}s / p99 {lat['p99']}s")
+    print(f"  peak RSS:    {r['peak_rss_mb']:.1f} MB" if r["peak_rss_mb"] else "  peak RSS:    n/a")
+    print(f"  peak thread: {r['peak_threads']}")
+    print(f"  結果: {output}")
+
+
+if __name__ == "__main__":
+    main()
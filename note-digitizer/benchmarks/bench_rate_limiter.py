@@ -0,0 +1,185 @@
+"""クォータ付きの疑似Gemini APIに対するスループット比較（レート制御なし / あり）
+
+ローカルに generateContent を模した HTTP サーバを立て、直近60秒の受付数がクォータ（RPM）を
+超えたリクエストと、一定割合のリクエストに 429 / 503 を返す。
+genai.Client の接続先をこのサーバに向け、複数スレッドから連続でリクエストを送って
+成功数/分・429 の回数・諦めたリクエスト数を比較する。
+クォータは直近60秒の集計のため、計測時間が60秒未満だと direct は最初の一斉送信ぶん有利に見える。
+
+- direct:  レート制御・再試行なしで呼び出す（従来の動作。失敗したファイルは取りこぼされる）
+- limiter: RateLimiter（RPM トークンバケット・AIMD・バックオフ）経由で呼び出す
+
+使い方:
+    python benchmarks/bench_rate_limiter.py [--quota 120] [--threads 16] [--duration 120]
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from google import genai
+from google.genai import types
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from rate_limiter import RateLimiter, estimate_tokens  # noqa: E402
+
+_NOTE = "---\ntitle: テスト\ndate: 2026-01-01\ntags: [a]\nintent: memo\n---\n\n本文\n"
+
+
+class FakeGemini:
+    """RPM クォータ・障害注入付きの疑似エンドポイント"""
+
+    def __init__(self, quota_rpm: int, latency: float, error_rate: float):
+        self.quota_rpm = quota_rpm
+        self.latency = latency
+        self.error_rate = error_rate
+        self.accepted: deque[float] = deque()
+        self.counts = {"ok": 0, "429": 0, "503": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+    def admit(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            while self.accepted and now - self.accepted[0] >= 60:
+                self.accepted.popleft()
+            if self._random.random() < self.error_rate:
+                status = 503
+            elif len(self.accepted) >= self.quota_rpm:
+                status = 429
+            else:
+                self.accepted.append(now)
+                status = 200
+            self.counts["ok" if status == 200 else str(status)] += 1
+            return status
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = fake.admit()
+                if status == 200:
+                    time.sleep(fake.latency)
+                    body = {
+                        "candidates": [
+                            {"content": {"role": "model", "parts": [{"text": _NOTE}]}}
+                        ],
+                        "usageMetadata": {"totalTokenCount": 1500},
+                    }
+                else:
+                    body = {
+                        "error": {
+                            "code": status,
+                            "message": "quota exceeded" if status == 429 else "unavailable",
+                            "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE",
+                            "details": [
+                                {
+                                    "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                    "retryDelay": "1s",
+                                }
+                            ],
+                        }
+                    }
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def run(mode: str, args) -> dict:
+    fake = FakeGemini(args.quota, args.latency, args.error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fake.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = genai.Client(
+        api_key="fake",
+        http_options=types.HttpOptions(base_url=f"http://127.0.0.1:{server.server_port}"),
+    )
+    limiter = RateLimiter(args.quota, 0, args.threads, max_retries=5)
+    contents = ["プロンプト" * 100]
+
+    def request():
+        return client.models.generate_content(model="gemini-fake", contents=contents)
+
+    done = 0
+    gave_up = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def worker():
+        nonlocal done, gave_up
+        while time.monotonic() < deadline:
+            try:
+                if mode == "limiter":
+                    limiter.call(request, estimate_tokens(contents), "bench")
+                else:
+                    request()
+            except Exception:
+                with lock:
+                    gave_up += 1
+            else:
+                with lock:
+                    done += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+    server.shutdown()
+
+    return {
+        "mode": mode,
+        "ok": done,
+        "ok_per_min": done / elapsed * 60,
+        "http_429": fake.counts["429"],
+        "http_503": fake.counts["503"],
+        "gave_up": gave_up,
+        "final_limit": limiter.concurrency.limit if mode == "limiter" else args.threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quota", type=int, default=120, help="疑似サーバのRPMクォータ")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="成功応答の遅延（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="503 を返す割合")
+    args = parser.parse_args()
+    # 再試行ごとの警告ログは表示しない
+    logging.getLogger("rate_limiter").setLevel(logging.ERROR)
+
+    print(
+        f"クォータ {args.quota} RPM / {args.threads} スレッド / {args.duration:.0f}秒 / "
+        f"503 注入 {args.error_rate:.0%}"
+    )
+    print(f"{'mode':<10}{'ok':>8}{'ok/min':>10}{'429':>8}{'503':>8}{'gave up':>10}{'limit':>8}")
+    for mode in ("direct", "limiter"):
+        r = run(mode, args)
+        print(
+            f"{r['mode']:<10}{r['ok']:>8}{r['ok_per_min']:>10.1f}{r['http_429']:>8}{r['http_503']:>8}"
+            f"{r['gave_up']:>10}{r['final_limit']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
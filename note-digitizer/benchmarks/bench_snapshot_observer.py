@@ -0,0 +1,88 @@
+"""仮想ドライブ向け監視の stat 回数比較（PollingObserver / SnapshotObserver）
+
+N 件（デフォルト 10,000 件）のファイルがあるフォルダを両方の Observer で同時に監視し、
+変化の無い状態で duration 秒間に発生した stat 呼び出し回数を1分あたりに換算して表示する。
+PollingObserver は stat をカウントする関数を渡した PollingObserverVFS で計測する。
+
+使い方:
+    python benchmarks/bench_snapshot_observer.py [--files 10000] [--duration 60]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers.polling import PollingObserverVFS
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from snapshot_observer import SnapshotObserver  # noqa: E402
+
+
+class _StatCounter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path, *args, **kwargs):
+        self.calls += 1
+        return os.stat(path, *args, **kwargs)
+
+
+def _populate(folder: Path, n: int):
+    for i in range(n):
+        (folder / f"スキャン_{i:06d}.pdf").write_bytes(b"%PDF-1.4\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=3.0, help="PollingObserver の間隔（秒）")
+    parser.add_argument("--min-interval", type=float, default=2.0)
+    parser.add_argument("--max-interval", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "watch"
+        folder.mkdir()
+        _populate(folder, args.files)
+
+        counter = _StatCounter()
+        polling = PollingObserverVFS(
+            stat=counter, listdir=os.scandir, polling_interval=args.interval
+        )
+        snapshot = SnapshotObserver(
+            Path(tmp) / "watch_snapshot.json", args.min_interval, args.max_interval
+        )
+        handler = FileSystemEventHandler()
+        for observer in (polling, snapshot):
+            observer.schedule(handler, str(folder), recursive=False)
+
+        polling.start()
+        snapshot.start()
+        # 起動時の初回走査はどちらも全件 stat するため、計測から除外する
+        time.sleep(1.0)
+        (emitter,) = snapshot.emitters
+        base_polling, base_snapshot = counter.calls, emitter.stat_calls
+
+        time.sleep(args.duration)
+        polling_calls = counter.calls - base_polling
+        snapshot_calls = emitter.stat_calls - base_snapshot
+        polling.stop()
+        snapshot.stop()
+        polling.join()
+        snapshot.join()
+
+    per_minute = 60.0 / args.duration
+    print(f"ファイル {args.files:,} 件 / 計測 {args.duration:.0f} 秒（変化なし）")
+    print(f"{'observer':<18}{'stat/min':>14}")
+    print(f"{'PollingObserver':<18}{polling_calls * per_minute:>14,.0f}")
+    print(f"{'SnapshotObserver':<18}{snapshot_calls * per_minute:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
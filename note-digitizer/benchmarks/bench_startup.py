@@ -0,0 +1,153 @@
+"""起動時間の計測（エントリーポイントの import 時間と、監視開始までの時間）
+
+1. main / backfill / cleanup_duplicates / note_index をそれぞれ新しいプロセスで import したときの
+   壁時計時間（インタプリタ起動を含む）と、-X importtime によるパッケージ別の内訳
+2. python -m scripts を起動してから「フォルダ監視を開始しました」がログに出るまでの時間
+   （time-to-watching。ログイン時の自動起動 start.bat で監視が始まるまでの時間に相当）
+
+time-to-watching の中央値が --target-ms を超えた場合は終了コード 1 を返すため、回帰の検出に使える。
+API キー・Webhook はダミーを使い、一時フォルダを監視するだけなので外部への通信は発生しない。
+
+使い方:
+    python benchmarks/bench_startup.py [--runs 5] [--target-ms 500] [--top 8]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).parent.parent
+_SCRIPTS = _ROOT / "scripts"
+_ENTRY_MODULES = ("main", "backfill", "cleanup_duplicates", "note_index")
+_WATCHING_MESSAGE = "フォルダ監視を開始しました"
+
+
+def _env(workdir: Path) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONUNBUFFERED": "1",
+            "PYTHONIOENCODING": "utf-8",
+            "GEMINI_API_KEY": "dummy",
+            "NOTE_DISCORD_WEBHOOK_URL": "http://127.0.0.1:9/webhook",
+            "WATCH_FOLDER": str(workdir / "watch"),
+            "OBSIDIAN_VAULT_PATH": str(workdir / "vault"),
+            "PROCESSED_DB_PATH": str(workdir / "processed_files.json"),
+            "DISCORD_OUTBOX_DIR": str(workdir / "outbox"),
+            "WATCH_SNAPSHOT_PATH": str(workdir / "watch_snapshot.json"),
+            "NOTE_INDEX_PATH": str(workdir / "note_index.sqlite3"),
+            "OUTPUT_INDEX_PATH": str(workdir / "output_index.sqlite3"),
+            "ANALYSIS_CACHE_DIR": str(workdir / "analysis_cache"),
+            "GEMINI_UPLOAD_CACHE_PATH": str(workdir / "gemini_uploads.json"),
+            "METRICS_PORT": "0",
+            "METRICS_FLUSH_SECONDS": "0",
+            "BACKFILL_ON_START": "false",
+        }
+    )
+    return env
+
+
+def _import_once(module: str, env: dict[str, str]) -> tuple[float, dict[str, float], float]:
+    """(壁時計ms, パッケージ別の自己時間ms, import の累積ms) を返す"""
+    code = f"import sys; sys.path.insert(0, {str(_SCRIPTS)!r}); import {module}"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        check=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+
+    by_package: dict[str, float] = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + int(self_us) / 1000
+        if name == module:
+            total = int(cumulative_us) / 1000
+    return wall, by_package, total
+
+
+def _time_to_watching(env: dict[str, str], timeout: float) -> float:
+    """python -m scripts を起動し、監視開始のログが出るまでの時間（ms）"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "scripts"],
+        cwd=_ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+    )
+    try:
+        deadline = start + timeout
+        for line in proc.stdout:
+            if _WATCHING_MESSAGE in line:
+                return (time.perf_counter() - start) * 1000
+            if time.perf_counter() > deadline:
+                break
+        raise RuntimeError("監視開始のログが確認できませんでした")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=500, help="time-to-watching の目標（中央値）")
+    parser.add_argument("--top", type=int, default=8, help="内訳に表示するパッケージ数")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        workdir = Path(tmp)
+        (workdir / "watch").mkdir()
+        env = _env(workdir)
+
+        baseline = statistics.median(
+            _import_once("os", env)[0] for _ in range(args.runs)
+        )
+        print(f"インタプリタ起動（import os）: {baseline:.0f} ms")
+        print()
+        print(f"{'module':<20}{'wall ms':>10}{'import ms':>11}   上位パッケージ（自己時間 ms）")
+        for module in _ENTRY_MODULES:
+            runs = [_import_once(module, env) for _ in range(args.runs)]
+            wall = statistics.median(r[0] for r in runs)
+            total = statistics.median(r[2] for r in runs)
+            packages = runs[len(runs) // 2][1]
+            top = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[: args.top]
+            breakdown = ", ".join(f"{name} {ms:.0f}" for name, ms in top)
+            print(f"{module:<20}{wall:>10.0f}{total:>11.0f}   {breakdown}")
+
+        samples = [_time_to_watching(env, args.timeout) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print()
+    print(
+        f"time-to-watching: 中央値 {median:.0f} ms（最小 {min(samples):.0f} / 最大 {max(samples):.0f}、"
+        f"目標 {args.target_ms:.0f} ms）"
+    )
+    if median > args.target_ms:
+        print("目標を超えています")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""処理済みDBの登録レイテンシ比較（json / journal / sqlite）
+
+各バックエンドに N 件（デフォルト 100,000 件）の履歴を事前投入した状態で、
+mark_processed 相当の登録（store.put）を繰り返して1件あたりの所要時間を計測する。
+
+使い方:
+    python benchmarks/bench_tracker_store.py [--entries 100000] [--commits 200]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from tracker_store import BACKENDS, open_store  # noqa: E402
+
+_SUFFIXES = {"json": ".json", "journal": ".jsonl", "sqlite": ".sqlite3"}
+
+
+def _entries(n: int) -> dict[str, dict]:
+    return {
+        f"スキャン_{i:06d}.pdf": {"hash": f"{i:032x}", "size": 200_000 + i}
+        for i in range(n)
+    }
+
+
+def bench(backend: str, workdir: Path, n_entries: int, n_commits: int) -> dict:
+    path = workdir / f"processed_{backend}{_SUFFIXES[backend]}"
+    store = open_store(path, backend)
+    store.load()
+    store.put_many(_entries(n_entries))
+
+    latencies = []
+    for i in range(n_commits):
+        entry = {"hash": f"{i:032x}", "size": i}
+        start = time.perf_counter()
+        store.put(f"新規_{i:06d}.pdf", entry)
+        latencies.append((time.perf_counter() - start) * 1000)
+    store.close()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--commits", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"履歴 {args.entries:,} 件 / 登録 {args.commits} 回")
+    print(f"{'backend':<10}{'mean(ms)':>12}{'p50(ms)':>12}{'p99(ms)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in BACKENDS:
+            r = bench(backend, Path(tmp), args.entries, args.commits)
+            print(
+                f"{r['backend']:<10}{r['mean_ms']:>12.3f}{r['p50_ms']:>12.3f}{r['p99_ms']:>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
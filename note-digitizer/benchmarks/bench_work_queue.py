@@ -0,0 +1,140 @@
+"""処理待ちキューの取り出し方針ごとの待ち時間（大きなPDFと小さな写真が混在する場合）
+
+Google Drive の同期で大きなPDF（数百ページ）と1ページの写真がまとめて届き（PDFが先）、
+その後も写真とPDFが続けて届く状況を再現する。ワーカーはまとめて届いた分がキューに積まれてから動き始め、
+PriorityWorkQueue から取り出したファイルをページ数に比例した時間（解析の代わりの sleep）をかけて処理する。方針ごとに、写真とPDFそれぞれの「キューに積んでから処理が終わるまで」の
+p50 / p95 / 最大を比較する（最大はエージングで大きなPDFが後回しにされ続けないことの確認）。
+
+PDF は pypdf で実際に作るため、sjf-pages のページ数取得も含めて計測される。
+
+使い方:
+    python benchmarks/bench_work_queue.py [--pdfs 2] [--pdf-pages 300] [--photos 30] [--workers 1]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from work_queue import POLICIES, PriorityWorkQueue  # noqa: E402
+
+
+def _make_pdf(path: Path, pages: int, bytes_per_page: int):
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, NameObject
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        page = writer.add_blank_page(595, 842)
+        # スキャンPDF相当のサイズにするため、ページごとにコメントだけのコンテンツストリームを付ける
+        content = DecodedStreamObject()
+        content.set_data(b"%" + b"x" * bytes_per_page + b"\n")
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with path.open("wb") as f:
+        writer.write(f)
+
+
+def _make_files(workdir: Path, args) -> tuple[list[Path], list[Path]]:
+    pdfs = []
+    for i in range(args.pdfs):
+        path = workdir / f"scan_{i:02d}.pdf"
+        _make_pdf(path, args.pdf_pages, 100 * 1024)
+        pdfs.append(path)
+    photos = []
+    for i in range(args.photos):
+        path = workdir / f"photo_{i:03d}.jpg"
+        path.write_bytes(os.urandom(300 * 1024))
+        photos.append(path)
+    return pdfs, photos
+
+
+def _pages(path: Path, args) -> int:
+    return args.pdf_pages if path.suffix == ".pdf" else 1
+
+
+def run(policy: str, pdfs: list[Path], photos: list[Path], args) -> dict[str, list[float]]:
+    """1つの方針で到着・処理を再現し、{"photo": [秒, ...], "pdf": [...]} を返す"""
+    work = PriorityWorkQueue(policy, args.aging, boost_marker="")
+    enqueued_at: dict[Path, float] = {}
+    latencies: dict[str, list[float]] = {"photo": [], "pdf": []}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            path = work.get()
+            if path is None:
+                work.task_done()
+                return
+            time.sleep(_pages(path, args) * args.ms_per_page / 1000)
+            with lock:
+                kind = "pdf" if path.suffix == ".pdf" else "photo"
+                latencies[kind].append(time.monotonic() - enqueued_at[path])
+            work.task_done()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+
+    # 前半（PDF 1件 + 写真の半分）はまとめて届き、残りは arrival_ms 間隔で届く（途中で次のPDFも届く）
+    half = len(photos) // 2
+    burst = pdfs[:1] + photos[:half]
+    trickle = photos[half:]
+    for i, pdf in enumerate(pdfs[1:], start=1):
+        trickle.insert(len(trickle) * i // len(pdfs), pdf)
+    for path in burst:
+        enqueued_at[path] = time.monotonic()
+        work.put(path)
+    for thread in threads:
+        thread.start()
+    for path in trickle:
+        time.sleep(args.arrival_ms / 1000)
+        enqueued_at[path] = time.monotonic()
+        work.put(path)
+
+    work.join()
+    for _ in threads:
+        work.put(None)
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def _summary(values: list[float]) -> str:
+    if not values:
+        return f"{'-':>8}{'-':>8}{'-':>8}"
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"{statistics.median(ordered):>8.2f}{p95:>8.2f}{ordered[-1]:>8.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", type=int, default=2)
+    parser.add_argument("--pdf-pages", type=int, default=300)
+    parser.add_argument("--photos", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--ms-per-page", type=float, default=10, help="1ページあたりの処理時間（解析の代わり）")
+    parser.add_argument("--arrival-ms", type=float, default=100, help="まとめて届いた後にファイルが届く間隔")
+    parser.add_argument("--aging", type=float, default=5, help="QUEUE_AGING_SECONDS 相当（秒）")
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=POLICIES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_work_queue_") as tmp:
+        pdfs, photos = _make_files(Path(tmp), args)
+        print(
+            f"PDF {args.pdfs}件 x {args.pdf_pages}ページ, 写真 {args.photos}件, ワーカー {args.workers}, "
+            f"1ページ {args.ms_per_page:.0f} ms, エージング {args.aging:.0f} 秒"
+        )
+        print()
+        print(f"{'policy':<12}{'写真 p50':>8}{'p95':>8}{'max':>8}   {'PDF p50':>8}{'p95':>8}{'max':>8}  （秒）")
+        for policy in args.policies:
+            latencies = run(policy, pdfs, photos, args)
+            print(f"{policy:<12}{_summary(latencies['photo'])}   {_summary(latencies['pdf'])}")
+
+
+if __name__ == "__main__":
+    main()
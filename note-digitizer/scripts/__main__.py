@@ -1,4 +1,10 @@
-"""エントリーポイント: python scripts/ で実行可能にする"""
+"""エントリーポイント: python scripts/ で実行可能にする
+
+    python -m scripts            フォルダ監視を開始する
+    python -m scripts backfill   監視フォルダの未処理ファイルを一括処理する
+    python -m scripts cleanup    出力フォルダの重複ノートを削除する
+    python -m scripts index      ノート索引をタグ・意図で検索する（rebuild で再構築）
+"""
 
 import sys
 from pathlib import Path
@@ -6,6 +12,22 @@ from pathlib import Path
 # scriptsディレクトリをパスに追加して直接インポートを可能にする
 sys.path.insert(0, str(Path(__file__).parent))
 
-from main import main  # noqa: E402
+# 画像前処理のプロセスプール（Windowsはspawn方式）が子プロセスで本モジュールを
+# 再読み込みしても main() を再実行しないようにガードする
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        from backfill import main as backfill_main
+
+        backfill_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "cleanup":
+        from cleanup_duplicates import main as cleanup_main
+
+        cleanup_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "index":
+        from note_index import main as index_main
+
+        index_main(sys.argv[2:])
+    else:
+        from main import main
 
-main()
+        main()
@@ -0,0 +1,111 @@
+"""Gemini解析結果のディスクキャッシュ（コンテンツアドレス方式）"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """解析結果のMarkdownをディスクに保存し、同一入力の再解析を省く。
+
+    キーは (ファイル内容のハッシュ, テンプレート適用後プロンプトのハッシュ, モデル名)。
+    ファイル名が変わった再同期コピーや、mark_processed 失敗後の再処理でもヒットする。
+
+    1エントリ = 1ファイル（<key>.md）。最終アクセス順は mtime で表し、
+    合計サイズが max_bytes を超えたら最も古いものから削除する（LRU）。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # key -> bytes（古い順）
+        self._total_bytes = 0
+        self._load()
+
+    def _load(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".md"):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.name[:-3], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        logger.debug(
+            "解析キャッシュ読み込み: %d件 (%.1f MB)",
+            len(self._entries),
+            self._total_bytes / 1024 / 1024,
+        )
+
+    @staticmethod
+    def make_key(content_hash: str, prompt: str, model_name: str) -> str:
+        """入力内容のハッシュ・プロンプト・モデルからキャッシュキーを生成する
+
+        content_hash はファイル全体のMD5、PDFをページ分割した場合は "<MD5>#p<開始>-<終了>"。
+        """
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = f"{content_hash}:{prompt_hash}:{model_name}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.md"
+
+    def get(self, key: str) -> str | None:
+        """キャッシュ済みのMarkdownを返す。なければ None。"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            content = self._path(key).read_text(encoding="utf-8")
+            os.utime(self._path(key))  # 最終アクセスを mtime に反映（再起動後のLRU順用）
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key: str, content: str):
+        """解析結果を保存し、上限を超えた分を古い順に削除する"""
+        data = content.encode("utf-8")
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("解析キャッシュの保存に失敗しました: %s", e)
+            return
+
+        evicted: list[str] = []
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+        if evicted:
+            logger.debug("解析キャッシュを削除: %d件", len(evicted))
+
+    def stats(self) -> str:
+        """ログ出力用のヒット率サマリ"""
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"hit {self.hits} / miss {self.misses} ({ratio:.0f}%)"
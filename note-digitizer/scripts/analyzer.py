@@ -1,64 +1,638 @@
 """Gemini Vision APIによる手書きノート解析"""
 
+import asyncio
 import logging
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-
-from google import genai
-from google.genai import types
-import PIL.Image
+from typing import Any, Callable
 
 PDF_EXTENSIONS = {".pdf"}
 
+from analysis_cache import AnalysisCache
 from config import Config
+from file_uploads import FileUploader
+from fingerprint import file_md5
+from markdown_writer import NoteStream
+from note_document import NoteDocument
+from pdf_pages import PAGE_PROMPT_SUFFIX, PageGroup, count_pages, merge_page_notes, split_pdf
+from prompt_cache import PromptCache
+from rate_limiter import RateLimiter, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
 PROMPT_PATH = Path(__file__).parent.parent / "references" / "gemini_prompt.md"
 
+# テンプレート（コンテキストキャッシュに載せる固定部分）の後ろに付ける、リクエストごとの可変部分
+DATE_PROMPT_SUFFIX = "\n\n# 今日の日付\n\n{date}\n"
+
+# 複数画像を1リクエストにまとめる場合の追加指示
+BATCH_PROMPT_SUFFIX = (
+    "\n\n# 複数画像の同時解析について\n\n"
+    "このリクエストには {count} 枚の画像が含まれ、それぞれ別のノートです。"
+    "各画像について上記フォーマットのMarkdownを1つずつ出力してください。\n"
+    "各ノートの直前には、画像番号 n を使った区切り行 `<<<NOTE n>>>` を単独の行として必ず出力してください"
+    "（例: 1枚目は `<<<NOTE 1>>>`）。区切り行以外の前置きや説明は出力しないでください。\n"
+)
+_BATCH_DELIMITER_RE = re.compile(r"^\s*`?<<<NOTE (\d+)>>>`?\s*$", re.MULTILINE)
+
+
+def _part(data: bytes, mime_type: str):
+    """バイト列のリクエストパーツ（google.genai は初回使用時に読み込む）"""
+    from google.genai import types
+
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
+
 
 class NoteAnalyzer:
     """手書きノート画像をGemini Vision APIで解析し、Markdownを生成する"""
 
     def __init__(self, config: Config):
-        self.client = genai.Client(api_key=config.gemini_api_key)
+        # google.genai の読み込みとクライアント作成は初回のAPI呼び出しまで遅らせる（起動時間の短縮）
+        self._api_key = config.gemini_api_key
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model_name = config.gemini_model
         self.prompt_template = self._load_prompt()
+        # テンプレートをコンテキストキャッシュに登録し、リクエストでは参照だけにする（TTL 0 で無効）
+        self.prompt_cache = (
+            PromptCache(
+                config.gemini_prompt_cache_path,
+                config.gemini_model,
+                config.gemini_prompt_cache_ttl_seconds,
+            )
+            if config.gemini_prompt_cache_ttl_seconds > 0
+            else None
+        )
+        self.cache = (
+            AnalysisCache(config.analysis_cache_dir, config.analysis_cache_max_bytes)
+            if config.analysis_cache_max_bytes > 0
+            else None
+        )
+        # しきい値以上の入力は Files API に1回だけアップロードし、URI で参照する（0 で無効）
+        self.uploader = (
+            FileUploader(config.gemini_upload_cache_path, config.gemini_upload_min_bytes)
+            if config.gemini_upload_min_bytes > 0
+            else None
+        )
+        self.image_max_edge = config.image_max_edge
+        self.image_quality = config.image_quality
+        self.image_format = config.image_format
+        # CPU負荷の高いデコード・縮小で監視スレッドを止めないよう別プロセスで実行する（初回使用時に起動）
+        self.preprocess_workers = config.preprocess_workers
+        self._preprocess_pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        # PDFのページ分割解析（0 で分割しない）
+        self.pdf_pages_per_request = config.pdf_pages_per_request
+        self.pdf_page_concurrency = config.pdf_page_concurrency
+        # すべてのAPI呼び出しで共有するレート制限・同時実行数制御・再試行
+        self.rate_limiter = RateLimiter(
+            config.gemini_rpm,
+            config.gemini_tpm,
+            config.gemini_max_concurrency,
+            config.gemini_max_retries,
+        )
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                from google import genai
+
+                self._client = genai.Client(api_key=self._api_key)
+            return self._client
+
+    def warm_up(self):
+        """google.genai の読み込みとクライアント作成、コンテキストキャッシュの登録を済ませておく
+
+        監視開始後にバックグラウンドで呼ぶ。
+        """
+        try:
+            self.client
+        except Exception as e:
+            logger.warning("Gemini クライアントの初期化に失敗しました: %s", e)
+            return
+        if self.prompt_cache is not None:
+            self.prompt_cache.cached_content(self.client, self.prompt_template)
 
     def _load_prompt(self) -> str:
         """プロンプトテンプレートを読み込む"""
+        self._prompt_mtime = PROMPT_PATH.stat().st_mtime_ns
         return PROMPT_PATH.read_text(encoding="utf-8")
 
-    def analyze(self, image_path: Path) -> str:
-        """画像またはPDFを解析してMarkdown文字列を返す"""
+    def analyze(self, image_path: Path, stream: NoteStream | None = None) -> NoteDocument:
+        """画像またはPDFを解析してノートを返す
+
+        stream を渡すと応答をストリーミングで受信して stream に書き込む（ページ分割するPDFと
+        キャッシュヒット時は通常どおり。stream.finished で書き込んだかどうかが分かる）。
+        """
         logger.info("解析開始: %s", image_path.name)
 
-        today = datetime.now().strftime("%Y-%m-%d")
-        prompt = self.prompt_template.replace("{date}", today)
+        prompt = self._render_prompt()
+        if self._should_split(image_path):
+            doc = self._analyze_pdf_pages(image_path, prompt)
+        else:
+            doc = self._analyze_whole(image_path, prompt, stream)
 
-        if image_path.suffix.lower() in PDF_EXTENSIONS:
-            # PDFはバイトデータとして送信
-            pdf_bytes = image_path.read_bytes()
-            file_part = types.Part.from_bytes(data=pdf_bytes, mime_type="application/pdf")
-            contents = [prompt, file_part]
+        logger.info("解析完了: %s", image_path.name)
+        return doc
+
+    async def analyze_async(
+        self, image_path: Path, stream: NoteStream | None = None
+    ) -> NoteDocument:
+        """analyze の非同期版。非同期クライアントでAPIを呼び出す。"""
+        logger.info("解析開始: %s", image_path.name)
+
+        prompt = self._render_prompt()
+        if await asyncio.to_thread(self._should_split, image_path):
+            doc = await self._analyze_pdf_pages_async(image_path, prompt)
         else:
-            # 画像はPILで読み込み
-            image = PIL.Image.open(image_path)
-            contents = [prompt, image]
+            doc = await self._analyze_whole_async(image_path, prompt, stream)
+
+        logger.info("解析完了: %s", image_path.name)
+        return doc
+
+    def analyze_batch(self, image_paths: list[Path]) -> dict[Path, NoteDocument]:
+        """複数の画像を1リクエストで解析し、画像ごとのノートを返す
+
+        プロンプトは1回だけ送り、各画像のノートを区切り行付きで出力させて分割する。
+        区切りが見つからない・フロントマターが無いなど取り出せなかった画像は結果に含めない
+        （呼び出し側で単独解析にフォールバックする）。リクエスト自体の失敗時は空の dict を返す。
+        """
+        prompt = self._render_prompt()
+        results: dict[Path, NoteDocument] = {}
+        pending: list[tuple[Path, str | None]] = []  # (画像, キャッシュキー)
+        for path in image_paths:
+            try:
+                cache_key, cached = self._lookup_cache(file_md5(path), path.name, prompt)
+            except OSError as e:
+                # 読めない画像はまとめず、呼び出し側の単独処理に任せる
+                logger.warning("バッチから除外します: %s (%s)", path.name, e)
+                continue
+            if cached is not None:
+                results[path] = NoteDocument.parse(cached)
+            else:
+                pending.append((path, cache_key))
+        if len(pending) <= 1:
+            # まとめる必要がない（1件以下なら呼び出し側の単独解析に任せる）
+            return results
+
+        images: list = []
+        prepared: list[tuple[Path, str | None]] = []
+        for path, cache_key in pending:
+            try:
+                data, mime_type = self._preprocess(path)
+            except Exception as e:
+                # 壊れた・消えた画像は除外し、呼び出し側の単独処理に任せる
+                logger.warning("バッチから除外します: %s (%s)", path.name, e)
+                continue
+            images.append(f"画像 {len(prepared) + 1}: {path.name}")
+            images.append(_part(data, mime_type))
+            prepared.append((path, cache_key))
+        pending = prepared
+        if len(pending) <= 1:
+            return results
+
+        logger.info("バッチ解析開始: %d件 (%s)", len(pending), ", ".join(p.name for p, _ in pending))
+        contents: list = [
+            prompt + BATCH_PROMPT_SUFFIX.format(count=len(pending)),
+            *images,
+        ]
+        try:
+            response = self._generate(contents, f"バッチ {len(pending)}件")
+            notes = self._split_batch_response(response.text)
+        except Exception as e:
+            logger.warning("バッチ解析に失敗したため単独解析に切り替えます: %s", e)
+            return results
+
+        for i, (path, cache_key) in enumerate(pending, start=1):
+            doc = notes.get(i)
+            if doc is None or not doc.has_frontmatter:
+                logger.warning("バッチ応答から取り出せませんでした: %s (画像 %d)", path.name, i)
+                continue
+            results[path] = doc
+            if cache_key is not None:
+                self.cache.put(cache_key, doc.text)
+        logger.info("バッチ解析完了: %d/%d件", len(results), len(image_paths))
+        return results
+
+    @staticmethod
+    def _split_batch_response(text: str) -> dict[int, NoteDocument]:
+        """区切り行 <<<NOTE n>>> で応答を分割し、{画像番号: ノート} を返す"""
+        parts = _BATCH_DELIMITER_RE.split(text)
+        # split結果: [前置き, 番号1, 本文1, 番号2, 本文2, ...]
+        notes: dict[int, NoteDocument] = {}
+        for number, body in zip(parts[1::2], parts[2::2]):
+            if int(number) not in notes:
+                notes[int(number)] = NoteDocument.parse(body)
+        return notes
+
+    def _analyze_whole(
+        self, image_path: Path, prompt: str, stream: NoteStream | None = None
+    ) -> NoteDocument:
+        content_hash = file_md5(image_path)
+        cache_key, cached = self._lookup_cache(content_hash, image_path.name, prompt)
+        if cached is not None:
+            return NoteDocument.parse(cached)
+
+        contents = self._build_contents(image_path, prompt, content_hash)
+        try:
+            if stream is not None:
+                doc = self._generate_stream(contents, image_path.name, stream)
+            else:
+                doc = NoteDocument.parse(self._generate(contents, image_path.name).text)
+        except Exception as e:
+            self._invalidate_upload(content_hash, e)
+            raise
+        if cache_key is not None:
+            self.cache.put(cache_key, doc.text)
+        return doc
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=contents,
+    async def _analyze_whole_async(
+        self, image_path: Path, prompt: str, stream: NoteStream | None = None
+    ) -> NoteDocument:
+        # ハッシュ計算・ファイル読み込みはブロッキングI/Oのためスレッドに逃がす
+        content_hash = await asyncio.to_thread(file_md5, image_path)
+        cache_key, cached = await asyncio.to_thread(
+            self._lookup_cache, content_hash, image_path.name, prompt
         )
-        content = response.text
+        if cached is not None:
+            return NoteDocument.parse(cached)
 
-        # Geminiがコードブロックで囲んで返す場合の除去
-        if content.startswith("```markdown"):
-            content = content[len("```markdown"):].strip()
-        if content.startswith("```"):
-            content = content[3:].strip()
-        if content.endswith("```"):
-            content = content[:-3].strip()
+        contents = await asyncio.to_thread(
+            self._build_contents, image_path, prompt, content_hash
+        )
+        try:
+            if stream is not None:
+                doc = await self._generate_stream_async(contents, image_path.name, stream)
+            else:
+                doc = NoteDocument.parse(
+                    (await self._generate_async(contents, image_path.name)).text
+                )
+        except Exception as e:
+            self._invalidate_upload(content_hash, e)
+            raise
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, doc.text)
+        return doc
 
-        logger.info("解析完了: %s", image_path.name)
-        return content
+    def _should_split(self, image_path: Path) -> bool:
+        """ページ分割解析の対象か（分割が有効で、1リクエスト分より多いページがあるPDF）"""
+        if self.pdf_pages_per_request <= 0 or image_path.suffix.lower() not in PDF_EXTENSIONS:
+            return False
+        try:
+            return count_pages(image_path) > self.pdf_pages_per_request
+        except Exception as e:
+            logger.warning("PDFのページ数を取得できないため一括で解析します: %s (%s)", image_path.name, e)
+            return False
+
+    def _analyze_pdf_pages(self, pdf_path: Path, prompt: str) -> NoteDocument:
+        """PDFをページ群に分割して並列に解析し、1つのノートにマージする
+
+        各ページ群の結果は個別にキャッシュされるため、一部のページ群が失敗しても
+        再試行時は失敗したページ群だけがAPIに送られる。
+        """
+        content_hash = file_md5(pdf_path)
+        total, groups = split_pdf(pdf_path, self.pdf_pages_per_request)
+        logger.info(
+            "PDFをページ分割して解析: %s (%dページ -> %d分割, 並列 %d)",
+            pdf_path.name,
+            total,
+            len(groups),
+            self.pdf_page_concurrency,
+        )
+        with ThreadPoolExecutor(
+            max_workers=self.pdf_page_concurrency, thread_name_prefix="pdf-page"
+        ) as pool:
+            futures = [
+                pool.submit(
+                    self._analyze_page_group, pdf_path, content_hash, total, group, prompt
+                )
+                for group in groups
+            ]
+            # 失敗したページ群があっても、成功したページ群の結果がキャッシュされるまで待つ
+            wait(futures)
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            logger.warning(
+                "PDFのページ解析に失敗: %s (%d/%d分割)", pdf_path.name, len(errors), len(groups)
+            )
+            raise errors[0]
+        return merge_page_notes(
+            [(g.first, g.last, f.result()) for g, f in zip(groups, futures)]
+        )
+
+    async def _analyze_pdf_pages_async(self, pdf_path: Path, prompt: str) -> NoteDocument:
+        """_analyze_pdf_pages の非同期版。ページ群の同時実行数はセマフォで制限する。"""
+        content_hash = await asyncio.to_thread(file_md5, pdf_path)
+        total, groups = await asyncio.to_thread(
+            split_pdf, pdf_path, self.pdf_pages_per_request
+        )
+        logger.info(
+            "PDFをページ分割して解析: %s (%dページ -> %d分割, 並列 %d)",
+            pdf_path.name,
+            total,
+            len(groups),
+            self.pdf_page_concurrency,
+        )
+        semaphore = asyncio.Semaphore(self.pdf_page_concurrency)
+
+        async def run(group: PageGroup) -> NoteDocument:
+            async with semaphore:
+                return await self._analyze_page_group_async(
+                    pdf_path, content_hash, total, group, prompt
+                )
+
+        results = await asyncio.gather(*(run(g) for g in groups), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            logger.warning(
+                "PDFのページ解析に失敗: %s (%d/%d分割)", pdf_path.name, len(errors), len(groups)
+            )
+            raise errors[0]
+        return merge_page_notes([(g.first, g.last, r) for g, r in zip(groups, results)])
+
+    def _analyze_page_group(
+        self, pdf_path: Path, content_hash: str, total: int, group: PageGroup, prompt: str
+    ) -> NoteDocument:
+        label = f"{pdf_path.name} p.{group.first}-{group.last}"
+        group_hash = f"{content_hash}#p{group.first}-{group.last}"
+        cache_key, cached = self._lookup_cache(group_hash, label, prompt)
+        if cached is not None:
+            return NoteDocument.parse(cached)
+
+        contents = self._build_page_contents(total, group, prompt, group_hash, label)
+        try:
+            response = self._generate(contents, label)
+        except Exception as e:
+            self._invalidate_upload(group_hash, e)
+            raise
+        doc = NoteDocument.parse(response.text)
+        if cache_key is not None:
+            self.cache.put(cache_key, doc.text)
+        logger.info("ページ解析完了: %s", label)
+        return doc
+
+    async def _analyze_page_group_async(
+        self, pdf_path: Path, content_hash: str, total: int, group: PageGroup, prompt: str
+    ) -> NoteDocument:
+        label = f"{pdf_path.name} p.{group.first}-{group.last}"
+        group_hash = f"{content_hash}#p{group.first}-{group.last}"
+        cache_key, cached = await asyncio.to_thread(self._lookup_cache, group_hash, label, prompt)
+        if cached is not None:
+            return NoteDocument.parse(cached)
+
+        # アップロードはブロッキングI/Oのためスレッドに逃がす
+        contents = await asyncio.to_thread(
+            self._build_page_contents, total, group, prompt, group_hash, label
+        )
+        try:
+            response = await self._generate_async(contents, label)
+        except Exception as e:
+            self._invalidate_upload(group_hash, e)
+            raise
+        doc = NoteDocument.parse(response.text)
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, doc.text)
+        logger.info("ページ解析完了: %s", label)
+        return doc
+
+    def _build_page_contents(
+        self, total: int, group: PageGroup, prompt: str, group_hash: str, label: str
+    ) -> list:
+        page_prompt = prompt + PAGE_PROMPT_SUFFIX.format(
+            total=total, first=group.first, last=group.last
+        )
+        return [page_prompt, self._file_part(group_hash, group.data, "application/pdf", label)]
+
+    def _generate(self, contents: list, label: str):
+        """レート制限・再試行付きで generate_content を呼び出す"""
+        return self._send(
+            contents,
+            label,
+            lambda request, config: self.client.models.generate_content(
+                model=self.model_name, contents=request, config=config
+            ),
+        )
+
+    async def _generate_async(self, contents: list, label: str):
+        """_generate の非同期版"""
+        return await self._send_async(
+            contents,
+            label,
+            lambda request, config: self.client.aio.models.generate_content(
+                model=self.model_name, contents=request, config=config
+            ),
+        )
+
+    def _send(self, contents: list, label: str, call: Callable[[list, Any], Any]):
+        """call(contents, config) をレート制限・再試行付きで呼び出す
+
+        コンテキストキャッシュが使える場合は、テンプレート部分を除いた contents でキャッシュを参照させる。
+        参照したキャッシュが削除・期限切れだった場合は、プロンプト全体を送ってやり直す。
+        それ以外のエラー（アップロード済みファイルの期限切れなど）はそのまま送出し、呼び出し側で扱う。
+        """
+        request, cache_name = self._prompt_cache_request(contents)
+        try:
+            response = self.rate_limiter.call(
+                lambda: call(request, self._generate_config(cache_name)),
+                estimate_tokens(contents),
+                label,
+            )
+        except Exception as e:
+            if cache_name is None or not self.prompt_cache.invalidate(cache_name, e):
+                raise
+            self.prompt_cache.record(False, None)
+            return self.rate_limiter.call(lambda: call(contents, None), estimate_tokens(contents), label)
+        if cache_name is not None:
+            self.prompt_cache.record(True, response)
+        return response
+
+    async def _send_async(self, contents: list, label: str, call: Callable[[list, Any], Any]):
+        """_send の非同期版。call はコルーチンを返す。"""
+        # キャッシュの作成・延長はブロッキングI/Oのためスレッドに逃がす
+        request, cache_name = await asyncio.to_thread(self._prompt_cache_request, contents)
+        try:
+            response = await self.rate_limiter.call_async(
+                lambda: call(request, self._generate_config(cache_name)),
+                estimate_tokens(contents),
+                label,
+            )
+        except Exception as e:
+            if cache_name is None or not self.prompt_cache.invalidate(cache_name, e):
+                raise
+            self.prompt_cache.record(False, None)
+            return await self.rate_limiter.call_async(
+                lambda: call(contents, None), estimate_tokens(contents), label
+            )
+        if cache_name is not None:
+            self.prompt_cache.record(True, response)
+        return response
+
+    def _prompt_cache_request(self, contents: list) -> tuple[list, str | None]:
+        """コンテキストキャッシュを参照する場合の (contents, キャッシュ名) を返す
+
+        先頭のプロンプトがテンプレートで始まるときだけ、テンプレート部分を除いた contents にする。
+        キャッシュが無効・使えない場合は (contents, None)。
+        """
+        template = self.prompt_template
+        if (
+            self.prompt_cache is None
+            or not isinstance(contents[0], str)
+            or not contents[0].startswith(template)
+        ):
+            return contents, None
+        cache_name = self.prompt_cache.cached_content(self.client, template)
+        if cache_name is None:
+            self.prompt_cache.record(False, None)
+            return contents, None
+        return [contents[0][len(template):], *contents[1:]], cache_name
+
+    @staticmethod
+    def _generate_config(cache_name: str | None):
+        if cache_name is None:
+            return None
+        from google.genai import types
+
+        return types.GenerateContentConfig(cached_content=cache_name)
+
+    def _generate_stream(self, contents: list, label: str, stream: NoteStream) -> NoteDocument:
+        """generate_content_stream の応答をチャンクごとに stream へ書き込む
+
+        途中で失敗して再試行する場合は、書き込み済みの内容を捨てて最初から受信し直す。
+        最後のチャンクに付くトークン使用量をレート制限の精算に使う。
+        """
+
+        def consume(request: list, config):
+            stream.reset()
+            last = None
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model_name, contents=request, config=config
+            ):
+                if chunk.text:
+                    stream.write(chunk.text)
+                last = chunk
+            return last
+
+        self._send(contents, label, consume)
+        return stream.finish()
+
+    async def _generate_stream_async(
+        self, contents: list, label: str, stream: NoteStream
+    ) -> NoteDocument:
+        """_generate_stream の非同期版。ファイルへの書き込みはスレッドに逃がす。"""
+
+        async def consume(request: list, config):
+            await asyncio.to_thread(stream.reset)
+            last = None
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                model=self.model_name, contents=request, config=config
+            ):
+                if chunk.text:
+                    await asyncio.to_thread(stream.write, chunk.text)
+                last = chunk
+            return last
+
+        await self._send_async(contents, label, consume)
+        return await asyncio.to_thread(stream.finish)
+
+    def _render_prompt(self) -> str:
+        """テンプレートの後ろに当日の日付を付けたプロンプトを返す
+
+        テンプレートのファイルが更新されていれば読み込み直す（コンテキストキャッシュはハッシュが
+        変わったことで作り直される）。テンプレート内の {date} も置換するが、その場合はテンプレートが
+        日ごとに変わるためコンテキストキャッシュは使われない。
+        """
+        try:
+            if PROMPT_PATH.stat().st_mtime_ns != self._prompt_mtime:
+                self.prompt_template = self._load_prompt()
+                logger.info("プロンプトテンプレートを読み込み直しました: %s", PROMPT_PATH.name)
+        except OSError as e:
+            logger.warning("プロンプトテンプレートを読み込めないため前回の内容を使います: %s", e)
+        today = datetime.now().strftime("%Y-%m-%d")
+        return self.prompt_template.replace("{date}", today) + DATE_PROMPT_SUFFIX.format(date=today)
+
+    def _lookup_cache(
+        self, content_hash: str, label: str, prompt: str
+    ) -> tuple[str | None, str | None]:
+        """(キャッシュキー, キャッシュ済みMarkdown) を返す。キャッシュ無効時は (None, None)。"""
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(content_hash, prompt, self.model_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info("解析キャッシュヒット: %s [%s]", label, self.cache.stats())
+        else:
+            logger.debug("解析キャッシュミス: %s [%s]", label, self.cache.stats())
+        return key, cached
+
+    def _build_contents(self, image_path: Path, prompt: str, content_hash: str) -> list:
+        """プロンプトとファイルからリクエストのcontentsを組み立てる"""
+        if image_path.suffix.lower() in PDF_EXTENSIONS:
+            # PDFはそのまま送信（大きいものは Files API 経由）
+            return [
+                prompt,
+                self._file_part(content_hash, image_path, "application/pdf", image_path.name),
+            ]
+        # 画像は縮小・再圧縮してから送信
+        data, mime_type = self._preprocess(image_path)
+        return [prompt, _part(data, mime_type)]
+
+    def _file_part(self, key: str, source: Path | bytes, mime_type: str, label: str):
+        """入力のリクエストパーツを返す
+
+        GEMINI_UPLOAD_MIN_MB 以上なら Files API にアップロード済みのファイルを参照し、それ以外
+        （またはアップロードに失敗した場合）はバイト列をリクエストに埋め込む。
+        """
+        size = source.stat().st_size if isinstance(source, Path) else len(source)
+        if self.uploader is not None and self.uploader.should_upload(size):
+            try:
+                return self.uploader.part(self.client, key, source, mime_type, label)
+            except Exception as e:
+                logger.warning(
+                    "Files API へのアップロードに失敗したため、リクエストに埋め込みます: %s (%s)",
+                    label,
+                    e,
+                )
+        data = source.read_bytes() if isinstance(source, Path) else source
+        return _part(data, mime_type)
+
+    def _invalidate_upload(self, key: str, exc: BaseException):
+        if self.uploader is not None:
+            self.uploader.invalidate(key, exc)
+
+    def _preprocess(self, image_path: Path) -> tuple[bytes, str]:
+        """画像前処理をプロセスプールで実行し、(データ, MIMEタイプ) を返す"""
+        from image_preprocess import preprocess_image
+
+        args = (str(image_path), self.image_max_edge, self.image_quality, self.image_format)
+        if self.preprocess_workers > 0:
+            with self._pool_lock:
+                if self._preprocess_pool is None:
+                    self._preprocess_pool = ProcessPoolExecutor(
+                        max_workers=self.preprocess_workers
+                    )
+            data, mime_type, original_size = self._preprocess_pool.submit(
+                preprocess_image, *args
+            ).result()
+        else:
+            data, mime_type, original_size = preprocess_image(*args)
+        logger.info(
+            "画像前処理: %s %d KB -> %d KB (%s)",
+            image_path.name,
+            original_size // 1024,
+            len(data) // 1024,
+            mime_type,
+        )
+        return data, mime_type
+
+    def close(self):
+        """前処理用のプロセスプールを停止する"""
+        if self.prompt_cache is not None:
+            logger.info("コンテキストキャッシュ: %s", self.prompt_cache.stats())
+        with self._pool_lock:
+            if self._preprocess_pool is not None:
+                self._preprocess_pool.shutdown()
+                self._preprocess_pool = None
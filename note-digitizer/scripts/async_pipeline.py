@@ -0,0 +1,216 @@
+"""asyncioイベントループ上で動くパイプライン（PIPELINE_MODE=async）
+
+スレッドモードの「デバウンス用スケジューラスレッド + ブロッキングワーカー」の代わりに、
+デバウンスは loop.call_later、解析は非同期クライアントのコルーチンとして実行する
+（Discord通知はアウトボックスに積むだけで、送信はバックグラウンドスレッドが行う）。
+同時に待機できるAPI呼び出し数はセマフォで制限する。
+"""
+
+import asyncio
+import contextlib
+import logging
+import signal
+import time
+from pathlib import Path
+
+from watchdog.events import FileSystemEventHandler
+
+from analyzer import NoteAnalyzer
+from config import Config
+from discord_notify import DiscordNotifier
+import metrics
+from markdown_writer import MarkdownWriter
+from processed_tracker import ProcessedTracker, normalize_filename
+from watcher import SUPPORTED_EXTENSIONS, create_observer
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncNoteHandler(FileSystemEventHandler):
+    """watchdogのイベントをイベントループへ橋渡しし、ファイルごとにタスクを起動する
+
+    _timers / _queued / _tasks はイベントループのスレッドからのみ触るためロック不要。
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        analyzer: NoteAnalyzer,
+        writer: MarkdownWriter,
+        notifier: DiscordNotifier,
+        tracker: ProcessedTracker,
+        loop: asyncio.AbstractEventLoop,
+    ):
+        self.config = config
+        self.analyzer = analyzer
+        self.writer = writer
+        self.notifier = notifier
+        self.tracker = tracker
+        self._loop = loop
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._queued: set[str] = set()  # 正規化キーで二重起動を防止
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(config.async_max_inflight)
+        self._first_event: dict[str, float] = {}  # メトリクス用: 最初のイベント時刻
+        metrics.set_gauge("queue_depth", lambda: len(self._tasks))
+
+    def on_created(self, event):
+        self._dispatch(event)
+
+    def on_modified(self, event):
+        self._dispatch(event)
+
+    def _dispatch(self, event):
+        """watchdogスレッドから呼ばれる。イベントループへ処理を委譲する。"""
+        if event.is_directory:
+            return
+        path = Path(event.src_path)
+        if path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            return
+        self._loop.call_soon_threadsafe(self._schedule, path)
+
+    def _schedule(self, path: Path):
+        """デバウンス処理: 最後のイベントから debounce_seconds 後に _enqueue を呼ぶ"""
+        key = str(path)
+        self._first_event.setdefault(key, time.monotonic())
+        handle = self._timers.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        self._timers[key] = self._loop.call_later(
+            self.config.debounce_seconds, self._enqueue, path
+        )
+        logger.debug("スケジュール登録: %s (%g秒後)", path.name, self.config.debounce_seconds)
+
+    def _enqueue(self, path: Path):
+        """デバウンス完了後に呼ばれる。正規化キーで重複チェックしてタスクを起動する。"""
+        self._timers.pop(str(path), None)
+        first_event = self._first_event.pop(str(path), None)
+        if first_event is not None:
+            metrics.observe("debounce_wait", time.monotonic() - first_event)
+
+        norm_key = normalize_filename(path.name)
+        if norm_key in self._queued:
+            logger.info("スキップ（キュー登録済み）: %s -> %s", path.name, norm_key)
+            metrics.inc("skipped_queued")
+            return
+        self._queued.add(norm_key)
+
+        logger.info("キューに追加: %s (キー: %s)", path.name, norm_key)
+        task = self._loop.create_task(self._process(path, norm_key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _open_stream(self, image_path: Path):
+        """GEMINI_STREAMING 有効時は応答を書き込む NoteStream を、無効時は None を返すコンテキスト"""
+        if self.config.gemini_streaming:
+            return self.writer.open_stream(image_path.name)
+        return contextlib.nullcontext()
+
+    async def _process(self, image_path: Path, norm_key: str):
+        try:
+            if not image_path.exists():
+                logger.warning("ファイルが見つかりません（処理開始時）: %s", image_path.name)
+                return
+            # ハッシュ計算はブロッキングのためスレッドに逃がす
+            with metrics.timer("tracker_hash"):
+                processed = await asyncio.to_thread(self.tracker.is_processed, image_path)
+            if processed:
+                logger.info("スキップ（処理済み）: %s", image_path.name)
+                metrics.inc("skipped_processed")
+                return
+
+            waiting_since = time.monotonic()
+            async with self._semaphore:
+                metrics.observe("queue_wait", time.monotonic() - waiting_since)
+                logger.info("=== パイプライン開始: %s ===", image_path.name)
+                with self._open_stream(image_path) as stream:
+                    with metrics.timer("analyze"):
+                        doc = await self.analyzer.analyze_async(image_path, stream)
+                    streamed = stream is not None and stream.finished
+                    if streamed and stream.ttfb is not None:
+                        metrics.observe("analyze_ttfb", stream.ttfb)
+                    with metrics.timer("write"):
+                        if streamed:
+                            output_path = await asyncio.to_thread(stream.commit)
+                        else:
+                            output_path = await asyncio.to_thread(
+                                self.writer.write, doc, image_path.name
+                            )
+                with metrics.timer("notify"):
+                    await asyncio.to_thread(self.notifier.notify, doc, output_path)
+                with metrics.timer("tracker_commit"):
+                    await asyncio.to_thread(self.tracker.mark_processed, image_path)
+                metrics.inc("processed")
+                logger.info(
+                    "=== パイプライン完了: %s -> %s ===",
+                    image_path.name,
+                    output_path.name,
+                )
+        except Exception:
+            logger.exception("パイプライン処理中にエラーが発生しました: %s", image_path.name)
+            metrics.inc("failed")
+        finally:
+            # エラー時もリセット → 次回同ファイルの再試行が可能
+            self._queued.discard(norm_key)
+
+    async def drain(self):
+        """保留中のデバウンスを破棄し、実行中のタスクの完了を待つ"""
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        if self._tasks:
+            logger.info("実行中のタスクの完了を待機: %d件", len(self._tasks))
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def _run(
+    config: Config,
+    analyzer: NoteAnalyzer,
+    writer: MarkdownWriter,
+    notifier: DiscordNotifier,
+    tracker: ProcessedTracker,
+):
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+
+    def handle_signal(signum, frame):
+        loop.call_soon_threadsafe(stop_event.set)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    handler = AsyncNoteHandler(config, analyzer, writer, notifier, tracker, loop)
+    if config.backfill_on_start:
+        # 停止中に追加されたファイルを監視開始前にタスクとして起動する
+        from backfill import scan_backlog
+
+        backlog = await asyncio.to_thread(scan_backlog, config, tracker)
+        for path in backlog:
+            handler._enqueue(path)
+        logger.info("起動時バックフィル: %d件", len(backlog))
+    observer = create_observer(config)
+    observer.schedule(handler, str(config.watch_folder), recursive=False)
+    observer.start()
+    logger.info(
+        "フォルダ監視を開始しました（asyncモード、同時実行上限 %d）: %s",
+        config.async_max_inflight,
+        config.watch_folder,
+    )
+
+    try:
+        await stop_event.wait()
+    finally:
+        observer.stop()
+        await asyncio.to_thread(observer.join)
+        await handler.drain()
+
+
+def run_async(
+    config: Config,
+    analyzer: NoteAnalyzer,
+    writer: MarkdownWriter,
+    notifier: DiscordNotifier,
+    tracker: ProcessedTracker,
+):
+    """asyncモードでフォルダ監視を実行する。SIGINT/SIGTERM を受けるまで戻らない。"""
+    asyncio.run(_run(config, analyzer, writer, notifier, tracker))
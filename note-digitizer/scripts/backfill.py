@@ -0,0 +1,131 @@
+"""監視フォルダの未処理ファイルを一括処理する（バックフィル）
+
+watchdog は作成・変更イベントにしか反応しないため、デーモン停止中に同期されたファイルは
+再度触られるまで処理されない。本モジュールはフォルダを走査して未処理ファイルを
+NoteHandler のキューに積み、通常と同じパイプライン（ワーカープール）で処理する。
+
+使い方:
+    python -m scripts backfill [--workers N] [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+
+from analyzer import NoteAnalyzer
+from config import Config
+from discord_notify import DiscordNotifier
+from markdown_writer import MarkdownWriter
+from metrics import start_exporter
+from processed_tracker import ProcessedTracker
+from watcher import SUPPORTED_EXTENSIONS, NoteHandler
+
+logger = logging.getLogger(__name__)
+
+_REPORT_INTERVAL = 5.0  # 進捗表示の間隔（秒）
+
+
+def scan_backlog(config: Config, tracker: ProcessedTracker) -> list[Path]:
+    """監視フォルダ直下の対応ファイルのうち、未処理のものを古い順に返す"""
+    candidates: list[tuple[int, Path]] = []
+    with os.scandir(config.watch_folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            if Path(entry.name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            candidates.append((entry.stat().st_mtime_ns, Path(entry.path)))
+    candidates.sort()
+    backlog = [path for _, path in candidates if not tracker.is_processed(path)]
+    logger.info("バックフィル対象: %d件（対応ファイル %d件）", len(backlog), len(candidates))
+    return backlog
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, sec = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{sec:02d}"
+
+
+def run_backfill(handler: NoteHandler, backlog: list[Path]) -> int:
+    """バックログをキューに積み、すべて処理されるまで進捗を表示しながら待つ。処理件数を返す。"""
+    total = sum(handler.enqueue(path) for path in backlog)
+    if total == 0:
+        print("処理対象のファイルはありません。")
+        return 0
+
+    start = time.monotonic()
+    while True:
+        remaining = handler.pending()
+        done = total - remaining
+        elapsed = time.monotonic() - start
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0  # files/min
+        eta = _format_eta(remaining / (rate / 60)) if rate > 0 else "--:--:--"
+        print(
+            f"[進捗] {done}/{total} ({done / total:.0%})  "
+            f"{rate:.1f} files/min  ETA {eta}",
+            flush=True,
+        )
+        if remaining == 0:
+            break
+        time.sleep(_REPORT_INTERVAL)
+
+    elapsed = time.monotonic() - start
+    print(f"=== バックフィル完了: {total}件 / {_format_eta(elapsed)} ===")
+    return total
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts backfill",
+        description="監視フォルダの未処理ファイルを一括処理する",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="並列数（デフォルト: WORKER_CONCURRENCY）"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="対象ファイルの一覧表示のみ行う"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    config = Config()
+    config.validate()
+    if args.workers:
+        config.worker_concurrency = max(1, args.workers)
+
+    tracker = ProcessedTracker(
+        config.processed_db_path,
+        config.processed_db_backend,
+        config.near_dup_hamming_threshold,
+    )
+    backlog = scan_backlog(config, tracker)
+
+    if args.dry_run:
+        for path in backlog:
+            print(f"[TARGET] {path.name}")
+        print(f"=== 対象合計: {len(backlog)} ファイル ===")
+        tracker.close()
+        return
+
+    exporter = start_exporter(config)
+    analyzer = NoteAnalyzer(config)
+    writer = MarkdownWriter(config)
+    notifier = DiscordNotifier(config)
+    handler = NoteHandler(config, analyzer, writer, notifier, tracker)
+    try:
+        run_backfill(handler, backlog)
+    finally:
+        handler.shutdown()
+        analyzer.close()
+        writer.close()
+        notifier.close()
+        exporter.close()
+        tracker.close()
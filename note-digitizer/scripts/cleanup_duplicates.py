@@ -1,52 +1,191 @@
-"""Obsidian手書きノートフォルダの重複ファイルを削除する（古い方を削除、新しい方を残す）"""
+"""Obsidian手書きノートフォルダの重複ファイルを削除する（古い方を削除、新しい方を残す）
 
+出力フォルダ（Config.output_dir）のノートを出力インデックスに登録し（2回目以降は差分のみ）、
+以下のいずれかで同じグループになったノートのうち、最新のもの以外を削除対象とする。
+
+- ソースキーが同じ（同じスキャン・その Drive の " (n)" コピーから生成されたノート）
+- 内容ハッシュが同じ（ファイル名に関係なく中身が完全一致）
+
+使い方:
+    python -m scripts cleanup [plan]                 削除計画を表示する（削除しない）
+    python -m scripts cleanup plan --json > plan.json
+    python -m scripts cleanup execute [--plan plan.json]
+        --plan を指定した場合は、その計画の作成後に変更されていないファイルだけを削除する
+"""
+
+import argparse
+import json
+import logging
 import sys
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-VAULT_DIR = Path("C:/Users/north/Documents/Obsidian Vault/手書きノート")
-
-def main(dry_run: bool = True):
-    groups: dict[str, list[Path]] = defaultdict(list)
-    for f in VAULT_DIR.glob("*.md"):
-        # ファイル名形式: YYYYMMDD_HHMMSS_スキャン_....md
-        parts = f.name.split("_", 2)
-        if len(parts) >= 3:
-            source_name = parts[2]  # タイムスタンプを除いたソース名
-            groups[source_name].append(f)
-
-    to_delete: list[Path] = []
-    for source, files in sorted(groups.items()):
-        if len(files) > 1:
-            files.sort(key=lambda f: f.name)  # タイムスタンプ昇順 → 最後が最新
-            keep = files[-1]
-            for old in files[:-1]:
-                to_delete.append(old)
-            print(f"[KEEP]   {keep.name}")
-            for d in files[:-1]:
-                print(f"[DELETE] {d.name}")
-            print()
-
-    print(f"=== 削除対象合計: {len(to_delete)} ファイル ===")
-
-    if dry_run:
-        print("\n※ DRY RUNモードです。実際の削除は行っていません。")
-        print("  削除を実行するには: python cleanup_duplicates.py --execute")
-        return
-
-    print("\n削除を開始します...")
-    deleted = 0
-    for f in to_delete:
+from config import Config
+from note_index import NoteIndex
+from output_index import NoteEntry, OutputIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _group_duplicates(entries: list[NoteEntry]) -> list[tuple[list[NoteEntry], set[str]]]:
+    """ソースキー・内容ハッシュのどちらかでつながるノートをまとめる（Union-Find）"""
+    parent = list(range(len(entries)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    reasons: dict[tuple[int, int], set[str]] = {}
+    for attr, reason in (("source_key", "source"), ("content_hash", "content")):
+        first: dict[str, int] = {}
+        for i, entry in enumerate(entries):
+            j = first.setdefault(getattr(entry, attr), i)
+            if j != i:
+                a, b = find(i), find(j)
+                if a != b:
+                    parent[a] = b
+                reasons.setdefault((i, j), set()).add(reason)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(entries)):
+        groups.setdefault(find(i), []).append(i)
+
+    result = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        member_set = set(members)
+        why = set().union(*(r for (i, _), r in reasons.items() if i in member_set))
+        result.append(([entries[i] for i in members], why))
+    return result
+
+
+def build_plan(config: Config, index: OutputIndex, workers: int) -> dict:
+    """インデックスを更新して削除計画を作る"""
+    output_dir = config.output_dir
+    index_stats = index.refresh(output_dir, workers)
+    groups = []
+    for members, reasons in _group_duplicates(index.entries()):
+        # ファイル名はタイムスタンプ始まりのため、名前順の最後が最新
+        members.sort(key=lambda e: e.name)
+        keep, delete = members[-1], members[:-1]
+        groups.append(
+            {
+                "reasons": sorted(reasons),
+                "keep": keep.name,
+                "delete": [
+                    {"name": e.name, "size": e.size, "mtime_ns": e.mtime_ns, "content_hash": e.content_hash}
+                    for e in delete
+                ],
+            }
+        )
+    groups.sort(key=lambda g: g["keep"])
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "output_dir": str(output_dir),
+        "index": index_stats,
+        "groups": groups,
+        "total_delete": sum(len(g["delete"]) for g in groups),
+    }
+
+
+def execute_plan(plan: dict, index: OutputIndex, note_index: NoteIndex, workers: int) -> dict:
+    """計画にあるファイルを削除する。計画作成後にサイズ・mtime が変わったファイルは残す。"""
+    output_dir = Path(plan["output_dir"])
+    targets = [item for group in plan["groups"] for item in group["delete"]]
+
+    def delete_one(item: dict) -> tuple[str, str]:
+        path = output_dir / item["name"]
         try:
-            f.unlink()
-            print(f"  削除済み: {f.name}")
-            deleted += 1
-        except Exception as e:
-            print(f"  ERROR: {f.name} → {e}")
+            st = path.stat()
+            if (st.st_size, st.st_mtime_ns) != (item["size"], item["mtime_ns"]):
+                return item["name"], "changed"
+            path.unlink()
+        except FileNotFoundError:
+            return item["name"], "missing"
+        except OSError as e:
+            logger.warning("削除に失敗しました: %s (%s)", item["name"], e)
+            return item["name"], "error"
+        return item["name"], "deleted"
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        outcomes = list(pool.map(delete_one, targets))
+
+    deleted = [name for name, status in outcomes if status in ("deleted", "missing")]
+    index.remove(deleted)
+    note_index.remove(deleted)
+    summary = {"planned": len(targets)}
+    for status in ("deleted", "missing", "changed", "error"):
+        summary[status] = sum(1 for _, s in outcomes if s == status)
+    summary["skipped"] = [name for name, s in outcomes if s in ("changed", "error")]
+    return summary
+
+
+def _print_plan(plan: dict):
+    for group in plan["groups"]:
+        print(f"[KEEP]   {group['keep']}  ({', '.join(group['reasons'])})")
+        for item in group["delete"]:
+            print(f"[DELETE] {item['name']}")
+        print()
+    print(f"=== 削除対象合計: {plan['total_delete']} ファイル（{len(plan['groups'])}グループ） ===")
 
-    print(f"\n完了: {deleted}/{len(to_delete)} ファイルを削除しました。")
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts cleanup",
+        description="出力フォルダの重複ノートを削除する",
+    )
+    parser.add_argument("mode", nargs="?", choices=("plan", "execute"), default="plan")
+    parser.add_argument("--execute", action="store_true", help="execute と同じ（旧オプション）")
+    parser.add_argument("--plan", type=Path, help="execute で使う計画JSON（plan --json の出力）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで標準出力に書く")
+    parser.add_argument("--workers", type=int, default=8, help="ハッシュ計算・削除の並列数")
+    args = parser.parse_args(argv)
+    execute = args.mode == "execute" or args.execute
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        stream=sys.stderr,
+    )
+
+    config = Config()
+    index = OutputIndex(config.output_index_path)
+    try:
+        if execute and args.plan:
+            plan = json.loads(args.plan.read_text(encoding="utf-8"))
+        else:
+            plan = build_plan(config, index, args.workers)
+
+        if not execute:
+            if args.json:
+                print(json.dumps(plan, ensure_ascii=False, indent=2))
+            else:
+                _print_plan(plan)
+                print("\n※ DRY RUNモードです。実際の削除は行っていません。")
+                print("  削除を実行するには: python -m scripts cleanup execute")
+            return
+
+        note_index = NoteIndex(config.note_index_path)
+        try:
+            summary = execute_plan(plan, index, note_index, args.workers)
+        finally:
+            note_index.close()
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+        else:
+            print(f"完了: {summary['deleted']}/{summary['planned']} ファイルを削除しました。")
+            if summary["skipped"]:
+                print(f"計画作成後に変更された・削除できなかったファイル {len(summary['skipped'])}件は残しました:")
+                for name in summary["skipped"]:
+                    print(f"  {name}")
+    finally:
+        index.close()
 
 
 if __name__ == "__main__":
-    execute = "--execute" in sys.argv
-    main(dry_run=not execute)
+    main()
@@ -6,6 +6,9 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 
+from tracker_store import BACKENDS
+from work_queue import POLICIES as QUEUE_POLICIES
+
 # .envファイルの読み込み（プロジェクトルートから相対パスで探索）
 _env_path = Path(__file__).parent.parent / ".env"
 if _env_path.exists():
@@ -31,13 +34,138 @@ class Config:
         )
         self.obsidian_subfolder = os.getenv("OBSIDIAN_SUBFOLDER", "手書きノート")
         self.gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-        self.debounce_seconds = int(os.getenv("DEBOUNCE_SECONDS", "3"))
+        self.debounce_seconds = float(os.getenv("DEBOUNCE_SECONDS", "3"))
+        # 並列ワーカー数（Gemini呼び出しを同時に何件まで走らせるか）
+        self.worker_concurrency = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+        # 起動時に監視フォルダの未処理ファイルをキューに積んでから監視を始めるか
+        self.backfill_on_start = os.getenv("BACKFILL_ON_START", "false").strip().lower() in ("1", "true", "yes")
+        # Discord通知の送信待ちファイルの保存先（送信に成功したものから削除される）
+        self.discord_outbox_dir = Path(
+            os.getenv(
+                "DISCORD_OUTBOX_DIR",
+                str(Path(__file__).parent.parent / "data" / "discord_outbox"),
+            )
+        )
+
+        # メトリクス: Prometheus 形式の HTTP エンドポイント（0 で無効）と JSON の定期書き出し（0 秒で無効）
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.metrics_json_path = Path(
+            os.getenv(
+                "METRICS_JSON_PATH",
+                str(Path(__file__).parent.parent / "data" / "metrics.json"),
+            )
+        )
+        self.metrics_flush_seconds = float(os.getenv("METRICS_FLUSH_SECONDS", "60"))
+
+        # プロファイリング: "off" / "file"（N件ごと・遅いファイルを計測）/ "worker"（ワーカー1本を丸ごと計測）
+        self.profile_pipeline = os.getenv("PROFILE_PIPELINE", "off").strip().lower()
+        self.profile_every_n = int(os.getenv("PROFILE_EVERY_N", "10"))
+        self.profile_slow_seconds = float(os.getenv("PROFILE_SLOW_SECONDS", "0"))
+        self.profile_dir = Path(
+            os.getenv(
+                "PROFILE_DIR",
+                str(Path(__file__).parent.parent / "logs" / "profile"),
+            )
+        )
+
+        # 仮想ドライブ監視の方式: "snapshot"（永続スナップショット＋適応間隔）/ "watchdog"（PollingObserver）
+        self.polling_backend = os.getenv("POLLING_BACKEND", "snapshot").strip().lower()
+        self.poll_min_seconds = float(os.getenv("POLL_MIN_SECONDS", "2"))
+        self.poll_max_seconds = float(os.getenv("POLL_MAX_SECONDS", "30"))
+        self.watch_snapshot_path = Path(
+            os.getenv(
+                "WATCH_SNAPSHOT_PATH",
+                str(Path(__file__).parent.parent / "data" / "watch_snapshot.json"),
+            )
+        )
+        # 実行モード: "thread"（ワーカースレッド）/ "async"（asyncioイベントループ）
+        self.pipeline_mode = os.getenv("PIPELINE_MODE", "thread").strip().lower()
+        # asyncモードで同時に待機できるAPI呼び出し数の上限
+        self.async_max_inflight = max(1, int(os.getenv("ASYNC_MAX_INFLIGHT", "16")))
         self.processed_db_path = Path(
             os.getenv(
                 "PROCESSED_DB_PATH",
                 str(Path(__file__).parent.parent / "data" / "processed_files.json"),
             )
         )
+        # 処理済みDBの保存方式: auto（拡張子で判定）/ json / journal / sqlite
+        self.processed_db_backend = os.getenv("PROCESSED_DB_BACKEND", "auto").strip().lower()
+        # 出力ノートのインデックス（重複ノートの削除 python -m scripts cleanup で使う）
+        self.output_index_path = Path(
+            os.getenv(
+                "OUTPUT_INDEX_PATH",
+                str(Path(__file__).parent.parent / "data" / "output_index.sqlite3"),
+            )
+        )
+        # 生成ノートのフロントマター索引（タグ・意図での検索 python -m scripts index で使う）
+        self.note_index_path = Path(
+            os.getenv(
+                "NOTE_INDEX_PATH",
+                str(Path(__file__).parent.parent / "data" / "note_index.sqlite3"),
+            )
+        )
+        # 知覚ハッシュ（256bit dHash）のハミング距離しきい値。負の値で無効
+        self.near_dup_hamming_threshold = int(os.getenv("NEAR_DUP_HAMMING_THRESHOLD", "12"))
+
+        # 解析結果キャッシュ（0 で無効）
+        self.analysis_cache_dir = Path(
+            os.getenv(
+                "ANALYSIS_CACHE_DIR",
+                str(Path(__file__).parent.parent / "data" / "analysis_cache"),
+            )
+        )
+        self.analysis_cache_max_bytes = (
+            int(os.getenv("ANALYSIS_CACHE_MAX_MB", "100")) * 1024 * 1024
+        )
+
+        # Gemini API のレート制限（0 で無制限）。無料枠・有料枠のクォータに合わせて設定する
+        self.gemini_rpm = float(os.getenv("GEMINI_RPM", "0"))
+        self.gemini_tpm = float(os.getenv("GEMINI_TPM", "0"))
+        # API呼び出しの同時実行数の上限（429 を受けると自動的に縮小し、成功が続くと上限まで戻る）
+        self.gemini_max_concurrency = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+        # 429 / 5xx / 通信エラー時の再試行回数
+        self.gemini_max_retries = max(0, int(os.getenv("GEMINI_MAX_RETRIES", "5")))
+        # 応答をストリーミングで受信し、受信しながら出力フォルダの一時ファイルに書き込む
+        self.gemini_streaming = os.getenv("GEMINI_STREAMING", "false").strip().lower() in ("1", "true", "yes")
+        # このサイズ以上の入力は Files API に1回だけアップロードして URI で参照する（0 で無効）
+        self.gemini_upload_min_bytes = int(
+            float(os.getenv("GEMINI_UPLOAD_MIN_MB", "8")) * 1024 * 1024
+        )
+        # アップロード済みファイルの URI と有効期限の保存先（内容ハッシュがキー）
+        self.gemini_upload_cache_path = Path(
+            os.getenv(
+                "GEMINI_UPLOAD_CACHE_PATH",
+                str(Path(__file__).parent.parent / "data" / "gemini_uploads.json"),
+            )
+        )
+        # プロンプトテンプレートをコンテキストキャッシュに載せる場合の TTL（0 で無効）と、キャッシュ名の保存先
+        self.gemini_prompt_cache_ttl_seconds = (
+            int(os.getenv("GEMINI_PROMPT_CACHE_TTL_MINUTES", "0")) * 60
+        )
+        self.gemini_prompt_cache_path = Path(
+            os.getenv(
+                "GEMINI_PROMPT_CACHE_PATH",
+                str(Path(__file__).parent.parent / "data" / "gemini_prompt_cache.json"),
+            )
+        )
+
+        # 画像前処理: 長辺の最大ピクセル数（0 で縮小しない）、再圧縮の品質と形式、プロセス数（0 で同一プロセス）
+        self.image_max_edge = int(os.getenv("IMAGE_MAX_EDGE", "2048"))
+        self.image_quality = int(os.getenv("IMAGE_QUALITY", "85"))
+        self.image_format = os.getenv("IMAGE_FORMAT", "jpeg").strip().lower()
+        self.preprocess_workers = max(0, int(os.getenv("PREPROCESS_WORKERS", "2")))
+        # PDFを何ページずつに分割して解析するか（0 で分割しない）と、分割したページ群の同時解析数
+        self.pdf_pages_per_request = max(0, int(os.getenv("PDF_PAGES_PER_REQUEST", "0")))
+        self.pdf_page_concurrency = max(1, int(os.getenv("PDF_PAGE_CONCURRENCY", "4")))
+        # 小さな画像をまとめて1リクエストで解析する件数（1 で無効）と、まとめる画像の合計サイズ上限
+        self.batch_max_images = max(1, int(os.getenv("BATCH_MAX_IMAGES", "1")))
+        self.batch_max_bytes = int(os.getenv("BATCH_MAX_MB", "16")) * 1024 * 1024
+        # 処理待ちキューの取り出し順: fifo / sjf-bytes / sjf-pages / newest（threadモードのみ）
+        self.queue_policy = os.getenv("QUEUE_POLICY", "fifo").strip().lower()
+        # この秒数以上待ったファイルは方針に関係なく先に処理する（0 で無効）
+        self.queue_aging_seconds = float(os.getenv("QUEUE_AGING_SECONDS", "300"))
+        # ファイル名にこの文字列を含むものを最優先で処理する（空で無効）
+        self.queue_boost_marker = os.getenv("QUEUE_BOOST_MARKER", "!")
 
     @property
     def output_dir(self) -> Path:
@@ -58,6 +186,30 @@ class Config:
             print("  .env ファイルを確認してください。")
             sys.exit(1)
 
+        if self.pipeline_mode not in ("thread", "async"):
+            print(f"[エラー] PIPELINE_MODE は thread / async のいずれかを指定してください: {self.pipeline_mode}")
+            sys.exit(1)
+
+        if self.processed_db_backend not in ("auto", *BACKENDS):
+            print(f"[エラー] PROCESSED_DB_BACKEND は auto / {' / '.join(BACKENDS)} のいずれかを指定してください: {self.processed_db_backend}")
+            sys.exit(1)
+
+        if self.profile_pipeline not in ("off", "file", "worker"):
+            print(f"[エラー] PROFILE_PIPELINE は off / file / worker のいずれかを指定してください: {self.profile_pipeline}")
+            sys.exit(1)
+
+        if self.polling_backend not in ("snapshot", "watchdog"):
+            print(f"[エラー] POLLING_BACKEND は snapshot / watchdog のいずれかを指定してください: {self.polling_backend}")
+            sys.exit(1)
+
+        if self.queue_policy not in QUEUE_POLICIES:
+            print(f"[エラー] QUEUE_POLICY は {' / '.join(QUEUE_POLICIES)} のいずれかを指定してください: {self.queue_policy}")
+            sys.exit(1)
+
+        if self.image_format not in ("jpeg", "webp"):
+            print(f"[エラー] IMAGE_FORMAT は jpeg / webp のいずれかを指定してください: {self.image_format}")
+            sys.exit(1)
+
         if not self.watch_folder.exists():
             print(f"[エラー] 監視フォルダが存在しません: {self.watch_folder}")
             sys.exit(1)
@@ -0,0 +1,101 @@
+"""単一スレッドのデバウンサ
+
+イベントごとに threading.Timer を作り直すと、Drive 同期の変更イベントの連打で
+短命なスレッドが大量に生成される。Debouncer は1本のスケジューラスレッドと
+期限順のヒープで、キーごとに「最後の呼び出しから delay 秒後に1回だけ」コールバックを実行する。
+
+ヒープにはキーごとに1件だけ積み、再スケジュール時は辞書の期限を後ろにずらすだけにする。
+取り出した時点で期限が延びていれば積み直す（ヒープの大きさ＝保留中のキー数）。
+コールバックはスケジューラスレッド上で順に実行されるため、重い処理はキューなどへ委譲すること。
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Debouncer:
+    def __init__(self, name: str = "debouncer"):
+        self._deadlines: dict[str, tuple[float, Callable[..., Any], tuple]] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._seq = itertools.count()  # 同じ期限のときの比較用
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def schedule(self, key: str, delay: float, callback: Callable[..., Any], *args):
+        """key のコールバックを delay 秒後に実行する。保留中なら期限を延長して引数を差し替える。"""
+        deadline = time.monotonic() + delay
+        with self._cond:
+            if self._stopped:
+                return
+            pending = key in self._deadlines
+            self._deadlines[key] = (deadline, callback, args)
+            if not pending:
+                heapq.heappush(self._heap, (deadline, next(self._seq), key))
+                if self._heap[0][2] == key:
+                    # 最も早い期限が変わった場合だけスケジューラを起こす
+                    self._cond.notify()
+
+    def cancel(self, key: str) -> bool:
+        """保留中のコールバックを取り消す（ヒープ上の要素は取り出し時に読み捨てる）"""
+        with self._cond:
+            return self._deadlines.pop(key, None) is not None
+
+    def cancel_all(self):
+        with self._cond:
+            self._deadlines.clear()
+            self._heap.clear()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._deadlines)
+
+    def stop(self, timeout: float | None = None):
+        """保留中のコールバックを破棄してスケジューラスレッドを止める"""
+        with self._cond:
+            self._stopped = True
+            self._deadlines.clear()
+            self._heap.clear()
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _next_due(self) -> tuple[Callable[..., Any], tuple] | None:
+        """期限の来たコールバックを1件取り出す。無ければ次の期限まで待って None を返す。"""
+        if not self._heap:
+            self._cond.wait()
+            return None
+        deadline, _, key = self._heap[0]
+        now = time.monotonic()
+        if deadline > now:
+            self._cond.wait(deadline - now)
+            return None
+        heapq.heappop(self._heap)
+        entry = self._deadlines.get(key)
+        if entry is None:  # 取り消し済み
+            return None
+        if entry[0] > now:  # 待っている間に延長された
+            heapq.heappush(self._heap, (entry[0], next(self._seq), key))
+            return None
+        del self._deadlines[key]
+        return entry[1], entry[2]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                due = self._next_due()
+            if due is None:
+                continue
+            callback, args = due
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("デバウンス後の処理でエラーが発生しました")
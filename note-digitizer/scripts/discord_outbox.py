@@ -0,0 +1,205 @@
+"""Discord通知の送信待ち箱（アウトボックス）
+
+パイプラインは通知内容（Embed）を1件1ファイルの JSON としてディレクトリに書くだけで戻り、
+Webhook への送信はバックグラウンドの送信スレッドが requests.Session（接続を使い回す）で行う。
+
+- ファイルは書き込み順に送信し、送信に成功したら削除する。送信前に停止・異常終了しても
+  次回起動時に残ったファイルから送信を再開する
+- 同時に複数件溜まっている場合（一括処理・バックフィル時など）は、Discord の上限
+  （1メッセージ10 Embed・合計6,000文字）まで1メッセージにまとめて送る
+- 429 の retry_after と X-RateLimit-Remaining / X-RateLimit-Reset-After ヘッダに従って待つ
+- 5xx・通信エラーは間隔を伸ばしながら再送し、それ以外の 4xx は failed/ に移して先に進む。
+  まとめたメッセージが 4xx になった場合は1件ずつ送り直し、それでも失敗した通知だけを failed/ に移す
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+_LINGER_SECONDS = 1.0  # 最初の1件を検出してから、続く通知をまとめるために待つ時間
+_RETRY_BASE = 2.0
+_RETRY_MAX = 300.0
+_REQUEST_TIMEOUT = 10
+
+
+def _embed_chars(embed: dict) -> int:
+    """Discord が合計文字数の上限に数える部分（title・fields の name/value など）の文字数"""
+    chars = len(embed.get("title", "")) + len(embed.get("description", ""))
+    for field in embed.get("fields", []):
+        chars += len(field.get("name", "")) + len(field.get("value", ""))
+    return chars
+
+
+class DiscordOutbox:
+    """ディレクトリを永続キューとして使い、Webhook 送信をバックグラウンドで行う"""
+
+    def __init__(self, outbox_dir: Path, webhook_url: str):
+        self.outbox_dir = outbox_dir
+        self.failed_dir = outbox_dir / "failed"
+        self.webhook_url = webhook_url
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        self._session = None  # requests は読み込みが重いため送信スレッドで作る
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="discord-outbox"
+        )
+        self._thread.start()
+        pending = self._pending_files()
+        if pending:
+            logger.info("未送信のDiscord通知を再送します: %d件", len(pending))
+            self._wakeup.set()
+
+    def put(self, embed: dict):
+        """通知を送信待ちとして保存する（送信は待たない）"""
+        with self._lock:
+            self._seq += 1
+            name = f"{time.time_ns():020d}-{self._seq:06d}.json"
+        path = self.outbox_dir / name
+        tmp_path = self.outbox_dir / (name + ".tmp")
+        tmp_path.write_text(json.dumps(embed, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._pending_files())
+
+    def close(self, timeout: float = _REQUEST_TIMEOUT * 2):
+        """送信スレッドを止める。送信しきれなかった通知はファイルとして残り、次回起動時に送る。"""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        if self._session is not None:
+            self._session.close()
+        remaining = self.pending()
+        if remaining:
+            logger.info("未送信のDiscord通知 %d件は次回起動時に送信します", remaining)
+
+    def _pending_files(self) -> list[Path]:
+        # ファイル名が作成時刻順になっているため、名前順 = 書き込み順
+        return sorted(self.outbox_dir.glob("*.json"))
+
+    def _next_message(self, limit: int = MAX_EMBEDS_PER_MESSAGE) -> tuple[list[Path], list[dict]]:
+        """先頭から上限（最大 limit 件）までの通知を読み込む（読めないファイルは failed/ に移す）"""
+        files: list[Path] = []
+        embeds: list[dict] = []
+        chars = 0
+        for path in self._pending_files()[:limit]:
+            try:
+                embed = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning("Discord通知ファイルを読み込めません: %s (%s)", path.name, e)
+                self._move_to_failed([path])
+                continue
+            size = _embed_chars(embed)
+            if embeds and chars + size > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            files.append(path)
+            embeds.append(embed)
+            chars += size
+        return files, embeds
+
+    def _move_to_failed(self, files: list[Path]):
+        self.failed_dir.mkdir(exist_ok=True)
+        for path in files:
+            try:
+                os.replace(path, self.failed_dir / path.name)
+            except OSError:
+                pass
+
+    def _run(self):
+        import requests
+
+        self._session = requests.Session()
+        retry_delay = 0.0
+        isolate = 0  # まとめて送って 4xx になったため、1件ずつ送り直す残り件数
+        while True:
+            if not self._pending_files():
+                if self._stopping.is_set():
+                    return
+                self._wakeup.wait()
+                self._wakeup.clear()
+                # 続けて届く通知をまとめるため少し待つ（停止時は待たない）
+                self._stopping.wait(_LINGER_SECONDS)
+                continue
+
+            files, embeds = self._next_message(1 if isolate else MAX_EMBEDS_PER_MESSAGE)
+            if not files:
+                continue
+            wait = self._send(embeds)
+            if wait is None:
+                for path in files:
+                    path.unlink(missing_ok=True)
+                retry_delay = 0.0
+                isolate = max(0, isolate - len(files))
+                logger.info("Discord通知送信完了: %d件", len(files))
+                continue
+            if wait < 0:
+                if len(files) > 1:
+                    # どの通知が原因か分からないため、1件ずつ送って原因の通知だけを除く
+                    logger.info("まとめた通知を1件ずつ送り直します: %d件", len(files))
+                    isolate = len(files)
+                    continue
+                # 再送しても成功しない（不正なペイロードなど）
+                logger.warning("Discord通知を failed/ に移動します: %s", files[0].name)
+                self._move_to_failed(files)
+                isolate = max(0, isolate - 1)
+                continue
+            if wait == 0:
+                retry_delay = min(_RETRY_MAX, max(_RETRY_BASE, retry_delay * 2))
+                wait = retry_delay
+            if self._stopping.wait(wait):
+                return
+
+    def _send(self, embeds: list[dict]) -> float | None:
+        """送信する。成功なら None、再送まで待つ秒数（0 は送信側で決める）、再送不可なら負数を返す。"""
+        import requests
+
+        payload: dict = {"embeds": embeds}
+        if len(embeds) > 1:
+            payload["content"] = f"\U0001f4d3 {len(embeds)}件のノートを整理しました"
+        try:
+            resp = self._session.post(
+                self.webhook_url, json=payload, timeout=_REQUEST_TIMEOUT
+            )
+        except requests.RequestException as e:
+            logger.warning("Discord通知に失敗しました（再送します）: %s", e)
+            return 0.0
+
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.json().get("retry_after", 1))
+            except ValueError:
+                retry_after = float(resp.headers.get("Retry-After", 1))
+            logger.info("Discordのレート制限のため %.1f秒待機します", retry_after)
+            return retry_after
+        if resp.status_code >= 500:
+            logger.warning("Discord通知に失敗しました（再送します）: HTTP %d", resp.status_code)
+            return 0.0
+        if resp.status_code >= 400:
+            logger.warning(
+                "Discord通知が受け付けられませんでした: HTTP %d %s",
+                resp.status_code,
+                resp.text[:200],
+            )
+            return -1.0
+
+        # 残り回数を使い切った場合は、リセットまで待ってから次を送る
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                reset_after = float(resp.headers.get("X-RateLimit-Reset-After", 0))
+            except ValueError:
+                reset_after = 0.0
+            if reset_after > 0:
+                self._stopping.wait(reset_after)
+        return None
@@ -0,0 +1,158 @@
+"""Gemini Files API へのアップロードと、アップロード済みファイルの再利用
+
+大きなPDFをリクエストに直接埋め込むと、再試行・ページ群の再解析・再処理のたびに同じ数MBを
+送り直すことになる。しきい値以上の入力は Files API に1回だけアップロードし、返ってきた URI を
+内容ハッシュをキーにして有効期限とともに保存しておく。以降のリクエストは URI だけを参照するため、
+リクエスト本体は数百バイトになる。ファイルからのアップロードは SDK が分割して読み込むため、
+内容全体をメモリに載せることもない。
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Files API のファイルは作成から48時間で削除される。期限が近いものは使わずにアップロードし直す
+_DEFAULT_LIFETIME_SECONDS = 48 * 3600
+_EXPIRY_MARGIN_SECONDS = 3600
+_ACTIVE_POLL_SECONDS = 1.0
+_ACTIVE_TIMEOUT_SECONDS = 120.0
+# 参照したファイルが削除済み・期限切れのときに返るステータス
+_STALE_FILE_STATUS = {400, 403, 404}
+
+
+@dataclass
+class UploadedFile:
+    name: str  # files/xxxx（状態の確認に使う）
+    uri: str
+    mime_type: str
+    expires_at: float  # UNIX 時刻
+
+
+class FileUploader:
+    """しきい値以上の入力を Files API にアップロードし、内容ハッシュ -> URI を JSON に保存する
+
+    キーは解析キャッシュと同じ内容ハッシュ（PDFをページ分割した場合は "<MD5>#p<開始>-<終了>"）。
+    """
+
+    def __init__(self, cache_path: Path, min_bytes: int):
+        self.cache_path = cache_path
+        self.min_bytes = min_bytes
+        self.uploads = 0
+        self.reuses = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, UploadedFile] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            raw = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("アップロード済みファイルの一覧を読み込めませんでした: %s", e)
+            return
+        now = time.time()
+        for key, entry in raw.items():
+            try:
+                uploaded = UploadedFile(**entry)
+            except TypeError:
+                continue
+            if self._usable(uploaded, now):
+                self._entries[key] = uploaded
+
+    def _save(self):
+        """呼び出し側で self._lock を保持していること"""
+        data = {key: asdict(entry) for key, entry in self._entries.items()}
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("アップロード済みファイルの一覧を保存できませんでした: %s", e)
+
+    @staticmethod
+    def _usable(entry: UploadedFile, now: float) -> bool:
+        return entry.expires_at - _EXPIRY_MARGIN_SECONDS > now
+
+    def should_upload(self, size: int) -> bool:
+        return size >= self.min_bytes
+
+    def part(self, client, key: str, source: Path | bytes, mime_type: str, label: str):
+        """アップロード済みファイルを参照するリクエストパーツを返す（未アップロードならアップロードする）"""
+        from google.genai import types
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._usable(entry, now):
+                del self._entries[key]
+                entry = None
+        if entry is not None:
+            with self._lock:
+                self.reuses += 1
+            logger.info("アップロード済みファイルを再利用: %s (%s) [%s]", label, entry.name, self.stats())
+        else:
+            entry = self._upload(client, source, mime_type, label)
+            with self._lock:
+                self._entries[key] = entry
+                self.uploads += 1
+                self._save()
+        return types.Part.from_uri(file_uri=entry.uri, mime_type=entry.mime_type)
+
+    def _upload(self, client, source: Path | bytes, mime_type: str, label: str) -> UploadedFile:
+        from google.genai import types
+
+        started = time.perf_counter()
+        size = source.stat().st_size if isinstance(source, Path) else len(source)
+        file = client.files.upload(
+            file=source if isinstance(source, Path) else io.BytesIO(source),
+            config=types.UploadFileConfig(mime_type=mime_type, display_name=label),
+        )
+        # PDF は処理が終わる（ACTIVE になる）まで参照できない
+        deadline = time.monotonic() + _ACTIVE_TIMEOUT_SECONDS
+        while file.state == types.FileState.PROCESSING:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"アップロードしたファイルの処理が終わりません: {file.name}")
+            time.sleep(_ACTIVE_POLL_SECONDS)
+            file = client.files.get(name=file.name)
+        if file.state == types.FileState.FAILED:
+            raise RuntimeError(f"アップロードしたファイルの処理に失敗しました: {file.name}")
+
+        expires_at = (
+            file.expiration_time.timestamp()
+            if file.expiration_time is not None
+            else time.time() + _DEFAULT_LIFETIME_SECONDS
+        )
+        logger.info(
+            "Files API にアップロード: %s %d KB -> %s (%.1f秒)",
+            label,
+            size // 1024,
+            file.name,
+            time.perf_counter() - started,
+        )
+        return UploadedFile(
+            name=file.name, uri=file.uri, mime_type=file.mime_type or mime_type, expires_at=expires_at
+        )
+
+    def invalidate(self, key: str, exc: BaseException):
+        """参照したファイルが使えなかった（削除済み・期限切れ）場合に、次回はアップロードし直す"""
+        if getattr(exc, "code", None) not in _STALE_FILE_STATUS:
+            return
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._save()
+        logger.warning("アップロード済みファイルを破棄します: %s (%s)", entry.name, exc)
+
+    def stats(self) -> str:
+        """ログ出力用のサマリ"""
+        return f"upload {self.uploads} / reuse {self.reuses}"
@@ -0,0 +1,79 @@
+"""ファイル内容ハッシュの計算とキャッシュ
+
+同じファイルのハッシュは、監視イベントごとの is_processed、解析キャッシュのキー生成、
+mark_processed で何度も必要になる。(サイズ, mtime_ns, inode) が変わっていなければ
+前回の結果を返すことで、1回のパイプライン実行中にファイルを読むのは最大1回になる。
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024  # 読み込みバッファ（1MB）。ファイルサイズに関係なくメモリ使用量は一定
+_MAX_ENTRIES = 4096  # キャッシュするファイル数の上限
+
+Fingerprint = tuple[int, int, int]  # (size, mtime_ns, inode)
+
+
+def stat_fingerprint(path: Path) -> Fingerprint:
+    """ファイルを開かずに stat だけで取得できる同一性の目安を返す"""
+    st = path.stat()
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _stream_md5(path: Path) -> str:
+    """固定長バッファに読み込みながらMD5を計算する"""
+    digest = hashlib.md5()
+    buf = bytearray(_CHUNK_SIZE)
+    view = memoryview(buf)
+    with path.open("rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class FileHasher:
+    """フィンガープリントが変わらない限りハッシュを再計算しないMD5計算器"""
+
+    def __init__(self, max_entries: int = _MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hashed = 0  # 実際にファイルを読んでハッシュした回数
+        self.reused = 0  # キャッシュで済んだ回数
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, tuple[Fingerprint, str]] = OrderedDict()
+
+    def md5(self, path: Path) -> str:
+        key = str(path)
+        before = stat_fingerprint(path)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == before:
+                self._cache.move_to_end(key)
+                self.reused += 1
+                return cached[1]
+
+        digest = _stream_md5(path)
+        # 読み込み中に書き換わった（同期中など）場合は結果をキャッシュしない
+        if stat_fingerprint(path) != before:
+            logger.debug("ハッシュ計算中にファイルが変更されました: %s", path.name)
+            return digest
+
+        with self._lock:
+            self.hashed += 1
+            self._cache[key] = (before, digest)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return digest
+
+
+_hasher = FileHasher()
+
+
+def file_md5(path: Path) -> str:
+    """プロセス共通のキャッシュを使ってファイルのMD5を返す"""
+    return _hasher.md5(path)
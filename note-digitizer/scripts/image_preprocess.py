@@ -0,0 +1,72 @@
+"""Gemini送信前の画像前処理（縮小・再圧縮）
+
+スマホの12MP写真やHEICをそのまま送るとアップロード時間とトークンが膨らむため、
+長辺を max_edge に縮小し、JPEG/WebP で再圧縮してから送信する。
+
+- EXIFの回転情報を反映してから処理する
+- HEIC は pillow-heif で読み込む
+- 4色ペンの判別に色が必要なため、有彩色の画素がほぼ無い画像だけをグレースケール化する
+  （カラーの場合は JPEG のクロマサブサンプリングも無効にして細いペン線の色を残す）
+
+preprocess_image はプロセスプールから呼ばれるため、引数・戻り値は pickle 可能な値のみとする。
+"""
+
+import io
+
+import PIL.Image
+import PIL.ImageOps
+
+try:
+    from pillow_heif import register_heif_opener
+
+    register_heif_opener()
+except ImportError:  # pragma: no cover - オプション依存
+    pass
+
+FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+# 彩度（HSVのS, 0-255）がこの値を超える画素を「色付き」とみなす
+_SATURATION_THRESHOLD = 60
+# 色付き画素の割合がこれ未満ならグレースケールとして扱う
+_COLOR_PIXEL_RATIO = 0.001
+# 色判定に使う縮小サイズ（全画素を調べる必要はない）
+_PROBE_SIZE = 256
+
+
+def _is_grayscale(image: PIL.Image.Image) -> bool:
+    """ペンの色（赤・青・緑）が含まれていない画像かどうか"""
+    probe = image.copy()
+    probe.thumbnail((_PROBE_SIZE, _PROBE_SIZE))
+    saturation = probe.convert("HSV").getchannel("S").histogram()
+    colored = sum(saturation[_SATURATION_THRESHOLD + 1:])
+    return colored < (probe.width * probe.height) * _COLOR_PIXEL_RATIO
+
+
+def preprocess_image(
+    path: str, max_edge: int, quality: int, fmt: str
+) -> tuple[bytes, str, int]:
+    """画像を縮小・再圧縮して (データ, MIMEタイプ, 元のバイト数) を返す"""
+    with open(path, "rb") as f:
+        original = f.read()
+
+    with PIL.Image.open(io.BytesIO(original)) as image:
+        image = PIL.ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        if max_edge > 0 and max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), PIL.Image.Resampling.LANCZOS)
+
+        grayscale = image.mode == "L" or _is_grayscale(image)
+        if grayscale:
+            image = image.convert("L")
+
+        pil_format, mime_type = FORMATS[fmt]
+        save_kwargs = {"quality": quality}
+        if pil_format == "JPEG":
+            save_kwargs["optimize"] = True
+            if not grayscale:
+                save_kwargs["subsampling"] = 0  # 4:4:4（色の滲みを防ぐ）
+        out = io.BytesIO()
+        image.save(out, format=pil_format, **save_kwargs)
+
+    return out.getvalue(), mime_type, len(original)
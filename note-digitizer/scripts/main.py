@@ -3,14 +3,15 @@
 import logging
 import signal
 import sys
+import threading
 import time
 
 from analyzer import NoteAnalyzer
 from config import Config
 from discord_notify import DiscordNotifier
 from markdown_writer import MarkdownWriter
+from metrics import start_exporter
 from processed_tracker import ProcessedTracker
-from watcher import start_watching
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +21,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _start_warm_up(analyzer: NoteAnalyzer):
+    """最初のファイルの解析が google.genai の読み込みを待たないよう、監視開始後に読み込んでおく"""
+    threading.Thread(target=analyzer.warm_up, name="analyzer-warm-up", daemon=True).start()
+
+
 def main():
     print("=" * 50)
     print("  Note Digitizer - 手書きノート自動デジタル化")
@@ -31,18 +37,47 @@ def main():
     analyzer = NoteAnalyzer(config)
     writer = MarkdownWriter(config)
     notifier = DiscordNotifier(config)
-    tracker = ProcessedTracker(config.processed_db_path)
-
-    observer = start_watching(config, analyzer, writer, notifier, tracker)
+    tracker = ProcessedTracker(
+        config.processed_db_path,
+        config.processed_db_backend,
+        config.near_dup_hamming_threshold,
+    )
 
     print()
     print(f"  監視フォルダ: {config.watch_folder}")
     print(f"  出力先:       {config.output_dir}")
     print(f"  モデル:       {config.gemini_model}")
+    if config.pipeline_mode == "async":
+        print(f"  実行モード:   async（同時実行上限 {config.async_max_inflight}）")
+    else:
+        print(f"  並列数:       {config.worker_concurrency}")
+    if config.metrics_port > 0:
+        print(f"  メトリクス:   http://127.0.0.1:{config.metrics_port}/metrics")
     print()
     print("  Ctrl+C で終了します")
     print("=" * 50)
 
+    exporter = start_exporter(config)
+
+    if config.pipeline_mode == "async":
+        from async_pipeline import run_async
+
+        _start_warm_up(analyzer)
+        run_async(config, analyzer, writer, notifier, tracker)
+        analyzer.close()
+        writer.close()
+        notifier.close()
+        exporter.close()
+        tracker.close()
+        print("\nフォルダ監視を終了しました。")
+        return
+
+    # watchdog は設定の検証が済んでから読み込む
+    from watcher import start_watching
+
+    observer, handler = start_watching(config, analyzer, writer, notifier, tracker)
+    _start_warm_up(analyzer)
+
     shutdown = False
 
     def handle_signal(signum, frame):
@@ -58,6 +93,12 @@ def main():
     finally:
         observer.stop()
         observer.join()
+        handler.shutdown()
+        analyzer.close()
+        writer.close()
+        notifier.close()
+        exporter.close()
+        tracker.close()
         print("\nフォルダ監視を終了しました。")
 
 
@@ -1,28 +1,165 @@
 """Obsidian VaultへのMarkdown出力"""
 
 import logging
+import os
+import sqlite3
+import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
 
 from config import Config
+from note_document import NoteDocument, StreamingFenceStripper
+from note_index import NoteIndex
 
 logger = logging.getLogger(__name__)
 
+_PART_SUFFIX = ".md.part"
+_STALE_PART_SECONDS = 3600  # これより古い一時ファイルは異常終了の残骸とみなして削除する
+
 
 class MarkdownWriter:
-    """生成されたMarkdownをObsidian Vaultに保存する"""
+    """生成されたMarkdownをObsidian Vaultに保存し、フロントマター索引を更新する"""
 
     def __init__(self, config: Config):
         self.output_dir = config.output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.index = NoteIndex(config.note_index_path)
+        if config.gemini_streaming:
+            self._remove_stale_parts()
         logger.info("出力先: %s", self.output_dir)
 
-    def write(self, content: str, source_filename: str) -> Path:
-        """Markdownを保存してファイルパスを返す"""
+    def write(self, doc: NoteDocument, source_filename: str) -> Path:
+        """ノートを保存してファイルパスを返す"""
+        output_path = self._output_path(source_filename)
+        output_path.write_text(doc.text, encoding="utf-8")
+        logger.info("保存完了: %s", output_path.name)
+        self._add_to_index(output_path, doc, source_filename)
+        return output_path
+
+    def open_stream(self, source_filename: str) -> "NoteStream":
+        """ストリーミング応答を書き込む NoteStream を返す（with で使う）"""
+        return NoteStream(self, source_filename)
+
+    def close(self):
+        self.index.close()
+
+    def _output_path(self, source_filename: str) -> Path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         stem = Path(source_filename).stem
-        output_path = self.output_dir / f"{timestamp}_{stem}.md"
+        return self.output_dir / f"{timestamp}_{stem}.md"
+
+    def _add_to_index(self, output_path: Path, doc: NoteDocument, source_filename: str):
+        try:
+            self.index.add(output_path, doc, source_filename)
+        except sqlite3.Error as e:
+            # 索引は python -m scripts index rebuild で作り直せるため、保存自体は成功扱いにする
+            logger.warning("ノート索引の更新に失敗しました: %s (%s)", output_path.name, e)
+
+    def _remove_stale_parts(self):
+        cutoff = time.time() - _STALE_PART_SECONDS
+        for path in self.output_dir.glob(f".*{_PART_SUFFIX}"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    logger.info("書きかけの一時ファイルを削除しました: %s", path.name)
+            except OSError:
+                pass
+
+
+class NoteStream:
+    """ストリーミング応答を出力フォルダの一時ファイルに書き込み、完了後に本来の名前へ rename する
 
-        output_path.write_text(content, encoding="utf-8")
+    一時ファイルはドットで始まる .md.part（Obsidian の一覧・索引の対象外）で、受信したチャンクは
+    コードブロックの囲みを除きながらその都度書き出すため、応答全体をメモリに溜めない。
+    流れ: reset（再試行のたびに最初から）→ write（チャンクごと）→ finish → commit。
+    commit されずに閉じた場合は一時ファイルを削除する。
+    """
+
+    def __init__(self, writer: MarkdownWriter, source_filename: str):
+        self._writer = writer
+        self.source_filename = source_filename
+        self.temp_path: Path | None = None
+        self.doc: NoteDocument | None = None
+        self.output_path: Path | None = None
+        self.ttfb: float | None = None  # 応答の最初のチャンクまでの秒数
+        self._file = None
+        self._stripper = StreamingFenceStripper()
+        self._started = 0.0
+        self._chunks = 0
+        self._chars = 0
+
+    def __enter__(self) -> "NoteStream":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def finished(self) -> bool:
+        return self.doc is not None
+
+    def reset(self):
+        """書き込みを始める。再試行時はそれまでに書いた内容を捨てて最初からやり直す。"""
+        if self._file is None:
+            fd, name = tempfile.mkstemp(
+                prefix=f".{Path(self.source_filename).stem}.",
+                suffix=_PART_SUFFIX,
+                dir=self._writer.output_dir,
+            )
+            self.temp_path = Path(name)
+            self._file = os.fdopen(fd, "w", encoding="utf-8")
+        else:
+            self._file.seek(0)
+            self._file.truncate()
+        self._stripper = StreamingFenceStripper()
+        self._started = time.perf_counter()
+        self.ttfb = None
+        self._chunks = 0
+        self._chars = 0
+
+    def write(self, chunk: str):
+        if self.ttfb is None:
+            self.ttfb = time.perf_counter() - self._started
+        self._chunks += 1
+        self._chars += len(chunk)
+        text = self._stripper.feed(chunk)
+        if text:
+            self._file.write(text)
+            self._file.flush()
+
+    def finish(self) -> NoteDocument:
+        """応答の終わりを書き出して一時ファイルを閉じ、書いた内容を NoteDocument として返す"""
+        self._file.write(self._stripper.finish())
+        self._file.close()
+        self._file = None
+        self.doc = NoteDocument.parse(self.temp_path.read_text(encoding="utf-8"))
+        logger.info(
+            "ストリーミング受信完了: %s (TTFB %.2f秒, 合計 %.2f秒, %dチャンク, %d文字, 最大保留 %d文字)",
+            self.source_filename,
+            self.ttfb or 0.0,
+            time.perf_counter() - self._started,
+            self._chunks,
+            self._chars,
+            self._stripper.peak_pending,
+        )
+        return self.doc
+
+    def commit(self) -> Path:
+        """一時ファイルを本来の名前に rename して索引に登録し、ファイルパスを返す"""
+        output_path = self._writer._output_path(self.source_filename)
+        os.replace(self.temp_path, output_path)
+        self.output_path = output_path
         logger.info("保存完了: %s", output_path.name)
+        self._writer._add_to_index(output_path, self.doc, self.source_filename)
         return output_path
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.output_path is None and self.temp_path is not None:
+            try:
+                self.temp_path.unlink()
+            except FileNotFoundError:
+                pass
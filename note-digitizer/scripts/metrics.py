@@ -0,0 +1,245 @@
+"""パイプラインのステージ別レイテンシ・件数のメトリクス
+
+プロセス内で共有するレジストリ（モジュールレベル）に記録し、以下の方法で参照できる。
+
+- METRICS_PORT を設定すると http://127.0.0.1:<port>/metrics で Prometheus テキスト形式を返す
+- METRICS_JSON_PATH（デフォルト: data/metrics.json）に METRICS_FLUSH_SECONDS ごとに書き出す
+
+記録するもの:
+- ステージ別ヒストグラム（STAGES）: デバウンス待ち・キュー待ち・処理済み判定のハッシュ計算・
+  Gemini解析・Markdown書き込み・Discord通知・処理済み登録
+- 件数（COUNTERS）: 処理完了・処理済みスキップ・キュー登録済みスキップ・失敗
+- ゲージ: キューの深さ、コンテキストキャッシュのヒット率・節約したトークン数
+  （値は登録した関数から読み出し時に取得する）
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STAGES = (
+    "debounce_wait",
+    "queue_wait",
+    "tracker_hash",
+    "analyze",
+    "analyze_ttfb",
+    "write",
+    "notify",
+    "tracker_commit",
+)
+COUNTERS = ("processed", "skipped_processed", "skipped_queued", "failed")
+
+# ヒストグラムのバケット上限（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_PREFIX = "note_digitizer"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最後は +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(BUCKETS)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """バケットから分位点を見積もる（該当バケットの上限値。+Inf の場合は最大値）"""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = q * self.count
+            cumulative = 0
+            for i, n in enumerate(self.counts):
+                cumulative += n
+                if cumulative >= rank:
+                    return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+            return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def set_gauge(self, name: str, fn: Callable[[], float]):
+        self.gauges[name] = fn
+
+    def _gauge_values(self) -> dict[str, float]:
+        values = {}
+        for name, fn in self.gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self) -> dict:
+        """JSON 出力用の集計値"""
+        with self._lock:
+            counters = dict(self.counters)
+        stages = {}
+        for stage, h in self.histograms.items():
+            stages[stage] = {
+                "count": h.count,
+                "sum": round(h.sum, 6),
+                "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "p99": h.quantile(0.99),
+                "max": round(h.max, 6),
+            }
+        return {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "counters": counters,
+            "gauges": self._gauge_values(),
+            "stages": stages,
+        }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            f"# HELP {_PREFIX}_stage_seconds パイプラインのステージ別所要時間",
+            f"# TYPE {_PREFIX}_stage_seconds histogram",
+        ]
+        for stage, h in self.histograms.items():
+            with h._lock:
+                counts, count, total = list(h.counts), h.count, h.sum
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, "+Inf"), counts):
+                cumulative += n
+                lines.append(
+                    f'{_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{_PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines.append(f"# HELP {_PREFIX}_files_total 結果別のファイル件数")
+        lines.append(f"# TYPE {_PREFIX}_files_total counter")
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines.append(f'{_PREFIX}_files_total{{result="{name}"}} {value}')
+
+        for name, value in self._gauge_values().items():
+            lines.append(f"# TYPE {_PREFIX}_{name} gauge")
+            lines.append(f"{_PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# モジュール関数として呼べるようにする（metrics.inc("processed") など）
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+
+
+class MetricsExporter:
+    """HTTP エンドポイントと JSON ファイルへの定期書き出しを行う"""
+
+    def __init__(self, port: int, json_path: Path | None, flush_seconds: float):
+        self.json_path = json_path
+        self.flush_seconds = flush_seconds
+        self._stop = threading.Event()
+        self._server: ThreadingHTTPServer | None = None
+        self._flusher: threading.Thread | None = None
+
+        if port > 0:
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            threading.Thread(
+                target=self._server.serve_forever, daemon=True, name="metrics-http"
+            ).start()
+            logger.info("メトリクスを公開しました: http://127.0.0.1:%d/metrics", port)
+        if json_path is not None and flush_seconds > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, daemon=True, name="metrics-flush"
+            )
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        if self.json_path is None:
+            return
+        try:
+            self.json_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.json_path.with_name(self.json_path.name + ".tmp")
+            tmp_path.write_text(
+                json.dumps(REGISTRY.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+            os.replace(tmp_path, self.json_path)
+        except OSError as e:
+            logger.warning("メトリクスの書き出しに失敗しました: %s", e)
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self.flush()  # 終了時点の値を残す
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter(config: Config) -> MetricsExporter:
+    json_path = config.metrics_json_path if config.metrics_flush_seconds > 0 else None
+    return MetricsExporter(config.metrics_port, json_path, config.metrics_flush_seconds)
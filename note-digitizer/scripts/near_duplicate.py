@@ -0,0 +1,193 @@
+"""知覚ハッシュ（dHash）による近似重複検出
+
+ファイル名やバイト列が違っても、見た目がほぼ同じスキャン（再スキャン・再同期コピー）を
+同一とみなすためのハッシュと、ハミング距離で近傍検索するインデックスを提供する。
+
+画像は縮小したグレースケールの隣接画素の大小比較を NumPy でベクトル化して計算する。
+PDF は1ページ目を低解像度でレンダリングして同様に計算する（pypdfium2 が必要）。
+numpy / pypdfium2 が無い環境では perceptual_hash は None を返し、呼び出し側は従来判定にフォールバックする。
+numpy / Pillow / pypdfium2 は起動時間を短くするため、最初にハッシュを計算するときに読み込む。
+"""
+
+import importlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from fingerprint import Fingerprint, stat_fingerprint
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16  # 16x16 = 256bit。白地の多いノートでもページ差が出るよう 8x8 より細かくする
+_PDF_RENDER_SCALE = 0.25  # 1ページ目のレンダリング倍率（72dpi基準）。縮小前提なので粗くて良い
+_CACHE_ENTRIES = 1024
+
+_cache_lock = threading.Lock()
+_cache: OrderedDict[str, tuple[Fingerprint, int | None]] = OrderedDict()
+_warned_missing: set[str] = set()
+_optional_modules: dict = {}
+
+
+def _optional(module: str):
+    """オプション依存を初回使用時に読み込む。未インストールなら None。"""
+    if module not in _optional_modules:
+        try:
+            _optional_modules[module] = importlib.import_module(module)
+        except ImportError:
+            _optional_modules[module] = None
+    return _optional_modules[module]
+
+
+def _warn_once(module: str):
+    if module not in _warned_missing:
+        _warned_missing.add(module)
+        logger.warning("%s が未インストールのため、知覚ハッシュによる重複判定を一部スキップします", module)
+
+
+def _load_image(path: Path) -> "PIL.Image.Image | None":
+    import PIL.Image
+
+    if path.suffix.lower() == ".pdf":
+        pdfium = _optional("pypdfium2")
+        if pdfium is None:
+            _warn_once("pypdfium2")
+            return None
+        pdf = pdfium.PdfDocument(str(path))
+        try:
+            if len(pdf) == 0:
+                return None
+            return pdf[0].render(scale=_PDF_RENDER_SCALE).to_pil()
+        finally:
+            pdf.close()
+    return PIL.Image.open(path)
+
+
+def _dhash(image: "PIL.Image.Image") -> int:
+    """横方向の隣接画素の大小で HASH_SIZE^2 ビットのハッシュを作る"""
+    import PIL.Image
+
+    np = _optional("numpy")
+    small = image.convert("L").resize(
+        (HASH_SIZE + 1, HASH_SIZE), PIL.Image.Resampling.LANCZOS
+    )
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def perceptual_hash(path: Path) -> int | None:
+    """画像またはPDF1ページ目の dHash を返す。計算できない場合は None。
+
+    (size, mtime_ns, inode) が変わらない限り再計算しない。
+    """
+    if _optional("numpy") is None:
+        _warn_once("numpy")
+        return None
+    key = str(path)
+    try:
+        fp = stat_fingerprint(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == fp:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    try:
+        image = _load_image(path)
+        value = _dhash(image) if image is not None else None
+    except Exception as e:
+        logger.debug("知覚ハッシュの計算に失敗: %s (%s)", path.name, e)
+        value = None
+
+    with _cache_lock:
+        _cache[key] = (fp, value)
+        while len(_cache) > _CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class HammingIndex:
+    """マルチインデックス・ハッシングによるハミング距離の近傍検索。
+
+    ハッシュを max_distance + 1 個のブロックに分割し、ブロックごとに完全一致の辞書を持つ。
+    距離が max_distance 以内なら鳩の巣原理で少なくとも1ブロックは完全一致するため、
+    各ブロックの辞書を引いて得た候補だけを実距離で検証すればよい（全件走査しない）。
+    キーごとに1件だけ保持し、同じキーで add すると古いハッシュを置き換える。
+    スレッド安全ではないため、呼び出し側でロックする。
+    """
+
+    def __init__(self, max_distance: int, bits: int = HASH_SIZE * HASH_SIZE):
+        self.max_distance = max_distance
+        self.bits = bits
+        n_blocks = min(max(max_distance, 0) + 1, bits)
+        # ブロック境界（ビット位置）。端数は先頭側のブロックに配分する
+        base, extra = divmod(bits, n_blocks)
+        self._blocks: list[tuple[int, int]] = []  # (シフト量, マスク)
+        pos = 0
+        for i in range(n_blocks):
+            width = base + (1 if i < extra else 0)
+            self._blocks.append((pos, (1 << width) - 1))
+            pos += width
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._blocks]
+        self._values: list[int] = []
+        self._keys: list[str | None] = []  # None は削除済みの空き番号
+        self._index_of: dict[str, int] = {}  # キー -> 番号
+        self._free: list[int] = []  # 削除で空いた番号（再登録で使い回し、配列を伸ばさない）
+
+    @property
+    def size(self) -> int:
+        return len(self._index_of)
+
+    def add(self, value: int, key: str):
+        """key のハッシュを登録する（登録済みのキーなら古いハッシュを置き換える）"""
+        self.remove(key)
+        if self._free:
+            idx = self._free.pop()
+            self._values[idx] = value
+            self._keys[idx] = key
+        else:
+            idx = len(self._values)
+            self._values.append(value)
+            self._keys.append(key)
+        self._index_of[key] = idx
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            table.setdefault((value >> shift) & mask, []).append(idx)
+
+    def remove(self, key: str):
+        """key のハッシュを取り除く（未登録なら何もしない）"""
+        idx = self._index_of.pop(key, None)
+        if idx is None:
+            return
+        value = self._values[idx]
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            block = (value >> shift) & mask
+            bucket = table[block]
+            bucket.remove(idx)
+            if not bucket:
+                del table[block]
+        self._keys[idx] = None
+        self._free.append(idx)
+
+    def query(self, value: int, max_distance: int | None = None) -> list[tuple[int, str]]:
+        """距離 max_distance（省略時は構築時の値）以内の (距離, キー) を近い順に返す"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        seen: set[int] = set()
+        results: list[tuple[int, str]] = []
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            for idx in table.get((value >> shift) & mask, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                d = hamming(value, self._values[idx])
+                if d <= max_distance:
+                    results.append((d, self._keys[idx]))
+        results.sort()
+        return results
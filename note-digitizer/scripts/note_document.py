@@ -0,0 +1,205 @@
+"""Gemini が生成したノート（Markdown）の構造化
+
+応答テキストのコードブロックの囲みを外し、フロントマター・見出しごとのセクション・概要を持つ
+NoteDocument にする。走査は先頭から1回だけで、行頭に固定した正規表現と str.find だけを使うため
+大きなノートでもバックトラックしない（セクション・概要は最初に参照されたときに走査する）。
+解析した NoteDocument をそのまま保存（MarkdownWriter）・索引（NoteIndex）・
+通知（DiscordNotifier）に渡すため、後段で正規表現による再パースは行わない。
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterator
+
+_FRONTMATTER_DELIMITER = "---"
+_CODE_FENCE = "```"
+_SUMMARY_HEADING = "概要"
+_HEADING_DECORATION = "\U0001f4dd"  # 見出しの先頭に付くことがある 📝
+
+# 行頭のみにマッチし、行をまたがないため、本文の長さに対して線形で走査できる
+_FRONTMATTER_END_RE = re.compile(r"^---[ \t]*$", re.MULTILINE)
+_HEADING_OR_FENCE_RE = re.compile(r"^(?:(#{1,6})(?:[ \t]+([^\n]*))?[ \t]*$|[ \t]*```)", re.MULTILINE)
+
+
+@dataclass
+class Section:
+    level: int  # 見出しの # の数
+    heading: str
+    body: str
+
+
+@dataclass
+class NoteDocument:
+    text: str  # 保存する Markdown（コードブロックの囲みを除去済み）
+    frontmatter: dict[str, str] = field(default_factory=dict)  # {キー: 生の値}（出現順）
+    body: str = ""  # フロントマターより後ろ
+    has_frontmatter: bool = False
+
+    @property
+    def title(self) -> str:
+        return self.frontmatter.get("title", "")
+
+    @property
+    def date(self) -> str:
+        return self.frontmatter.get("date", "")
+
+    @property
+    def intent(self) -> str:
+        return self.frontmatter.get("intent", "")
+
+    @property
+    def tags(self) -> list[str]:
+        return parse_tags(self.frontmatter.get("tags", ""))
+
+    @cached_property
+    def sections(self) -> list[Section]:
+        return list(_iter_sections(self.body))
+
+    @cached_property
+    def summary(self) -> str:
+        """「# 概要」（「# 📝 概要」も可）セクションの本文。見つかった時点で走査をやめる。"""
+        for section in _iter_sections(self.body):
+            if section.heading.removeprefix(_HEADING_DECORATION).strip() == _SUMMARY_HEADING:
+                return section.body.strip()
+        return ""
+
+    @classmethod
+    def parse(cls, text: str) -> "NoteDocument":
+        text = _strip_code_fence(text.strip())
+        doc = cls(text=text, body=text)
+        if not text.startswith(_FRONTMATTER_DELIMITER):
+            return doc
+        first_nl = text.find("\n")
+        if first_nl == -1 or text[:first_nl].strip() != _FRONTMATTER_DELIMITER:
+            return doc
+        end = _FRONTMATTER_END_RE.search(text, first_nl + 1)
+        if end is None:
+            # 閉じていないフロントマターは本文として扱う
+            return doc
+        for line in text[first_nl + 1:end.start()].split("\n"):
+            key, sep, value = line.partition(":")
+            if sep:
+                doc.frontmatter[key.strip()] = value.strip()
+        doc.has_frontmatter = True
+        doc.body = text[end.end():].lstrip("\n")
+        return doc
+
+
+def parse_tags(value: str) -> list[str]:
+    """[tag1, tag2] / tag1, tag2 形式のタグを分割する（引用符・先頭の # は除く、重複は除く）"""
+    value = value.strip()
+    if value.startswith("[") and value.endswith("]"):
+        value = value[1:-1]
+    tags: list[str] = []
+    for tag in value.split(","):
+        tag = tag.strip().strip("'\"").lstrip("#").strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def _strip_code_fence(text: str) -> str:
+    """Gemini が ```markdown ... ``` で囲んで返した場合の囲みを除く（text は前後の空白を除去済み）"""
+    stripped = False
+    if text.startswith(_CODE_FENCE):
+        first_nl = text.find("\n")
+        text = text[first_nl + 1:] if first_nl != -1 else ""
+        stripped = True
+    last_nl = text.rfind("\n")
+    if text[last_nl + 1:].strip() == _CODE_FENCE:
+        text = text[:max(last_nl, 0)]
+        stripped = True
+    return text.strip() if stripped else text
+
+
+def _iter_sections(body: str) -> Iterator[Section]:
+    """ATX 見出し（# 〜 ######）ごとに本文を分ける。コードブロック内の # は見出しとみなさない。"""
+    current: Section | None = None
+    body_start = 0
+    in_code = False
+    for match in _HEADING_OR_FENCE_RE.finditer(body):
+        if match.group(1) is None:
+            in_code = not in_code
+            continue
+        if in_code:
+            continue
+        if current is not None:
+            current.body = body[body_start:match.start()].strip("\n")
+            yield current
+        current = Section(level=len(match.group(1)), heading=(match.group(2) or "").strip(), body="")
+        body_start = match.end() + 1
+    if current is not None:
+        current.body = body[body_start:].strip("\n")
+        yield current
+
+
+class StreamingFenceStripper:
+    """チャンクごとに届く応答からコードブロックの囲みを除く（結果は NoteDocument.parse の text と同じ）
+
+    先頭は空白と ```markdown の行を読み飛ばす。末尾の ``` は応答が終わるまで判定できないため、
+    最後の本文行より後ろ（行末の空白・空行・``` だけの行・書きかけの行）だけを保留し、それ以外はすぐに返す。
+    """
+
+    def __init__(self):
+        self._head = ""  # 先頭の判定が済むまでの受信内容
+        self._in_head = True
+        self._fence_checked = False
+        self._pending = ""
+        self.peak_pending = 0  # 保留した最大文字数（応答全体を溜め込んでいないことの確認用）
+
+    def feed(self, chunk: str) -> str:
+        if not self._in_head:
+            return self._feed_body(chunk)
+        self._head += chunk
+        text = self._head.lstrip()
+        if not self._fence_checked:
+            if len(text) < len(_CODE_FENCE) and _CODE_FENCE.startswith(text):
+                return ""  # 空、または ``` の途中まで
+            if text.startswith(_CODE_FENCE):
+                first_nl = text.find("\n")
+                if first_nl == -1:
+                    return ""
+                text = text[first_nl + 1:].lstrip()
+            self._fence_checked = True
+        self._head = text
+        if not text:
+            return ""
+        self._in_head = False
+        self._head = ""
+        return self._feed_body(text)
+
+    def _feed_body(self, chunk: str) -> str:
+        data = self._pending + chunk
+        # 後ろから見て最初の本文行（空行でも ``` だけでもない完結した行）の末尾までを書き出す。
+        # その行の末尾の空白と改行は、後ろが空白だけで終わった場合に削れるよう保留側に残す。
+        cut = -1
+        end = data.rfind("\n")
+        while end != -1:
+            start = data.rfind("\n", 0, end) + 1
+            line = data[start:end].rstrip()
+            if line.strip() and line.strip() != _CODE_FENCE:
+                cut = start + len(line)
+                break
+            end = start - 1
+        if cut == -1:
+            self._pending = data
+            self.peak_pending = max(self.peak_pending, len(data))
+            return ""
+        self._pending = data[cut:]
+        self.peak_pending = max(self.peak_pending, len(self._pending))
+        return data[:cut]
+
+    def finish(self) -> str:
+        """応答の終わりに、保留分から末尾の ``` と空白を除いて返す"""
+        if self._in_head:
+            text = self._head.strip()
+            if not self._fence_checked and text.startswith(_CODE_FENCE):
+                return ""
+            return "" if text == _CODE_FENCE else text
+        tail = self._pending.rstrip()
+        last_nl = tail.rfind("\n")
+        if tail[last_nl + 1:].strip() == _CODE_FENCE:
+            tail = tail[:max(last_nl, 0)].rstrip()
+        self._pending = ""
+        return tail
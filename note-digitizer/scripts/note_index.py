@@ -0,0 +1,277 @@
+"""生成ノートのフロントマター索引（タイトル・日付・タグ・意図・元ファイル名）
+
+MarkdownWriter.write のたびに1件ずつ更新され、「タグ X のノート」「今月の intent: 技術検討 のノート」を
+Vault 全体を読み直さずに SQLite のインデックスで引けるようにする。
+タグ・意図は (tag, name) / (intent, date) の索引を持つため、検索は O(log n)。
+
+索引が無い・壊れた・Vault を手で編集した場合は rebuild で出力フォルダ全体から作り直す
+（ノートの読み込みとフロントマターの解析はスレッドプールで並列に行う）。
+
+    python -m scripts index rebuild
+    python -m scripts index tag ゲーミフィケーション
+    python -m scripts index intent 技術検討 --since 2026-10-01
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from config import Config
+from note_document import NoteDocument
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NoteRecord:
+    name: str  # 出力フォルダ内のファイル名
+    title: str
+    date: str
+    intent: str
+    source: str  # 元ファイル名（拡張子付き。rebuild で元ファイルが見つからなかった場合は stem のみ）
+    tags: list[str] = field(default_factory=list)
+
+
+def source_stem(name: str) -> str:
+    """出力ファイル名 YYYYMMDD_HHMMSS_<stem>.md から元ファイル名の stem を復元する"""
+    parts = Path(name).stem.split("_", 2)
+    return parts[2] if len(parts) == 3 else Path(name).stem
+
+
+def parse_note(name: str, doc: NoteDocument, source: str = "") -> NoteRecord:
+    """ノートのフロントマターから NoteRecord を作る（source 省略時は出力ファイル名から復元した stem）"""
+    return NoteRecord(
+        name=name,
+        title=doc.title or Path(name).stem,
+        date=doc.date,
+        intent=doc.intent,
+        source=source or source_stem(name),
+        tags=doc.tags,
+    )
+
+
+def _source_names(source_dir: Path | None) -> dict[str, str]:
+    """元ファイルのフォルダから stem -> ファイル名（拡張子付き）の対応を作る（stem が重複するものは除く）"""
+    if source_dir is None:
+        return {}
+    names: dict[str, str] = {}
+    duplicated: set[str] = set()
+    try:
+        with os.scandir(source_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                stem = Path(entry.name).stem
+                if stem in names:
+                    duplicated.add(stem)
+                names[stem] = entry.name
+    except OSError as e:
+        logger.warning("元ファイルのフォルダを読み込めません: %s (%s)", source_dir, e)
+        return {}
+    for stem in duplicated:
+        del names[stem]
+    return names
+
+
+class NoteIndex:
+    """ノートのフロントマター索引（SQLite）"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS notes ("
+            " name TEXT PRIMARY KEY,"
+            " title TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " intent TEXT NOT NULL,"
+            " source TEXT NOT NULL"
+            ");"
+            "CREATE INDEX IF NOT EXISTS notes_intent ON notes (intent, date);"
+            "CREATE INDEX IF NOT EXISTS notes_date ON notes (date);"
+            "CREATE TABLE IF NOT EXISTS note_tags ("
+            " tag TEXT NOT NULL,"
+            " name TEXT NOT NULL REFERENCES notes (name) ON DELETE CASCADE,"
+            " pos INTEGER NOT NULL,"
+            " PRIMARY KEY (tag, name)"
+            ") WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS note_tags_name ON note_tags (name);"
+        )
+        self._conn.commit()
+
+    def _upsert(self, record: NoteRecord):
+        self._conn.execute("DELETE FROM notes WHERE name = ?", (record.name,))
+        self._conn.execute(
+            "INSERT INTO notes (name, title, date, intent, source) VALUES (?, ?, ?, ?, ?)",
+            (record.name, record.title, record.date, record.intent, record.source),
+        )
+        self._conn.executemany(
+            "INSERT INTO note_tags (tag, name, pos) VALUES (?, ?, ?)",
+            [(tag, record.name, pos) for pos, tag in enumerate(record.tags)],
+        )
+
+    def add(self, output_path: Path, doc: NoteDocument, source: str = ""):
+        """書き込んだノートを索引に追加する（同名のノートは置き換える）"""
+        record = parse_note(output_path.name, doc, source)
+        with self._lock:
+            self._upsert(record)
+            self._conn.commit()
+
+    def remove(self, names: list[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM notes WHERE name = ?", [(n,) for n in names])
+            self._conn.commit()
+
+    def rebuild(self, output_dir: Path, workers: int = 8, source_dir: Path | None = None) -> int:
+        """出力フォルダの全ノートから索引を作り直し、登録件数を返す
+
+        ノートには元ファイルの拡張子が残らないため、元ファイル名（source）は書き込み時と同じ拡張子付きになるよう
+        既存の索引の値、source_dir（監視フォルダ）で stem が一致するファイル名の順に引き継ぐ。
+        """
+        with os.scandir(output_dir) as it:
+            names = [e.name for e in it if e.name.endswith(".md") and e.is_file()]
+        with self._lock:
+            known = dict(self._conn.execute("SELECT name, source FROM notes").fetchall())
+        by_stem = _source_names(source_dir)
+
+        def resolve_source(name: str) -> str:
+            stem = source_stem(name)
+            source = known.get(name, "")
+            if source and source != stem:
+                return source
+            return by_stem.get(stem, stem)
+
+        def load(name: str) -> NoteRecord | None:
+            try:
+                content = (output_dir / name).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning("ノートを読み込めません: %s (%s)", name, e)
+                return None
+            return parse_note(name, NoteDocument.parse(content), resolve_source(name))
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            records = [r for r in pool.map(load, names) if r is not None]
+
+        with self._lock:
+            self._conn.execute("DELETE FROM notes")
+            for record in records:
+                self._upsert(record)
+            self._conn.commit()
+        logger.info("ノート索引を再構築しました: %d件", len(records))
+        return len(records)
+
+    def _records(self, where: str, params: tuple) -> list[NoteRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT n.name, n.title, n.date, n.intent, n.source,"
+                " (SELECT group_concat(tag, char(31)) FROM"
+                "  (SELECT tag FROM note_tags t WHERE t.name = n.name ORDER BY t.pos))"
+                f" FROM notes n WHERE {where} ORDER BY n.date, n.name",
+                params,
+            ).fetchall()
+        return [NoteRecord(*row[:5], tags=row[5].split("\x1f") if row[5] else []) for row in rows]
+
+    def get(self, name: str) -> NoteRecord | None:
+        records = self._records("n.name = ?", (name,))
+        return records[0] if records else None
+
+    def by_tag(self, tag: str) -> list[NoteRecord]:
+        return self._records("n.name IN (SELECT name FROM note_tags WHERE tag = ?)", (tag,))
+
+    def by_intent(self, intent: str, since: str = "", until: str = "") -> list[NoteRecord]:
+        """意図が一致するノート。since / until は YYYY-MM-DD（until は当日を含む）"""
+        return self._records(
+            "n.intent = ? AND n.date >= ? AND (? = '' OR n.date <= ?)",
+            (intent, since, until, until),
+        )
+
+    def tag_counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tag, COUNT(*) FROM note_tags GROUP BY tag ORDER BY COUNT(*) DESC, tag"
+            ).fetchall()
+        return dict(rows)
+
+    def intent_counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT intent, COUNT(*) FROM notes GROUP BY intent ORDER BY COUNT(*) DESC, intent"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m scripts index", description="ノート索引の検索・再構築")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="出力フォルダから索引を作り直す")
+    rebuild.add_argument("--workers", type=int, default=8, help="ノート読み込みの並列数")
+    tag = sub.add_parser("tag", help="タグでノートを検索する（省略時はタグの一覧）")
+    tag.add_argument("tag", nargs="?")
+    intent = sub.add_parser("intent", help="意図でノートを検索する（省略時は意図の一覧）")
+    intent.add_argument("intent", nargs="?")
+    intent.add_argument("--since", default="", help="この日付以降（YYYY-MM-DD）")
+    intent.add_argument("--until", default="", help="この日付以前（YYYY-MM-DD）")
+    for p in (tag, intent):
+        p.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        stream=sys.stderr,
+    )
+
+    config = Config()
+    index = NoteIndex(config.note_index_path)
+    try:
+        if args.command == "rebuild":
+            source_dir = config.watch_folder if os.getenv("WATCH_FOLDER") else None
+            count = index.rebuild(config.output_dir, args.workers, source_dir)
+            print(f"{count}件のノートを索引に登録しました: {config.note_index_path}")
+            return
+
+        if args.command == "tag":
+            result = index.by_tag(args.tag) if args.tag else index.tag_counts()
+        else:
+            result = (
+                index.by_intent(args.intent, args.since, args.until)
+                if args.intent
+                else index.intent_counts()
+            )
+
+        if isinstance(result, dict):
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+            else:
+                for key, count in result.items():
+                    print(f"{count:6d}  {key or '（なし）'}")
+            return
+        if args.json:
+            print(json.dumps([asdict(r) for r in result], ensure_ascii=False, indent=2))
+        else:
+            for r in result:
+                print(f"{r.date}  {r.title}  [{', '.join(r.tags)}]  {config.output_dir / r.name}")
+            print(f"--- {len(result)}件")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
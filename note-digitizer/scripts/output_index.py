@@ -0,0 +1,131 @@
+"""出力ノート（Obsidian Vault 内の Markdown）の永続インデックス
+
+ノートごとに (ファイル名, ソースキー, 内容ハッシュ, サイズ, mtime) を SQLite に保存する。
+refresh は出力フォルダを走査し、サイズ・mtime が変わったファイルと新しいファイルだけを
+スレッドプールでハッシュし直すため、2回目以降は新しく増えたノートの分しか読まない。
+
+ソースキーは出力ファイル名 YYYYMMDD_HHMMSS_<元ファイル名の stem>.md の stem 部分を、
+処理済みDBと同じく Google Drive の " (n)" を除去して正規化したもの。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from processed_tracker import normalize_filename
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP_PREFIX_PARTS = 2  # YYYYMMDD と HHMMSS
+
+
+@dataclass
+class NoteEntry:
+    name: str
+    source_key: str
+    content_hash: str
+    size: int
+    mtime_ns: int
+
+
+def source_key(note_name: str) -> str:
+    """出力ファイル名からタイムスタンプを除き、Drive の (n) を除去したソースキーを返す"""
+    parts = note_name.split("_", _TIMESTAMP_PREFIX_PARTS)
+    source = parts[-1] if len(parts) > _TIMESTAMP_PREFIX_PARTS else note_name
+    return normalize_filename(source)
+
+
+def _content_md5(path: Path) -> str:
+    # ノートは小さいため一括で読む
+    return hashlib.md5(path.read_bytes()).hexdigest()
+
+
+class OutputIndex:
+    """出力ノートのインデックス（SQLite）"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS notes ("
+            " name TEXT PRIMARY KEY,"
+            " source_key TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS notes_source ON notes (source_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS notes_hash ON notes (content_hash)")
+        self._conn.commit()
+
+    def entries(self) -> list[NoteEntry]:
+        rows = self._conn.execute(
+            "SELECT name, source_key, content_hash, size, mtime_ns FROM notes ORDER BY name"
+        ).fetchall()
+        return [NoteEntry(*row) for row in rows]
+
+    def refresh(self, output_dir: Path, workers: int = 8) -> dict[str, int]:
+        """出力フォルダとインデックスを同期し、{added, updated, removed, unchanged} の件数を返す"""
+        known = {
+            name: (size, mtime_ns)
+            for name, size, mtime_ns in self._conn.execute(
+                "SELECT name, size, mtime_ns FROM notes"
+            )
+        }
+        seen: set[str] = set()
+        changed: list[tuple[str, int, int]] = []
+        with os.scandir(output_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".md") or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                if known.get(entry.name) != (st.st_size, st.st_mtime_ns):
+                    changed.append((entry.name, st.st_size, st.st_mtime_ns))
+
+        def hash_one(item: tuple[str, int, int]) -> NoteEntry | None:
+            name, size, mtime_ns = item
+            try:
+                digest = _content_md5(output_dir / name)
+            except OSError as e:
+                logger.warning("ノートを読み込めません: %s (%s)", name, e)
+                return None
+            return NoteEntry(name, source_key(name), digest, size, mtime_ns)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            hashed = [e for e in pool.map(hash_one, changed) if e is not None]
+
+        removed = [name for name in known if name not in seen]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO notes (name, source_key, content_hash, size, mtime_ns)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(e.name, e.source_key, e.content_hash, e.size, e.mtime_ns) for e in hashed],
+        )
+        self.remove(removed, commit=False)
+        self._conn.commit()
+
+        added = sum(1 for e in hashed if e.name not in known)
+        stats = {
+            "added": added,
+            "updated": len(hashed) - added,
+            "removed": len(removed),
+            "unchanged": len(seen) - len(changed),
+        }
+        logger.info("出力インデックスを更新しました: %s", stats)
+        return stats
+
+    def remove(self, names: list[str], commit: bool = True):
+        self._conn.executemany("DELETE FROM notes WHERE name = ?", [(n,) for n in names])
+        if commit:
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,71 @@
+"""複数ページPDFの分割と、ページごとの解析結果のマージ"""
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+
+from note_document import NoteDocument
+
+# 分割したページ群に付け足す指示（{first}〜{last} / {total} ページ目であることを伝える）
+PAGE_PROMPT_SUFFIX = (
+    "\n\n# 分割解析について\n\n"
+    "添付PDFは全{total}ページのノートのうち {first}〜{last} ページ目です。"
+    "このページ範囲の内容だけを上記フォーマットで出力してください。\n"
+)
+
+
+@dataclass
+class PageGroup:
+    first: int  # 1始まり
+    last: int
+    data: bytes  # このページ範囲だけを含むPDF
+
+
+def count_pages(pdf_path: Path) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(str(pdf_path)).pages)
+
+
+def split_pdf(pdf_path: Path, pages_per_group: int) -> tuple[int, list[PageGroup]]:
+    """PDFを pages_per_group ページごとに分割し、(総ページ数, ページ群) を返す"""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(str(pdf_path))
+    total = len(reader.pages)
+    groups: list[PageGroup] = []
+    for start in range(0, total, pages_per_group):
+        end = min(start + pages_per_group, total)
+        writer = PdfWriter()
+        for i in range(start, end):
+            writer.add_page(reader.pages[i])
+        buf = io.BytesIO()
+        writer.write(buf)
+        groups.append(PageGroup(first=start + 1, last=end, data=buf.getvalue()))
+    return total, groups
+
+
+def merge_page_notes(notes: list[tuple[int, int, NoteDocument]]) -> NoteDocument:
+    """ページ群ごとのノートを、フロントマター1つのノートにまとめる
+
+    notes: (開始ページ, 終了ページ, ノート) のリスト（ページ順）
+    title / date / intent は最初に値のあるページ群のものを、tags は全ページ群の和集合を使う。
+    """
+    merged: dict[str, str] = {}  # 挿入順 = 最初に現れた順（tags は位置だけ確保）
+    tags: list[str] = []
+    bodies: list[str] = []
+    for first, last, doc in notes:
+        for key, value in doc.frontmatter.items():
+            if key == "tags":
+                merged.setdefault("tags", "")
+                tags.extend(t for t in doc.tags if t not in tags)
+            elif value and not merged.get(key):
+                merged[key] = value
+        label = f"p.{first}" if first == last else f"p.{first}-{last}"
+        bodies.append(f"<!-- {label} -->\n\n{doc.body.strip()}")
+
+    merged["tags"] = f"[{', '.join(tags)}]"
+    frontmatter = "\n".join(f"{key}: {value}" for key, value in merged.items())
+    return NoteDocument.parse(
+        "---\n" + frontmatter + "\n---\n\n" + "\n\n---\n\n".join(bodies) + "\n"
+    )
@@ -1,18 +1,21 @@
 """処理済みファイルの管理（重複処理防止）"""
 
-import hashlib
-import json
 import logging
 import re
+import threading
 from pathlib import Path
 
+from fingerprint import file_md5
+from near_duplicate import HammingIndex, perceptual_hash
+from tracker_store import open_store
+
 logger = logging.getLogger(__name__)
 
 # Google Drive の同期競合サフィックス " (1)", " (2)" 等を除去するパターン
 # (?=\.[^.]+$) の先読みで「直前が .拡張子 の末尾」の場合のみマッチ
 _GDRIVE_SUFFIX_RE = re.compile(r"\s*\(\d+\)(?=\.[^.]+$)")
 
-# サイズ判定の誤差許容率（5%）
+# サイズ判定の誤差許容率（5%）。知覚ハッシュが使えない場合のフォールバック
 _SIZE_TOLERANCE = 0.05
 
 
@@ -29,70 +32,85 @@ def normalize_filename(name: str) -> str:
 
 
 class ProcessedTracker:
-    """処理済みファイルをJSONで永続管理し、同一ファイルの重複処理を防ぐ。
+    """処理済みファイルを永続管理し、同一ファイルの重複処理を防ぐ。
 
     ファイル名を正規化（Google Drive の (n) サフィックスを除去）したキーと
-    MD5ハッシュ＋ファイルサイズで同一性を判定する。
+    MD5ハッシュ＋知覚ハッシュで同一性を判定する。
+
+    エントリ:
+        { "スキャン_1013.pdf": { "hash": "<md5>", "size": <bytes>, "phash": "<dHash hex>" }, ... }
 
-    JSONスキーマ:
-        { "スキャン_1013.pdf": { "hash": "<md5>", "size": <bytes> }, ... }
+    phash（知覚ハッシュ）はハミング距離インデックスに載せ、名前の違う再スキャンも近似重複として検出する。
 
+    保存方式は tracker_store（json / journal / sqlite）から選択する。
     旧形式 { "スキャン_1013.pdf": "<md5>" } は起動時に自動マイグレーションされる。
     """
 
-    def __init__(self, db_path: Path):
+    def __init__(
+        self, db_path: Path, backend: str = "auto", hamming_threshold: int = -1
+    ):
         self.db_path = db_path
-        self._processed: dict[str, dict] = {}  # normalized_filename -> {hash, size}
+        # 知覚ハッシュのハミング距離しきい値（負の値で知覚ハッシュ判定を無効化）
+        self.hamming_threshold = hamming_threshold
+        self._processed: dict[str, dict] = {}  # normalized_filename -> {hash, size, phash}
+        self._lock = threading.Lock()  # 複数ワーカーからの同時登録・保存を直列化
+        self._store = open_store(db_path, backend)
+        self._phash_index = HammingIndex(hamming_threshold)
         self._load()
 
     def _load(self):
-        if self.db_path.exists():
-            try:
-                raw = json.loads(self.db_path.read_text(encoding="utf-8"))
-                # 旧形式 {filename: md5str} を検出して自動マイグレーション
-                if raw and isinstance(next(iter(raw.values())), str):
-                    logger.info("旧形式DBを新形式に自動移行します: %d件", len(raw))
-                    migrated: dict[str, dict] = {}
-                    for filename, md5 in raw.items():
-                        norm_key = normalize_filename(filename)
-                        # 同一正規化キーに複数エントリがある場合は最初のものを採用
-                        if norm_key not in migrated:
-                            migrated[norm_key] = {"hash": md5, "size": None}
-                    self._processed = migrated
-                    self._save()
-                    logger.info(
-                        "DB移行完了: %d件 -> %d件（重複キーを統合）",
-                        len(raw),
-                        len(migrated),
-                    )
-                else:
-                    self._processed = raw
-                logger.debug("処理済みDB読み込み: %d件", len(self._processed))
-            except Exception as e:
-                logger.warning("処理済みDB読み込み失敗、空で起動します: %s", e)
-                self._processed = {}
-
-    def _save(self):
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.db_path.write_text(
-            json.dumps(self._processed, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        try:
+            self._processed = self._store.load()
+            for key, entry in self._processed.items():
+                if entry.get("phash"):
+                    self._phash_index.add(int(entry["phash"], 16), key)
+            logger.debug(
+                "処理済みDB読み込み: %d件（知覚ハッシュ %d件）",
+                len(self._processed),
+                self._phash_index.size,
+            )
+        except Exception as e:
+            logger.warning("処理済みDB読み込み失敗、空で起動します: %s", e)
+            self._processed = {}
+
+    def close(self):
+        with self._lock:
+            self._store.close()
 
     def _hash(self, path: Path) -> str:
-        return hashlib.md5(path.read_bytes()).hexdigest()
+        # ストリーミング計算 + (size, mtime_ns, inode) キャッシュ。未変更ファイルは再読み込みしない
+        return file_md5(path)
 
     def is_processed(self, path: Path) -> bool:
-        """正規化キー＋（ハッシュ一致 OR サイズ近似）で処理済みかどうかを返す。"""
+        """処理済みかどうかを返す。
+
+        1. 正規化キーが一致し、MD5も一致 → 処理済み
+        2. 知覚ハッシュがしきい値以内の登録済みスキャンがある（ファイル名は問わない）→ 処理済み
+        3. 知覚ハッシュが使えない場合のみ、正規化キー一致＋サイズ近似（5%以内）で判定
+        """
         norm_key = normalize_filename(path.name)
-        if norm_key not in self._processed:
-            return False
         try:
-            entry = self._processed[norm_key]
+            entry = self._processed.get(norm_key)
             # ハッシュ完全一致 → 確定的に処理済み
-            if entry["hash"] == self._hash(path):
+            if entry is not None and entry["hash"] == self._hash(path):
                 return True
-            # サイズ近似（5%以内）→ 同一スキャンとみなす
+
+            phash = self._phash(path)
+            if phash is not None:
+                match = self._find_near_duplicate(phash)
+                if match is not None:
+                    distance, key = match
+                    logger.info(
+                        "知覚ハッシュで重複検出: %s ≒ %s (距離 %d)", path.name, key, distance
+                    )
+                    return True
+                # 同名エントリにも知覚ハッシュがあれば、見た目が違う＝別スキャンと確定できる
+                if entry is None or entry.get("phash") is not None:
+                    return False
+
+            if entry is None:
+                return False
+            # サイズ近似（5%以内）→ 同一スキャンとみなす（知覚ハッシュが無い旧エントリ用）
             stored_size = entry.get("size")
             if stored_size is not None:
                 current_size = path.stat().st_size
@@ -111,15 +129,32 @@ class ProcessedTracker:
         except Exception:
             return False
 
+    def _phash(self, path: Path) -> int | None:
+        if self.hamming_threshold < 0:
+            return None
+        return perceptual_hash(path)
+
+    def _find_near_duplicate(self, phash: int) -> tuple[int, str] | None:
+        with self._lock:
+            matches = self._phash_index.query(phash)
+        return matches[0] if matches else None
+
     def mark_processed(self, path: Path):
-        """正規化キーで処理済みとして登録し、DBを保存する。"""
+        """正規化キーで処理済みとして登録し、DBに反映する。"""
         try:
             norm_key = normalize_filename(path.name)
-            self._processed[norm_key] = {
-                "hash": self._hash(path),
-                "size": path.stat().st_size,
-            }
-            self._save()
+            entry = {"hash": self._hash(path), "size": path.stat().st_size}
+            phash = self._phash(path)
+            if phash is not None:
+                entry["phash"] = format(phash, "x")
+            with self._lock:
+                self._processed[norm_key] = entry
+                self._store.put(norm_key, entry)
+                # 同じキーの再登録（同名で内容の違う再エクスポートなど）では古い知覚ハッシュを残さない
+                if phash is not None:
+                    self._phash_index.add(phash, norm_key)
+                else:
+                    self._phash_index.remove(norm_key)
             logger.info("処理済み登録: %s (キー: %s)", path.name, norm_key)
         except Exception as e:
             logger.warning("処理済み登録失敗: %s (%s)", path.name, e)
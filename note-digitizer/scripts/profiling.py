@@ -0,0 +1,131 @@
+"""パイプライン処理のプロファイリング（PROFILE_PIPELINE）
+
+1ファイルの処理に時間がかかったとき、ハッシュ計算・画像デコード・API・ディスクのどこで
+時間を使ったかを調べるため、cProfile と tracemalloc で計測して logs/profile/ に書き出す。
+
+- file:   NoteHandler._process を1ファイルずつ計測する。PROFILE_EVERY_N 件ごと、または
+          処理時間が PROFILE_SLOW_SECONDS 以上だったファイルの結果を保存する
+          （遅いファイルを拾うには全件を計測する必要があるため、閾値を設定すると全件が計測対象になる）
+- worker: ワーカースレッド note-worker-0 の開始から終了までをまとめて計測し、停止時に保存する
+
+出力は <時刻>_<ファイル名>.prof（pstats / snakeviz 等で開く）と、累積時間・メモリ確保の
+上位をまとめた .txt。無効時（off）はラップ自体を行わないためオーバーヘッドは無い。
+
+cProfile（Python 3.12 以降は sys.monitoring）と tracemalloc はプロセス全体で1つしか動かせないため、
+計測は同時に1件までとし、計測中に他のワーカーが処理するファイルは計測しない。
+tracemalloc の結果には計測中に他のスレッドが確保したメモリも含まれる。
+画像の前処理はプロセスプールで行われるため、デコード・縮小も計測する場合は PREPROCESS_WORKERS=0 にする。
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_TOP_N = 25  # レポートに載せる関数・確保箇所の件数
+_TRACEMALLOC_FRAMES = 10
+
+
+class PipelineProfiler:
+    def __init__(self, config: Config):
+        self.mode = config.profile_pipeline
+        self.every_n = config.profile_every_n
+        self.slow_seconds = config.profile_slow_seconds
+        self.output_dir = config.profile_dir
+        self._count = 0
+        self._count_lock = threading.Lock()
+        self._active = threading.Lock()  # 同時に計測するのは1件まで
+
+    def wrap_process(self, process: Callable[[Path], Any]) -> Callable[[Path], Any]:
+        """NoteHandler._process をラップする（file モード）"""
+
+        @functools.wraps(process)
+        def wrapper(image_path: Path):
+            with self._count_lock:
+                self._count += 1
+                sampled = self.every_n > 0 and self._count % self.every_n == 0
+            if not sampled and self.slow_seconds <= 0:
+                return process(image_path)
+            return self._profile(image_path.name, sampled, process, image_path)
+
+        return wrapper
+
+    def wrap_worker(self, worker_loop: Callable[[], Any]) -> Callable[[], Any]:
+        """ワーカースレッドの本体をラップする（worker モード）"""
+
+        @functools.wraps(worker_loop)
+        def wrapper():
+            return self._profile(threading.current_thread().name, True, worker_loop)
+
+        return wrapper
+
+    def _profile(self, label: str, always_dump: bool, fn: Callable, *args):
+        if not self._active.acquire(blocking=False):
+            logger.debug("他の計測中のためプロファイルしません: %s", label)
+            return fn(*args)
+        try:
+            profiler = cProfile.Profile()
+            tracemalloc.start(_TRACEMALLOC_FRAMES)
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return fn(*args)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                slow = self.slow_seconds > 0 and elapsed >= self.slow_seconds
+                if always_dump or slow:
+                    reason = "サンプリング" if always_dump else f"{self.slow_seconds:g}秒以上"
+                    self._dump(label, profiler, snapshot, elapsed, peak, reason)
+        finally:
+            self._active.release()
+
+    def _dump(
+        self,
+        label: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        elapsed: float,
+        peak: int,
+        reason: str,
+    ):
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            # ファイル名にドットを含む場合（"2024.01.05 メモ.jpg" など）に with_suffix で切り詰められないよう、
+            # 拡張子は文字列として付け足す
+            base = f"{datetime.now():%Y%m%d_%H%M%S}_{Path(label).stem}"
+            prof_path = self.output_dir / f"{base}.prof"
+            profiler.dump_stats(str(prof_path))
+
+            report = io.StringIO()
+            report.write(f"対象: {label}\n理由: {reason}\n")
+            report.write(f"処理時間: {elapsed:.3f}秒\nメモリ確保のピーク: {peak / 1024 / 1024:.1f} MB\n\n")
+            report.write(f"=== 累積時間の上位 {_TOP_N} 関数 ===\n")
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(_TOP_N)
+            report.write(f"\n=== メモリ確保の上位 {_TOP_N} 箇所（計測終了時点で残っているもの） ===\n")
+            snapshot = snapshot.filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            for stat in snapshot.statistics("lineno")[:_TOP_N]:
+                report.write(f"{stat}\n")
+            (self.output_dir / f"{base}.txt").write_text(report.getvalue(), encoding="utf-8")
+        except OSError as e:
+            logger.warning("プロファイル結果の保存に失敗しました: %s", e)
+            return
+        logger.info(
+            "プロファイルを保存しました: %s (%.1f秒, %s)", prof_path.name, elapsed, reason
+        )
@@ -0,0 +1,227 @@
+"""Gemini のコンテキストキャッシュによる固定プロンプトの再利用
+
+references/gemini_prompt.md のテンプレートは固定の指示で、これまでは毎回すべてを送っていた。
+テンプレートをコンテキストキャッシュ（CachedContent）として登録しておき、リクエストには
+日付の入った短い可変部分と画像だけを送ることで、入力トークンとサーバー側の prefill 時間を減らす。
+
+- キャッシュ名はテンプレートのハッシュ・モデル・有効期限とともに保存し、再起動後も期限内なら再利用する
+- 使うたびに残り時間を確認し、TTL の _REFRESH_FRACTION を切っていれば延長する
+  （処理がない間は延長しないため、放置したキャッシュは期限切れで削除され保存料金もかからない）
+- テンプレートが変わった（ハッシュが変わった）ら古いキャッシュを削除して作り直す
+- トークン数が最小値に満たない・モデルが未対応などで作成できない場合は、そのテンプレートでは
+  キャッシュを使わず、これまでどおりプロンプト全体を送る
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_FRACTION = 0.25  # 残り時間が TTL のこの割合を切ったら延長する
+_EXPIRY_MARGIN_SECONDS = 30  # 期限までこれ未満のキャッシュは使わない（リクエスト中に切れるのを避ける）
+_RETRY_SECONDS = 300  # 一時的なエラーで作成できなかった場合に、次に作成を試みるまでの秒数
+# キャッシュを参照したリクエストがこれらで失敗し、エラーがキャッシュについてのものなら、削除済み・期限切れとみなす
+# （同じステータスは Files API の参照先が消えた場合にも返るため、ステータスだけでは判断しない）
+_STALE_CACHE_STATUS = {403, 404}
+_CACHE_ERROR_RE = re.compile(r"cached[ _]?contents?", re.IGNORECASE)
+_DISPLAY_NAME = "note-digitizer prompt"
+
+
+@dataclass
+class CachedPrompt:
+    name: str  # cachedContents/xxxx
+    prompt_hash: str
+    model: str
+    expires_at: float  # UNIX 時刻
+    tokens: int  # キャッシュしたトークン数
+
+
+class PromptCache:
+    """プロンプトの固定部分をコンテキストキャッシュとして管理し、ヒット率と節約したトークン数を数える"""
+
+    def __init__(self, state_path: Path, model_name: str, ttl_seconds: int):
+        self.state_path = state_path
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._entry = self._load()
+        self._unsupported_hash: str | None = None  # キャッシュを作成できなかったテンプレートのハッシュ
+        self._retry_at = 0.0
+        metrics.set_gauge("prompt_cache_hit_ratio", self.hit_ratio)
+        metrics.set_gauge("prompt_cache_tokens_saved", lambda: self.tokens_saved)
+
+    @staticmethod
+    def hash_prompt(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def _load(self) -> CachedPrompt | None:
+        try:
+            return CachedPrompt(**json.loads(self.state_path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("コンテキストキャッシュの状態を読み込めませんでした: %s", e)
+            return None
+
+    def _save(self):
+        """呼び出し側で self._lock を保持していること"""
+        try:
+            if self._entry is None:
+                self.state_path.unlink(missing_ok=True)
+                return
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.state_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(asdict(self._entry), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning("コンテキストキャッシュの状態を保存できませんでした: %s", e)
+
+    def cached_content(self, client, prompt: str) -> str | None:
+        """prompt を登録したコンテキストキャッシュの名前を返す（使えない場合は None）
+
+        未登録なら作成し、期限が近ければ延長し、テンプレートが変わっていれば作り直す。
+        """
+        prompt_hash = self.hash_prompt(prompt)
+        with self._lock:
+            if prompt_hash == self._unsupported_hash:
+                return None
+            now = time.time()
+            entry = self._entry
+            if entry is not None and (entry.prompt_hash != prompt_hash or entry.model != self.model_name):
+                logger.info("プロンプトが変わったため、コンテキストキャッシュを作り直します")
+                self._delete(client, entry)
+                entry = None
+            elif entry is not None and entry.expires_at - now < self.ttl_seconds * _REFRESH_FRACTION:
+                entry = self._refresh(client, entry, now)
+            if entry is None:
+                if now < self._retry_at:
+                    return None
+                entry = self._create(client, prompt, prompt_hash, now)
+            if entry is not self._entry:
+                self._entry = entry
+                self._save()
+            return entry.name if entry is not None else None
+
+    def _create(self, client, prompt: str, prompt_hash: str, now: float) -> CachedPrompt | None:
+        from google.genai import errors, types
+
+        try:
+            cached = client.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(
+                    contents=[prompt],
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=_DISPLAY_NAME,
+                ),
+            )
+        except Exception as e:
+            if isinstance(e, errors.ClientError) and e.code != 429:
+                # 最小トークン数に満たない・モデルが未対応など。テンプレートが変わるまで作成しない
+                self._unsupported_hash = prompt_hash
+                logger.info("コンテキストキャッシュを使わずにプロンプト全体を送ります: %s", e)
+            else:
+                self._retry_at = now + _RETRY_SECONDS
+                logger.warning(
+                    "コンテキストキャッシュを作成できませんでした（%d秒後に再試行）: %s", _RETRY_SECONDS, e
+                )
+            return None
+        usage = cached.usage_metadata
+        entry = CachedPrompt(
+            name=cached.name,
+            prompt_hash=prompt_hash,
+            model=self.model_name,
+            expires_at=self._expires_at(cached, now),
+            tokens=(usage.total_token_count if usage is not None else None) or 0,
+        )
+        logger.info(
+            "コンテキストキャッシュを作成: %s (%dトークン, TTL %d分)",
+            entry.name,
+            entry.tokens,
+            self.ttl_seconds // 60,
+        )
+        return entry
+
+    def _refresh(self, client, entry: CachedPrompt, now: float) -> CachedPrompt | None:
+        """TTL を延長する。期限切れ・削除済みなら None（作り直す）"""
+        from google.genai import errors, types
+
+        if entry.expires_at - now < _EXPIRY_MARGIN_SECONDS:
+            return None
+        try:
+            cached = client.caches.update(
+                name=entry.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+            )
+        except errors.ClientError as e:
+            if e.code in _STALE_CACHE_STATUS:
+                return None
+            logger.warning("コンテキストキャッシュを延長できませんでした: %s (%s)", entry.name, e)
+            return entry
+        except Exception as e:
+            logger.warning("コンテキストキャッシュを延長できませんでした: %s (%s)", entry.name, e)
+            return entry
+        refreshed = CachedPrompt(**{**asdict(entry), "expires_at": self._expires_at(cached, now)})
+        logger.info("コンテキストキャッシュを延長: %s [%s]", entry.name, self.stats())
+        return refreshed
+
+    def _delete(self, client, entry: CachedPrompt):
+        try:
+            client.caches.delete(name=entry.name)
+        except Exception as e:
+            # 削除できなくても期限が来ればサーバー側で消える
+            logger.debug("古いコンテキストキャッシュを削除できませんでした: %s (%s)", entry.name, e)
+
+    def _expires_at(self, cached, now: float) -> float:
+        if cached.expire_time is not None:
+            return cached.expire_time.timestamp()
+        return now + self.ttl_seconds
+
+    def invalidate(self, name: str, exc: BaseException) -> bool:
+        """キャッシュ name を参照したリクエストの失敗が、キャッシュの削除・期限切れによるものなら破棄して True を返す"""
+        if getattr(exc, "code", None) not in _STALE_CACHE_STATUS:
+            return False
+        message = str(getattr(exc, "message", None) or exc)
+        if name not in message and not _CACHE_ERROR_RE.search(message):
+            # アップロード済みファイルなど、キャッシュ以外の参照先のエラー
+            return False
+        with self._lock:
+            if self._entry is not None and self._entry.name == name:
+                logger.warning("コンテキストキャッシュを破棄します: %s (%s)", name, exc)
+                self._entry = None
+                self._save()
+        return True
+
+    def record(self, used: bool, response):
+        """リクエストの結果を集計する（response の usage_metadata からキャッシュ済みトークン数を読む）"""
+        usage = getattr(response, "usage_metadata", None)
+        cached_tokens = (getattr(usage, "cached_content_token_count", None) or 0) if used else 0
+        with self._lock:
+            if used:
+                self.hits += 1
+                self.tokens_saved += cached_tokens
+            else:
+                self.misses += 1
+        logger.debug("コンテキストキャッシュ: %s", self.stats())
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> str:
+        """ログ出力用のヒット率・節約したトークン数のサマリ"""
+        return (
+            f"hit {self.hits} / miss {self.misses} ({self.hit_ratio() * 100:.0f}%), "
+            f"{self.tokens_saved}トークン節約"
+        )
@@ -0,0 +1,293 @@
+"""Gemini API 呼び出しのクライアント側レート制御
+
+- RPM / TPM のトークンバケット: 送信前に1リクエスト分・推定トークン分を予約し、
+  足りなければ補充されるまで待つ。応答の usage_metadata で実際のトークン数に補正する
+- AIMD 方式の同時実行数制御: 上限いっぱいから始め、成功ごとに上限を少しずつ増やし（加算）、
+  429（RESOURCE_EXHAUSTED）で半分に減らす（乗算）。減少は冷却期間に1回までとし、
+  同時に返ってきた複数の429で一気に最小値まで落ちないようにする。
+  5xx・通信エラー・再試行しないエラーはクォータと無関係なため、上限を変えない
+- 429 / 5xx / 通信エラーは指数バックオフ（フルジッター）で再試行する。
+  サーバが再試行までの待ち時間（Retry-After / RetryInfo）を返した場合はそれ以上待つ
+
+同期版（ワーカースレッド・PDFページ分割のスレッド）と非同期版（async モード）で同じ制限を共有する。
+"""
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_BACKOFF_BASE = 2.0  # 1回目の再試行の最大待ち時間（秒）
+_BACKOFF_MAX = 60.0
+_BURST_SECONDS = 5.0  # トークンバケットの容量（何秒ぶんの補充量か）
+_DECREASE_COOLDOWN = 5.0  # 同時実行数を減らす最短間隔（秒）
+_RETRY_DELAY_RE = re.compile(r"^([\d.]+)s$")
+
+# 送信前のトークン推定（応答後に実際の値で補正する）
+_CHARS_PER_TOKEN = 2  # 日本語主体のため英語より少なめに見積もる
+_TOKENS_PER_BINARY_PART = 1032  # 画像・PDF 1パートあたり（768px タイル4枚相当）
+
+
+class TokenBucket:
+    """1分あたり rate_per_min 個補充されるトークンバケット
+
+    容量（一度に送れる量）は _BURST_SECONDS 秒ぶんに抑える。容量を1分ぶんにすると、
+    満杯からの一斉送信と補充分が同じ1分間に重なり、サーバ側の集計でクォータの約2倍になるため。
+    reserve は残量が負になっても予約を受け付け、負債が返済されるまでの待ち時間を返す。
+    先に予約した呼び出しから順に送信でき、スレッド・コルーチンのどちらからも使える。
+    """
+
+    def __init__(self, rate_per_min: float):
+        self._rate = rate_per_min / 60.0
+        self.capacity = max(1.0, self._rate * _BURST_SECONDS)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """amount 個を予約し、送信してよくなるまでの待ち時間（秒）を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def adjust(self, delta: float):
+        """予約量と実際の消費量の差を反映する（正なら追加消費、負なら返却）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+    def drain(self):
+        """スロットリングを受けたとき、手持ちのトークンを捨てて補充を待たせる"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+class AdaptiveConcurrency:
+    """AIMD で上限を調整するセマフォ
+
+    起動直後から並列に送れるよう、上限は initial（省略時は maximum）から始めて 429 で縮小する。
+    """
+
+    def __init__(self, minimum: int, maximum: int, initial: int | None = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        start = self.maximum if initial is None else initial
+        self._limit = float(min(self.maximum, max(self.minimum, start)))
+        self._inflight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _try_acquire(self) -> bool:
+        if self._inflight < int(self._limit):
+            self._inflight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._cond:
+            while not self._try_acquire():
+                self._cond.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, throttled: bool = False, succeeded: bool = False):
+        """throttled なら上限を半分に、succeeded なら少し増やす（どちらでもなければ変えない）"""
+        with self._cond:
+            self._inflight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= _DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self._limit = max(float(self.minimum), self._limit / 2)
+                    logger.info("Gemini同時実行数を縮小: %d", self.limit)
+            elif succeeded:
+                # 上限ぶんの成功でおよそ +1
+                self._limit = min(float(self.maximum), self._limit + 1 / self._limit)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _is_api_error(exc: BaseException) -> bool:
+    # google.genai は読み込みが重いため、例外を判定するときに初めて参照する（その時点で読み込み済み）
+    from google.genai import errors
+
+    return isinstance(exc, errors.APIError)
+
+
+def _is_throttled(exc: BaseException) -> bool:
+    """クォータ超過（429 / RESOURCE_EXHAUSTED）か"""
+    return _is_api_error(exc) and (exc.code == 429 or exc.status == "RESOURCE_EXHAUSTED")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    import httpx
+
+    if _is_api_error(exc):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, httpx.TransportError)
+
+
+def _server_retry_delay(exc: BaseException) -> float | None:
+    """Retry-After ヘッダ、または応答の RetryInfo.retryDelay（"27s" 形式）を秒で返す"""
+    if not _is_api_error(exc):
+        return None
+    headers = getattr(exc.response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    details = exc.details.get("error", {}).get("details", []) if isinstance(exc.details, dict) else []
+    for detail in details:
+        match = _RETRY_DELAY_RE.match(str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def estimate_tokens(contents: list) -> int:
+    """リクエストの入力トークン数を大まかに見積もる"""
+    tokens = 0
+    for part in contents:
+        if isinstance(part, str):
+            tokens += len(part) // _CHARS_PER_TOKEN
+        else:
+            tokens += _TOKENS_PER_BINARY_PART
+    return tokens
+
+
+class RateLimiter:
+    """トークンバケット・適応的同時実行数・再試行をまとめたもの
+
+    rpm / tpm が 0 の場合、その制限は行わない。
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        max_concurrency: int,
+        max_retries: int,
+    ):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(1, max_concurrency)
+        self.max_retries = max_retries
+        self.throttled = 0  # 受けたスロットリング（429）の回数
+        self.retries = 0
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        return delay
+
+    def _settle(self, response: Any, estimated_tokens: int):
+        if self.tokens is None:
+            return
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        if actual is not None:
+            self.tokens.adjust(actual - estimated_tokens)
+
+    def _on_error(self, exc: Exception, attempt: int, label: str) -> float:
+        """再試行するなら待ち時間を返し、しないなら例外を送出する"""
+        if not is_retryable(exc) or attempt >= self.max_retries:
+            raise exc
+        if _is_throttled(exc):
+            self.throttled += 1
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.drain()
+        self.retries += 1
+        delay = random.uniform(0, min(_BACKOFF_MAX, _BACKOFF_BASE * 2**attempt))
+        server_delay = _server_retry_delay(exc)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        logger.warning(
+            "Gemini API エラーのため %.1f秒後に再試行します (%d/%d): %s: %s",
+            delay,
+            attempt + 1,
+            self.max_retries,
+            label,
+            exc,
+        )
+        return delay
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int, label: str) -> Any:
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            throttled = succeeded = False
+            try:
+                time.sleep(self._reserve(estimated_tokens))
+                response = fn()
+            except Exception as e:
+                throttled = _is_throttled(e)
+                delay = self._on_error(e, attempt, label)
+            else:
+                succeeded = True
+                self._settle(response, estimated_tokens)
+                return response
+            finally:
+                self.concurrency.release(throttled, succeeded)
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(
+        self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int, label: str
+    ) -> Any:
+        attempt = 0
+        while True:
+            await self.concurrency.acquire_async()
+            throttled = succeeded = False
+            try:
+                await asyncio.sleep(self._reserve(estimated_tokens))
+                response = await fn()
+            except Exception as e:
+                throttled = _is_throttled(e)
+                delay = self._on_error(e, attempt, label)
+            else:
+                succeeded = True
+                self._settle(response, estimated_tokens)
+                return response
+            finally:
+                self.concurrency.release(throttled, succeeded)
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,279 @@
+"""処理済みDBの保存方式（ProcessedTracker のバックエンド）
+
+- json:    従来の processed_files.json。登録のたびに全体を書き直す（一時ファイル経由で置換）
+- journal: 追記専用の JSON Lines。登録は1行追記のみで、行数が膨らんだら圧縮して書き直す
+- sqlite:  正規化キーを主キー（インデックス）とする SQLite テーブル。登録は1行の UPSERT
+
+journal / sqlite は初回起動時、同じ場所にある旧 JSON DB（.json）を自動で取り込む。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("json", "journal", "sqlite")
+
+_SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+
+# journal の圧縮しきい値: 行数がこの値とエントリ数の2倍の両方を超えたら書き直す
+_COMPACT_MIN_LINES = 1000
+
+
+def migrate_legacy(raw: dict) -> dict[str, dict]:
+    """旧形式 {filename: md5str} を {normalized: {hash, size}} に変換する。新形式はそのまま返す。"""
+    # 循環importを避けるため遅延import
+    from processed_tracker import normalize_filename
+
+    if not raw or not isinstance(next(iter(raw.values())), str):
+        return raw
+    migrated: dict[str, dict] = {}
+    for filename, md5 in raw.items():
+        norm_key = normalize_filename(filename)
+        # 同一正規化キーに複数エントリがある場合は最初のものを採用
+        if norm_key not in migrated:
+            migrated[norm_key] = {"hash": md5, "size": None}
+    logger.info(
+        "旧形式DBを新形式に自動移行しました: %d件 -> %d件（重複キーを統合）",
+        len(raw),
+        len(migrated),
+    )
+    return migrated
+
+
+def _write_atomic(path: Path, text: str):
+    """一時ファイルに書いてから置換する（書き込み中断でDBが壊れないように）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class JsonStore:
+    """従来形式の JSON ファイル。登録ごとに全体を書き直す。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._data: dict[str, dict] = {}
+
+    def load(self) -> dict[str, dict]:
+        if not self.path.exists():
+            return {}
+        raw = json.loads(self.path.read_text(encoding="utf-8"))
+        self._data = migrate_legacy(raw)
+        if self._data is not raw:
+            self._flush()
+        return dict(self._data)
+
+    def put(self, key: str, entry: dict):
+        self._data[key] = entry
+        self._flush()
+
+    def put_many(self, entries: dict[str, dict]):
+        self._data.update(entries)
+        self._flush()
+
+    def _flush(self):
+        _write_atomic(
+            self.path, json.dumps(self._data, ensure_ascii=False, indent=2)
+        )
+
+    def close(self):
+        pass
+
+
+class JournalStore:
+    """追記専用の JSON Lines。1行 = {"key": ..., "entry": {...}}。後勝ち。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._data: dict[str, dict] = {}
+        self._lines = 0
+        self._file = None
+
+    def load(self) -> dict[str, dict]:
+        if self.path.exists():
+            damaged = False
+            with self.path.open(encoding="utf-8", errors="replace") as f:
+                for raw in f:
+                    # 改行で終わらない末尾行は、追記途中で中断されたもの
+                    damaged |= not raw.endswith("\n")
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                        self._data[record["key"]] = record["entry"]
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("ジャーナルの壊れた行を無視します: %s", self.path.name)
+                        damaged = True
+                        continue
+                    self._lines += 1
+            if damaged:
+                # 壊れた行を残したまま追記すると次の行がつながって失われるため、正常な行だけで書き直す
+                self._compact()
+        else:
+            legacy = _import_legacy_json(self.path)
+            if legacy:
+                self._data = legacy
+                self._compact()
+        self._maybe_compact()
+        return dict(self._data)
+
+    def put(self, key: str, entry: dict):
+        self._data[key] = entry
+        self._append({key: entry})
+        self._maybe_compact()
+
+    def put_many(self, entries: dict[str, dict]):
+        self._data.update(entries)
+        self._append(entries)
+        self._maybe_compact()
+
+    def _append(self, entries: dict[str, dict]):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+        for key, entry in entries.items():
+            self._file.write(
+                json.dumps({"key": key, "entry": entry}, ensure_ascii=False) + "\n"
+            )
+            self._lines += 1
+        self._file.flush()
+
+    def _maybe_compact(self):
+        if self._lines > max(_COMPACT_MIN_LINES, len(self._data) * 2):
+            self._compact()
+
+    def _compact(self):
+        """最新状態だけを書き出したジャーナルで置き換える"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        _write_atomic(
+            self.path,
+            "".join(
+                json.dumps({"key": key, "entry": entry}, ensure_ascii=False) + "\n"
+                for key, entry in self._data.items()
+            ),
+        )
+        self._lines = len(self._data)
+        logger.debug("ジャーナルを圧縮しました: %d件", self._lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteStore:
+    """正規化キーを主キーとする SQLite テーブル"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 書き込みは ProcessedTracker のロックで直列化されるため、スレッド間共有を許可する
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            " norm_key TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " size INTEGER,"
+            " extra TEXT"
+            ")"
+        )
+        self._conn.commit()
+
+    def load(self) -> dict[str, dict]:
+        rows = self._conn.execute(
+            "SELECT norm_key, hash, size, extra FROM processed"
+        ).fetchall()
+        if not rows:
+            legacy = _import_legacy_json(self.path)
+            if legacy:
+                self.put_many(legacy)
+                return legacy
+        return {key: self._to_entry(h, size, extra) for key, h, size, extra in rows}
+
+    @staticmethod
+    def _to_entry(hash_: str, size: int | None, extra: str | None) -> dict:
+        entry = {"hash": hash_, "size": size}
+        if extra:
+            entry.update(json.loads(extra))
+        return entry
+
+    @staticmethod
+    def _to_row(key: str, entry: dict) -> tuple:
+        # hash / size 以外の項目は extra 列に JSON でまとめる
+        extra = {k: v for k, v in entry.items() if k not in ("hash", "size")}
+        return (
+            key,
+            entry["hash"],
+            entry.get("size"),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def put(self, key: str, entry: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO processed (norm_key, hash, size, extra)"
+            " VALUES (?, ?, ?, ?)",
+            self._to_row(key, entry),
+        )
+        self._conn.commit()
+
+    def put_many(self, entries: dict[str, dict]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO processed (norm_key, hash, size, extra)"
+            " VALUES (?, ?, ?, ?)",
+            [self._to_row(key, entry) for key, entry in entries.items()],
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def _import_legacy_json(path: Path) -> dict[str, dict]:
+    """新バックエンドの初回起動時に、同じ場所の旧 JSON DB を読み込む"""
+    legacy_path = path.with_suffix(".json")
+    if legacy_path == path or not legacy_path.exists():
+        return {}
+    try:
+        raw = json.loads(legacy_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        logger.warning("旧JSON DBの取り込みに失敗しました: %s (%s)", legacy_path.name, e)
+        return {}
+    entries = migrate_legacy(raw)
+    logger.info("旧JSON DBを取り込みました: %s -> %s (%d件)", legacy_path.name, path.name, len(entries))
+    return entries
+
+
+def resolve_backend(path: Path, backend: str = "auto") -> str:
+    """"auto" の場合は拡張子から保存方式を決める（.jsonl → journal, .db/.sqlite → sqlite）"""
+    if backend != "auto":
+        return backend
+    suffix = path.suffix.lower()
+    if suffix == ".jsonl":
+        return "journal"
+    if suffix in _SQLITE_SUFFIXES:
+        return "sqlite"
+    return "json"
+
+
+def open_store(path: Path, backend: str = "auto"):
+    """保存方式に応じたストアを返す。拡張子が保存方式と合わない場合は拡張子を差し替える。"""
+    backend = resolve_backend(path, backend)
+    if backend == "journal":
+        if path.suffix.lower() != ".jsonl":
+            path = path.with_suffix(".jsonl")
+        return JournalStore(path)
+    if backend == "sqlite":
+        if path.suffix.lower() not in _SQLITE_SUFFIXES:
+            path = path.with_suffix(".sqlite3")
+        return SqliteStore(path)
+    return JsonStore(path)
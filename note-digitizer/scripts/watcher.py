@@ -1,8 +1,10 @@
 """watchdogによるフォルダ監視"""
 
+import contextlib
 import logging
 import queue
 import threading
+import time
 from pathlib import Path
 
 from watchdog.events import FileSystemEventHandler
@@ -11,9 +13,14 @@ from watchdog.observers.polling import PollingObserver
 
 from analyzer import NoteAnalyzer
 from config import Config
+from debouncer import Debouncer
 from discord_notify import DiscordNotifier
-from markdown_writer import MarkdownWriter
+from markdown_writer import MarkdownWriter, NoteStream
+import metrics
+from note_document import NoteDocument
 from processed_tracker import ProcessedTracker, normalize_filename
+from work_queue import PriorityWorkQueue
+from snapshot_observer import SnapshotObserver
 
 logger = logging.getLogger(__name__)
 
@@ -36,15 +43,38 @@ class NoteHandler(FileSystemEventHandler):
         self.writer = writer
         self.notifier = notifier
         self.tracker = tracker
-        self._timers: dict[str, threading.Timer] = {}
+        self._debouncer = Debouncer(name="note-debouncer")
         self._queued: set[str] = set()  # 正規化キーで二重エンキューを防止
         self._lock = threading.Lock()
-        self._queue: queue.Queue = queue.Queue()
-        # 単一ワーカースレッド（daemon=True でメイン終了時に自動停止）
-        self._worker = threading.Thread(
-            target=self._worker_loop, daemon=True, name="note-worker"
+        # 取り出す順番は QUEUE_POLICY に従う（終了シグナルの None は常に最後）
+        self._queue: queue.Queue = PriorityWorkQueue(
+            config.queue_policy, config.queue_aging_seconds, config.queue_boost_marker
         )
-        self._worker.start()
+        # メトリクス用: 最初のイベント時刻（デバウンス待ち）とエンキュー時刻（キュー待ち）
+        self._first_event: dict[str, float] = {}
+        self._enqueued_at: dict[str, float] = {}
+        metrics.set_gauge("queue_depth", self._queue.qsize)
+        # ワーカースレッド群（daemon=True でメイン終了時に自動停止）
+        # 同一正規化キーは _queued で1件に絞られるため、並列でも同じスキャンが同時に解析されることはない
+        self._workers: list[threading.Thread] = []
+        worker_targets = [self._worker_loop] * config.worker_concurrency
+        if config.profile_pipeline != "off":
+            # 無効時はラップしない（計測のためのオーバーヘッドを一切入れない）
+            from profiling import PipelineProfiler
+
+            profiler = PipelineProfiler(config)
+            if config.profile_pipeline == "file":
+                self._process = profiler.wrap_process(self._process)
+            else:
+                worker_targets[0] = profiler.wrap_worker(self._worker_loop)
+            logger.info("プロファイリング有効: %s -> %s", config.profile_pipeline, config.profile_dir)
+        for i, target in enumerate(worker_targets):
+            worker = threading.Thread(
+                target=target, daemon=True, name=f"note-worker-{i}"
+            )
+            worker.start()
+            self._workers.append(worker)
+        logger.info("ワーカースレッド起動: %d件", len(self._workers))
 
     def on_created(self, event):
         if event.is_directory:
@@ -63,26 +93,23 @@ class NoteHandler(FileSystemEventHandler):
         self._schedule(path)
 
     def _schedule(self, path: Path):
-        """デバウンス処理: ファイル書き込み完了を待ってから _enqueue を呼ぶ"""
-        key = str(path)
+        """デバウンス処理: 最後のイベントから debounce_seconds 後に enqueue を呼ぶ"""
         with self._lock:
-            if key in self._timers:
-                self._timers[key].cancel()
-            timer = threading.Timer(
-                self.config.debounce_seconds, self._enqueue, args=[path]
-            )
-            self._timers[key] = timer
-            timer.start()
-            logger.debug("スケジュール登録: %s (%d秒後)", path.name, self.config.debounce_seconds)
+            self._first_event.setdefault(str(path), time.monotonic())
+        self._debouncer.schedule(
+            str(path), self.config.debounce_seconds, self.enqueue, path
+        )
+        logger.debug("スケジュール登録: %s (%g秒後)", path.name, self.config.debounce_seconds)
 
-    def _enqueue(self, path: Path):
-        """デバウンス完了後に呼ばれる。正規化キーで重複チェックしてキューに積む。"""
+    def enqueue(self, path: Path) -> bool:
+        """正規化キーで重複チェックしてキューに積む。積んだ場合は True を返す。"""
         with self._lock:
-            self._timers.pop(str(path), None)
-
+            first_event = self._first_event.pop(str(path), None)
+        if first_event is not None:
+            metrics.observe("debounce_wait", time.monotonic() - first_event)
         if not path.exists():
             logger.warning("ファイルが見つかりません（エンキュー時）: %s", path.name)
-            return
+            return False
 
         norm_key = normalize_filename(path.name)
 
@@ -91,17 +118,37 @@ class NoteHandler(FileSystemEventHandler):
                 logger.info(
                     "スキップ（キュー登録済み）: %s -> %s", path.name, norm_key
                 )
-                return
-            if self.tracker.is_processed(path):
+                metrics.inc("skipped_queued")
+                return False
+            with metrics.timer("tracker_hash"):
+                processed = self.tracker.is_processed(path)
+            if processed:
                 logger.info("スキップ（処理済み）: %s", path.name)
-                return
+                metrics.inc("skipped_processed")
+                return False
             self._queued.add(norm_key)
+            self._enqueued_at[str(path)] = time.monotonic()
 
         logger.info("キューに追加: %s (キー: %s)", path.name, norm_key)
         self._queue.put(path)
+        return True
+
+    def pending(self) -> int:
+        """キュー待ち＋処理中の件数"""
+        return self._queue.unfinished_tasks
+
+    def shutdown(self, timeout: float | None = None):
+        """保留中のデバウンスを破棄し、キュー残件を処理し終えてからワーカーを停止する。"""
+        self._debouncer.stop()
+        # 終了シグナルは既存の処理待ちより後に取り出されるため、残件を処理してから各ワーカーが終了する
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        logger.info("ワーカースレッドを停止しました")
 
     def _worker_loop(self):
-        """単一ワーカー。キューから1件ずつ取り出して逐次処理する。"""
+        """ワーカー本体。キューから取り出して処理する（小さな画像はまとめて1リクエストにする）。"""
         logger.debug("ワーカースレッド開始")
         while True:
             try:
@@ -112,48 +159,179 @@ class NoteHandler(FileSystemEventHandler):
                 logger.debug("ワーカースレッド終了シグナルを受信")
                 self._queue.task_done()
                 break
+            self._dequeued(path)
+            if self._batch_size(path) is None:
+                try:
+                    self._process(path)
+                finally:
+                    self._queue.task_done()
+                continue
+
+            batch, other, stop = self._collect_batch(path)
             try:
-                self._process(path)
+                if len(batch) > 1:
+                    self._process_batch(batch)
+                else:
+                    self._process(path)
+                # 取り出してしまったバッチ対象外（PDF・大きな画像）は、1件だけなので続けて単独で処理する
+                if other is not None:
+                    self._process(other)
             finally:
+                for _ in range(len(batch) + (other is not None)):
+                    self._queue.task_done()
+            if stop:
+                # 取り出してしまった終了シグナルをキューに戻す（いずれかのワーカーが受け取る）
+                self._queue.put(None)
                 self._queue.task_done()
         logger.debug("ワーカースレッド終了")
 
-    def _process(self, image_path: Path):
-        """ワーカースレッドから逐次呼ばれる。並行処理なし。"""
-        norm_key = normalize_filename(image_path.name)
+    def _dequeued(self, path: Path):
+        with self._lock:
+            enqueued_at = self._enqueued_at.pop(str(path), None)
+        if enqueued_at is not None:
+            metrics.observe("queue_wait", time.monotonic() - enqueued_at)
+
+    def _batch_size(self, path: Path) -> int | None:
+        """複数画像を1リクエストにまとめる対象ならファイルサイズを、対象外なら None を返す
+
+        対象: バッチ有効・PDF以外・単体で上限サイズ以下の画像
+        """
+        if self.config.batch_max_images <= 1 or path.suffix.lower() == ".pdf":
+            return None
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return None
+        return size if size <= self.config.batch_max_bytes else None
+
+    def _collect_batch(self, first: Path) -> tuple[list[Path], Path | None, bool]:
+        """キューに溜まっている画像を、件数・合計サイズの上限まで待たずに取り出す
+
+        バッチ対象外（PDF・大きな画像・合計サイズを超える画像）を取り出した時点で止める。
+        残りはキューに置いたままにし、他のワーカーが優先順位どおりに取り出せるようにする。
 
-        # 最終防御チェック（エンキュー後にファイル消失 or 別バリアントが先処理された場合）
+        戻り値: (バッチ対象, 取り出したがバッチ対象外のもの（最大1件）, 終了シグナルを取り出したか)
+        """
+        batch = [first]
+        total_bytes = self._batch_size(first) or 0
+        while len(batch) < self.config.batch_max_images:
+            try:
+                path = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if path is None:
+                return batch, None, True
+            self._dequeued(path)
+            size = self._batch_size(path)
+            if size is None or total_bytes + size > self.config.batch_max_bytes:
+                return batch, path, False
+            batch.append(path)
+            total_bytes += size
+        return batch, None, False
+
+    def _precheck(self, image_path: Path) -> bool:
+        """処理開始時の最終防御チェック。処理不要なら _queued を解放して False を返す。"""
+        # エンキュー後にファイル消失 or 別バリアントが先処理された場合
         if not image_path.exists():
             logger.warning("ファイルが見つかりません（処理開始時）: %s", image_path.name)
-            with self._lock:
-                self._queued.discard(norm_key)
-            return
-
-        if self.tracker.is_processed(image_path):
+        else:
+            with metrics.timer("tracker_hash"):
+                processed = self.tracker.is_processed(image_path)
+            if not processed:
+                return True
             logger.info(
                 "スキップ（処理済み、処理開始時確認）: %s", image_path.name
             )
-            with self._lock:
-                self._queued.discard(norm_key)
+            metrics.inc("skipped_processed")
+        with self._lock:
+            self._queued.discard(normalize_filename(image_path.name))
+        return False
+
+    def _process(self, image_path: Path):
+        """ワーカースレッドから呼ばれる。同一正規化キーのファイルが並行して処理されることはない。"""
+        if not self._precheck(image_path):
             return
 
         try:
             logger.info("=== パイプライン開始: %s ===", image_path.name)
-            content = self.analyzer.analyze(image_path)
-            output_path = self.writer.write(content, image_path.name)
-            self.notifier.notify(content, output_path)
-            self.tracker.mark_processed(image_path)
-            logger.info(
-                "=== パイプライン完了: %s -> %s ===",
-                image_path.name,
-                output_path.name,
-            )
+            with self._open_stream(image_path) as stream:
+                with metrics.timer("analyze"):
+                    doc = self.analyzer.analyze(image_path, stream)
+                self._publish(image_path, doc, stream)
         except Exception:
             logger.exception("パイプライン処理中にエラーが発生しました: %s", image_path.name)
+            metrics.inc("failed")
         finally:
             # エラー時もリセット → 次回同ファイルの再試行が可能
             with self._lock:
-                self._queued.discard(norm_key)
+                self._queued.discard(normalize_filename(image_path.name))
+
+    def _process_batch(self, paths: list[Path]):
+        """複数の画像を1リクエストで解析する。結果を取り出せなかった画像は単独処理に回す。"""
+        paths = [p for p in paths if self._precheck(p)]
+        if not paths:
+            return
+        if len(paths) == 1:
+            self._process(paths[0])
+            return
+
+        logger.info("=== バッチパイプライン開始: %d件 ===", len(paths))
+        remaining = list(paths)  # まだ _queued から外していない画像
+        try:
+            try:
+                with metrics.timer("analyze"):
+                    results = self.analyzer.analyze_batch(paths)
+            except Exception:
+                # 単独処理と同じく、1件の不正なファイルでワーカーを止めない
+                logger.exception("バッチ解析中にエラーが発生したため単独処理に切り替えます")
+                results = {}
+            for image_path in paths:
+                doc = results.get(image_path)
+                remaining.remove(image_path)
+                if doc is None:
+                    logger.info("単独処理にフォールバック: %s", image_path.name)
+                    self._process(image_path)
+                    continue
+                try:
+                    self._publish(image_path, doc)
+                except Exception:
+                    logger.exception("パイプライン処理中にエラーが発生しました: %s", image_path.name)
+                    metrics.inc("failed")
+                finally:
+                    with self._lock:
+                        self._queued.discard(normalize_filename(image_path.name))
+        finally:
+            # 途中で例外が抜けても、残りの画像を再びキューに積めるようにする
+            with self._lock:
+                for image_path in remaining:
+                    self._queued.discard(normalize_filename(image_path.name))
+
+    def _open_stream(self, image_path: Path):
+        """GEMINI_STREAMING 有効時は応答を書き込む NoteStream を、無効時は None を返すコンテキスト"""
+        if self.config.gemini_streaming:
+            return self.writer.open_stream(image_path.name)
+        return contextlib.nullcontext()
+
+    def _publish(self, image_path: Path, doc: NoteDocument, stream: NoteStream | None = None):
+        """解析結果を保存・通知し、処理済みとして登録する
+
+        ストリーミングで一時ファイルに書き込み済みの場合は、保存の代わりに本来の名前へ rename する。
+        """
+        streamed = stream is not None and stream.finished
+        if streamed and stream.ttfb is not None:
+            metrics.observe("analyze_ttfb", stream.ttfb)
+        with metrics.timer("write"):
+            output_path = stream.commit() if streamed else self.writer.write(doc, image_path.name)
+        with metrics.timer("notify"):
+            self.notifier.notify(doc, output_path)
+        with metrics.timer("tracker_commit"):
+            self.tracker.mark_processed(image_path)
+        metrics.inc("processed")
+        logger.info(
+            "=== パイプライン完了: %s -> %s ===",
+            image_path.name,
+            output_path.name,
+        )
 
 
 def _is_virtual_drive(path: str) -> bool:
@@ -170,25 +348,48 @@ def _is_virtual_drive(path: str) -> bool:
     return drive.upper() != "C:"
 
 
-def start_watching(
-    config: Config,
-    analyzer: NoteAnalyzer,
-    writer: MarkdownWriter,
-    notifier: DiscordNotifier,
-    tracker: ProcessedTracker,
-) -> Observer:
-    """フォルダ監視を開始してObserverインスタンスを返す"""
-    handler = NoteHandler(config, analyzer, writer, notifier, tracker)
+def create_observer(config: Config) -> Observer:
+    """監視フォルダに適したObserverを生成する（未start）"""
     # Google DriveFS等の仮想ファイルシステムではReadDirectoryChangesWが
     # イベントを発火しないため、PollingObserverを使用する
     watch_path = str(config.watch_folder)
     use_polling = _is_virtual_drive(watch_path)
-    if use_polling:
+    if use_polling and config.polling_backend == "snapshot":
+        observer = SnapshotObserver(
+            config.watch_snapshot_path, config.poll_min_seconds, config.poll_max_seconds
+        )
+        logger.info(
+            "SnapshotObserver使用（仮想ドライブ検出、%.0f〜%.0f秒間隔）: %s",
+            config.poll_min_seconds,
+            config.poll_max_seconds,
+            watch_path,
+        )
+    elif use_polling:
         observer = PollingObserver(timeout=config.debounce_seconds)
         logger.info("PollingObserver使用（仮想ドライブ検出）: %s", watch_path)
     else:
         observer = Observer()
-    observer.schedule(handler, watch_path, recursive=False)
+    return observer
+
+
+def start_watching(
+    config: Config,
+    analyzer: NoteAnalyzer,
+    writer: MarkdownWriter,
+    notifier: DiscordNotifier,
+    tracker: ProcessedTracker,
+) -> tuple[Observer, NoteHandler]:
+    """フォルダ監視を開始してObserverとNoteHandlerを返す"""
+    handler = NoteHandler(config, analyzer, writer, notifier, tracker)
+    if config.backfill_on_start:
+        # 停止中に追加されたファイルを監視開始前にキューへ積む（処理はワーカーが並行して進める）
+        from backfill import scan_backlog
+
+        backlog = scan_backlog(config, tracker)
+        queued = sum(handler.enqueue(path) for path in backlog)
+        logger.info("起動時バックフィル: %d件をキューに追加", queued)
+    observer = create_observer(config)
+    observer.schedule(handler, str(config.watch_folder), recursive=False)
     observer.start()
     logger.info("フォルダ監視を開始しました: %s", config.watch_folder)
-    return observer
+    return observer, handler
@@ -0,0 +1,121 @@
+"""優先度付きのワーカーキュー（NoteHandler の処理待ち）
+
+queue.Queue を継承し、取り出す順番だけを方針（QUEUE_POLICY）で変える。put / get / task_done /
+unfinished_tasks などのインターフェースと、ブロッキング・スレッド安全性は queue.Queue のまま。
+
+- fifo: 積んだ順（従来どおり）
+- sjf-bytes: ファイルサイズの小さい順
+- sjf-pages: ページ数の少ない順（画像は1ページ、PDFはページ数）
+- newest: 新しく積んだ順
+
+飢餓を防ぐため、QUEUE_AGING_SECONDS 以上待ったものは方針に関係なく先に（積んだ順に）取り出す。
+ファイル名に QUEUE_BOOST_MARKER を含むものは最優先。終了シグナル（None）は常に最後に取り出すため、
+shutdown で積んだシグナルは残件の処理が済んでからワーカーに届く。
+
+取り出すたびに待機中の全件を比べる（O(n)）。待ち時間で順位が変わるため静的なヒープは使えないが、
+処理待ちは多くても数千件で、1件の解析時間に比べれば無視できる。
+"""
+
+import logging
+import math
+import queue
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("fifo", "sjf-bytes", "sjf-pages", "newest")
+
+_BYTES_PER_PAGE_ESTIMATE = 100 * 1024  # ページ数を取得できないPDFの見積もり
+
+
+@dataclass
+class _Job:
+    path: Path | None  # None は終了シグナル
+    seq: int
+    enqueued_at: float
+    cost: float  # 方針ごとの並び順（小さいほど先）
+    boosted: bool
+
+
+class PriorityWorkQueue(queue.Queue):
+    """方針に従って取り出す順番を決める queue.Queue（要素は Path または終了シグナルの None）"""
+
+    def __init__(self, policy: str = "fifo", aging_seconds: float = 0, boost_marker: str = ""):
+        super().__init__()
+        self.policy = policy
+        self.aging_seconds = aging_seconds
+        self.boost_marker = boost_marker
+        self._seq = 0
+
+    def put(self, item: Path | None, block: bool = True, timeout: float | None = None):
+        # サイズ・ページ数の取得はファイルI/Oのため、キューのロックを取る前に済ませる
+        super().put(self._job(item), block, timeout)
+
+    def _job(self, path: Path | None) -> _Job:
+        if path is None:
+            return _Job(None, 0, time.monotonic(), math.inf, False)
+        return _Job(
+            path,
+            0,
+            time.monotonic(),
+            self._cost(path),
+            bool(self.boost_marker) and self.boost_marker in path.stem,
+        )
+
+    def _cost(self, path: Path) -> float:
+        if self.policy == "sjf-bytes":
+            return _file_size(path)
+        if self.policy == "sjf-pages":
+            return _page_count(path)
+        return 0.0
+
+    # 以下は queue.Queue のロック内から呼ばれる
+
+    def _init(self, maxsize: int):
+        self.queue: list[_Job] = []
+
+    def _qsize(self) -> int:
+        return len(self.queue)
+
+    def _put(self, job: _Job):
+        self._seq += 1
+        job.seq = self._seq
+        self.queue.append(job)
+
+    def _get(self) -> Path | None:
+        now = time.monotonic()
+        index = min(range(len(self.queue)), key=lambda i: self._rank(self.queue[i], now))
+        return self.queue.pop(index).path
+
+    def _rank(self, job: _Job, now: float) -> tuple:
+        """小さいほど先に取り出す"""
+        if job.path is None:
+            return (3, job.seq)
+        if job.boosted:
+            return (0, job.seq)
+        if self.aging_seconds > 0 and now - job.enqueued_at >= self.aging_seconds:
+            return (1, job.seq)
+        if self.policy == "newest":
+            return (2, -job.seq)
+        return (2, job.cost, job.seq)
+
+
+def _file_size(path: Path) -> float:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0.0
+
+
+def _page_count(path: Path) -> float:
+    if path.suffix.lower() != ".pdf":
+        return 1.0
+    from pdf_pages import count_pages
+
+    try:
+        return count_pages(path)
+    except Exception as e:
+        logger.debug("ページ数を取得できないためサイズから見積もります: %s (%s)", path.name, e)
+        return max(1.0, _file_size(path) / _BYTES_PER_PAGE_ESTIMATE)
@@ -0,0 +1,6 @@
+"""テスト共通設定: scripts/ のモジュールをベンチマークと同じくフラットに import できるようにする"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
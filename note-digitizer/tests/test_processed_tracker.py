@@ -0,0 +1,36 @@
+"""ProcessedTracker の知覚ハッシュによる重複判定のテスト"""
+
+import os
+
+import numpy as np
+import PIL.Image
+
+from processed_tracker import ProcessedTracker
+
+
+def _save(path, pixels, mtime_ns):
+    PIL.Image.fromarray(pixels).save(path)
+    # 知覚ハッシュのキャッシュは (size, mtime_ns, inode) で判定するため、書き換えごとに時刻を変える
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_re_registered_key_drops_previous_perceptual_hash(tmp_path):
+    rng = np.random.default_rng(0)
+    first = rng.integers(0, 256, (64, 64), dtype=np.uint8)
+    second = rng.integers(0, 256, (64, 64), dtype=np.uint8)
+    # first とだけ見た目の近いスキャン（右下の一部だけ違う）
+    near_first = first.copy()
+    near_first[56:, 56:] = 0
+
+    tracker = ProcessedTracker(tmp_path / "processed.json", backend="json", hamming_threshold=12)
+    scan = tmp_path / "scan.png"
+    _save(scan, first, 1_000_000_000)
+    tracker.mark_processed(scan)
+    # 同名で内容の違う再エクスポート
+    _save(scan, second, 2_000_000_000)
+    tracker.mark_processed(scan)
+
+    other = tmp_path / "other.png"
+    _save(other, near_first, 3_000_000_000)
+    assert not tracker.is_processed(other)
+    assert tracker._phash_index.size == 1
@@ -0,0 +1,78 @@
+"""NoteHandler のワーカー・バッチ取り出しのテスト"""
+
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from note_document import NoteDocument
+from watcher import NoteHandler
+
+
+class _Analyzer:
+    """ファイルごとに少し時間のかかる解析の代わり。どのワーカーが処理したかを記録する"""
+
+    def __init__(self):
+        self.workers: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, image_path: Path, stream=None) -> NoteDocument:
+        time.sleep(0.1)
+        with self._lock:
+            self.workers[image_path.name] = threading.current_thread().name
+        return NoteDocument.parse("---\ntitle: t\n---\n本文")
+
+    def analyze_batch(self, paths: list[Path]) -> dict:
+        return {}
+
+
+class _Tracker:
+    def is_processed(self, path: Path) -> bool:
+        return False
+
+    def mark_processed(self, path: Path):
+        pass
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setenv("WATCH_FOLDER", str(tmp_path))
+    monkeypatch.setenv("OBSIDIAN_VAULT_PATH", str(tmp_path / "vault"))
+    monkeypatch.setenv("WORKER_CONCURRENCY", "2")
+    monkeypatch.setenv("BATCH_MAX_IMAGES", "4")
+    monkeypatch.setenv("QUEUE_POLICY", "fifo")
+    monkeypatch.setenv("PROFILE_PIPELINE", "off")
+    monkeypatch.setenv("GEMINI_STREAMING", "false")
+    return Config()
+
+
+def test_batch_collection_leaves_pdfs_for_other_workers(config, tmp_path):
+    image = tmp_path / "photo.jpg"
+    image.write_bytes(b"\xff\xd8" + b"0" * 1024)
+    pdfs = []
+    for i in range(6):
+        pdf = tmp_path / f"scan_{i}.pdf"
+        pdf.write_bytes(b"%PDF-1.4\n")
+        pdfs.append(pdf)
+
+    analyzer = _Analyzer()
+    writer = SimpleNamespace(write=lambda doc, name: tmp_path / f"{name}.md")
+    notifier = SimpleNamespace(notify=lambda doc, path: None)
+    handler = NoteHandler(config, analyzer, writer, notifier, _Tracker())
+
+    # 小さな画像を先頭に、すべてを1度に積む（積んでいる途中でワーカーに取り出されないようロックを持つ）
+    work = handler._queue
+    with work.mutex:
+        for path in [image, *pdfs]:
+            work._put(work._job(path))
+            work.unfinished_tasks += 1
+        work.not_empty.notify_all()
+
+    work.join()
+    handler.shutdown(timeout=5)
+
+    assert set(analyzer.workers) == {image.name, *(p.name for p in pdfs)}
+    assert set(analyzer.workers.values()) == {"note-worker-0", "note-worker-1"}